@@ -192,7 +192,8 @@ def demostrar_activity_logs():
             )
             print_success(f"Actividad '{actividad['accion']}' registrada (ID: {log_id})")
         
-        # Verificar que se guardaron
+        # Verificar que se guardaron (los logs se escriben en lote desde el buffer)
+        ActivityLogService.flush()
         from fit.mongodb_service import MongoDBService
         db = MongoDBService.get_db()
         if db:
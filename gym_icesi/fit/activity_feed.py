@@ -0,0 +1,102 @@
+"""
+Feed de actividad de los asignados de un entrenador.
+Las señales registran cada evento (progreso, rutinas, rutinas prediseñadas adoptadas,
+mensajes, recomendaciones leídas) en ActivityEvent, indexada por (user, -fecha, -id). El feed
+de un entrenador es una sola consulta sobre los eventos de todos sus asignados, ordenada por
+(fecha, id) descendente y paginada con cursor en lugar de OFFSET; `since` devuelve solo los
+eventos posteriores a una fecha (para consultar periódicamente si hay novedades).
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ActivityEvent, TrainerAssignment
+
+FEED_PAGE_SIZE = 30
+
+
+def encode_cursor(evento):
+    """Cursor opaco con la posición (fecha, id) de un evento"""
+    return base64.urlsafe_b64encode(f"{evento.fecha.isoformat()}|{evento.id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(fecha, id) de un cursor; ValueError si no es válido"""
+    try:
+        fecha, evento_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(fecha), int(evento_id)
+    except Exception:
+        raise ValueError(f"Cursor inválido: {cursor}")
+
+
+def parse_since(valor):
+    """Fecha/hora ISO del parámetro `since` (con la zona horaria local si no trae una)"""
+    fecha = parse_datetime(valor or "")
+    if fecha is None:
+        raise ValueError(f"Fecha inválida: {valor}")
+    return timezone.make_aware(fecha) if timezone.is_naive(fecha) else fecha
+
+
+class ActivityFeedService:
+    """Servicio de registro y lectura del feed de actividad"""
+
+    @staticmethod
+    def record(user_id, tipo, objeto_id=None, resumen="", destinatario_id=None):
+        ActivityEvent.objects.create(
+            user_id=user_id,
+            tipo=tipo,
+            objeto_id=objeto_id,
+            resumen=resumen[:200],
+            destinatario_id=destinatario_id,
+        )
+
+    @staticmethod
+    def record_recommendations_read(user_id, recomendaciones):
+        """Un evento por recomendación leída, en un solo INSERT. `recomendaciones`: [(id, trainer_id)]"""
+        ActivityEvent.objects.bulk_create([
+            ActivityEvent(
+                user_id=user_id,
+                destinatario_id=trainer_id,
+                tipo="recomendacion_leida",
+                objeto_id=recomendacion_id,
+                resumen="Leyó tu recomendación",
+            )
+            for recomendacion_id, trainer_id in recomendaciones
+        ])
+
+    @staticmethod
+    def feed(trainer, cursor=None, since=None, limit=FEED_PAGE_SIZE):
+        """
+        Eventos de los asignados activos del entrenador, del más reciente al más antiguo.
+        Devuelve (eventos, cursor de la página siguiente o None).
+        """
+        asignados = TrainerAssignment.objects.filter(trainer=trainer, activo=True).values("user_id")
+        eventos = (
+            ActivityEvent.objects.filter(user_id__in=asignados)
+            .filter(Q(destinatario__isnull=True) | Q(destinatario=trainer))
+            .select_related("user")
+            .order_by("-fecha", "-id")
+        )
+        if since is not None:
+            eventos = eventos.filter(fecha__gt=since)
+        if cursor:
+            fecha, evento_id = decode_cursor(cursor)
+            eventos = eventos.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=evento_id))
+        pagina = list(eventos[:limit + 1])
+        siguiente = encode_cursor(pagina[limit - 1]) if len(pagina) > limit else None
+        return pagina[:limit], siguiente
+
+    @staticmethod
+    def serialize(evento):
+        return {
+            "id": evento.id,
+            "user_id": evento.user_id,
+            "username": evento.user.username,
+            "tipo": evento.tipo,
+            "objeto_id": evento.objeto_id,
+            "resumen": evento.resumen,
+            "fecha": evento.fecha.isoformat(),
+        }
@@ -1,5 +1,7 @@
 # fit/admin.py
-from django.contrib import admin
+from datetime import date
+
+from django.contrib import admin, messages
 
 from fit.institutional_models import Employee, InstitutionalUser
 
@@ -14,6 +16,7 @@ from .models import (
     TrainerMonthlyStats,
     TrainerRecommendation,
 )
+from .stats_service import StatsRecalculator
 
 # ----------------------------------------------------
 # Inline: ítems dentro de la rutina
@@ -68,6 +71,25 @@ class ProgressLogAdmin(admin.ModelAdmin):
     ordering = ('-fecha',)
 
 
+# ----------------------------------------------------
+# Acción: recalcular estadísticas mensuales
+# ----------------------------------------------------
+@admin.action(description='Recalcular los meses seleccionados (todos los usuarios)')
+def recalcular_estadisticas(modeladmin, request, queryset):
+    periodos = set(queryset.values_list('anio', 'mes'))
+    if not periodos:
+        return
+    desde = date(*min(periodos), 1)
+    hasta = date(*max(periodos), 1)
+    tipo = 'trainer' if queryset.model is TrainerMonthlyStats else 'user'
+    cambios = StatsRecalculator.recalculate(desde, hasta, tipos=(tipo,))
+    modeladmin.message_user(
+        request,
+        f'Estadísticas recalculadas de {desde:%Y-%m} a {hasta:%Y-%m}: {len(cambios[tipo])} filas corregidas.',
+        messages.SUCCESS,
+    )
+
+
 # ----------------------------------------------------
 # Admin de Estadísticas Mensuales (Usuarios)
 # ----------------------------------------------------
@@ -76,6 +98,7 @@ class UserMonthlyStatsAdmin(admin.ModelAdmin):
     list_display = ('user', 'mes')
     list_filter = ('mes',)
     search_fields = ('user__username',)
+    actions = [recalcular_estadisticas]
 
 
 # ----------------------------------------------------
@@ -86,6 +109,7 @@ class TrainerMonthlyStatsAdmin(admin.ModelAdmin):
     list_display = ('trainer', 'mes')
     list_filter = ('mes',)
     search_fields = ('trainer__username',)
+    actions = [recalcular_estadisticas]
 
 @admin.register(Employee)
 class EmployeeAdmin(admin.ModelAdmin):
@@ -0,0 +1,81 @@
+"""
+Listado de usuarios del panel de administración.
+La población son los usuarios Django (sincronizados en bloque desde la BD institucional); rol y
+campus se resuelven con subconsultas sobre las tablas institucionales, la búsqueda por username
+o nombre con el índice de trigramas de UserSearchIndex (ver fit.search_service),
+el nivel de actividad con el contador mensual (UserMonthlyStats, índice único usuario/año/mes)
+y las estadísticas por fila con anotaciones, de modo que el costo de una página depende del
+tamaño de la página y no del número de usuarios.
+"""
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Exists, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .institutional_service import InstitutionalService
+from .models import ProgressLog, Routine, TestAccount, TrainerAssignment, UserMonthlyStats
+from .search_service import PeopleSearchService
+
+ROLES = {"student": "STUDENT", "employee": "EMPLOYEE"}
+
+FILTROS_ACTIVIDAD = {
+    "high": Q(sesiones_mes__gte=10),
+    "medium": Q(sesiones_mes__gte=5, sesiones_mes__lt=10),
+    "low": Q(sesiones_mes__gte=1, sesiones_mes__lt=5),
+    "inactive": Q(sesiones_mes=0),
+}
+
+ORDENES = {
+    "usuario": ("username",),
+    "actividad": ("-sesiones_mes", "username"),
+    "recientes": ("-date_joined", "-id"),
+}
+
+
+def _conteo(queryset):
+    return Coalesce(
+        Subquery(queryset.order_by().values("user_id").annotate(n=Count("id")).values("n")[:1]),
+        0,
+        output_field=IntegerField(),
+    )
+
+
+class AdminUserService:
+    """Servicio del listado paginado de usuarios para administradores"""
+
+    @staticmethod
+    def queryset(search="", role="", campus="", activity="", orden="usuario", hoy=None):
+        hoy = hoy or date.today()
+        usuarios = User.objects.filter(is_superuser=False).exclude(id__in=TestAccount.objects.values("user_id"))
+        institucional = InstitutionalService.available()
+
+        if role == "trainer":
+            usuarios = usuarios.filter(is_staff=True)
+        elif institucional:
+            usuarios = usuarios.filter(
+                username__in=InstitutionalService.eligible_usernames(role=ROLES.get(role), campus=campus or None)
+            )
+
+        if search:
+            usuarios = usuarios.filter(id__in=PeopleSearchService.matching(search).values("user_id"))
+
+        usuarios = usuarios.annotate(
+            sesiones_mes=Coalesce(
+                Subquery(
+                    UserMonthlyStats.objects.filter(user_id=OuterRef("pk"), anio=hoy.year, mes=hoy.month)
+                    .values("seguimientos_registrados")[:1]
+                ),
+                0,
+                output_field=IntegerField(),
+            ),
+        )
+        filtro = FILTROS_ACTIVIDAD.get(activity)
+        if filtro is not None:
+            usuarios = usuarios.filter(filtro)
+
+        return usuarios.annotate(
+            total_sesiones=_conteo(ProgressLog.objects.filter(user_id=OuterRef("pk"))),
+            rutinas_count=_conteo(Routine.objects.filter(user_id=OuterRef("pk"))),
+            tiene_entrenador=Exists(TrainerAssignment.objects.filter(user_id=OuterRef("pk"), activo=True)),
+        ).order_by(*ORDENES.get(orden, ORDENES["usuario"]))
@@ -0,0 +1,180 @@
+"""
+Analítica de entrenamiento vectorizada.
+Carga las series de ProgressLog de uno o varios usuarios con una sola consulta values_list
+y calcula con NumPy, sin bucles por usuario ni por día:
+- medias móviles de carga diaria de 7 y 28 días (aguda y crónica),
+- relación carga aguda:crónica (ACWR),
+- esfuerzo promedio por sesión en los últimos 7 y 28 días,
+- pendientes de regresión lineal de esfuerzo y peso_usado (por semana).
+La carga de una sesión es esfuerzo (RPE 1-10) x minutos; sin tiempo registrado aporta 0.
+"""
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+from .models import ProgressLog
+
+VENTANA_DIAS = 90
+AGUDA_DIAS = 7
+CRONICA_DIAS = 28
+
+# Zonas de ACWR: por debajo de 0.8 carga insuficiente, 0.8-1.3 zona óptima,
+# por encima de 1.5 riesgo de sobrecarga
+ACWR_MIN_OPTIMO = 0.8
+ACWR_MAX_OPTIMO = 1.3
+ACWR_RIESGO = 1.5
+
+
+def _zona_acwr(acwr):
+    if acwr is None:
+        return "sin_datos"
+    if acwr < ACWR_MIN_OPTIMO:
+        return "baja"
+    if acwr <= ACWR_MAX_OPTIMO:
+        return "optima"
+    if acwr <= ACWR_RIESGO:
+        return "alta"
+    return "riesgo"
+
+
+def _valor(x, decimales=2):
+    """Convierte un escalar NumPy a float redondeado (None si es NaN)"""
+    x = float(x)
+    return None if np.isnan(x) else round(x, decimales)
+
+
+def _media_por_grupo(grupo, valores, mascara, n):
+    """Media de `valores` por grupo considerando solo las filas de `mascara`"""
+    mascara = mascara & ~np.isnan(valores)
+    suma = np.bincount(grupo[mascara], weights=valores[mascara], minlength=n)
+    cuenta = np.bincount(grupo[mascara], minlength=n)
+    return np.divide(suma, cuenta, out=np.full(n, np.nan), where=cuenta > 0)
+
+
+def _pendientes(grupo, x, y, n):
+    """Pendiente de mínimos cuadrados de y sobre x por grupo (NaN con menos de 2 puntos distintos)"""
+    m = ~np.isnan(y)
+    g, x, y = grupo[m], x[m], y[m]
+    cuenta = np.bincount(g, minlength=n)
+    sx = np.bincount(g, weights=x, minlength=n)
+    sy = np.bincount(g, weights=y, minlength=n)
+    sxx = np.bincount(g, weights=x * x, minlength=n)
+    sxy = np.bincount(g, weights=x * y, minlength=n)
+    denominador = cuenta * sxx - sx * sx
+    return np.divide(
+        cuenta * sxy - sx * sy, denominador,
+        out=np.full(n, np.nan), where=denominador > 1e-9,
+    )
+
+
+def _medias_moviles(diaria, ventana):
+    """Media móvil (ventana en días) por fila de una matriz usuarios x días"""
+    acumulado = np.pad(np.cumsum(diaria, axis=1), ((0, 0), (1, 0)))
+    return (acumulado[:, ventana:] - acumulado[:, :-ventana]) / ventana
+
+
+class TrainingAnalyticsService:
+    """Servicio de métricas de entrenamiento calculadas de forma vectorizada"""
+
+    @staticmethod
+    def load_series(user_ids, desde, hasta):
+        """
+        Una sola consulta: registros de los usuarios en el rango como arrays NumPy
+        (user_id, día relativo a `desde`, esfuerzo, minutos, peso_usado).
+        """
+        filas = list(
+            ProgressLog.objects.filter(user_id__in=user_ids, fecha__range=(desde, hasta))
+            .order_by()
+            .values_list("user_id", "fecha", "esfuerzo", "tiempo_seg", "peso_usado")
+        )
+        if not filas:
+            vacio = np.array([], dtype=float)
+            return {
+                "user_id": np.array([], dtype=np.int64),
+                "dia": np.array([], dtype=np.int64),
+                "esfuerzo": vacio,
+                "minutos": vacio,
+                "peso": vacio,
+            }
+        user_id, fechas, esfuerzo, tiempo, peso = zip(*filas)
+        base = desde.toordinal()
+        return {
+            "user_id": np.array(user_id, dtype=np.int64),
+            "dia": np.fromiter((f.toordinal() - base for f in fechas), dtype=np.int64, count=len(filas)),
+            # None -> NaN al convertir a float
+            "esfuerzo": np.array(esfuerzo, dtype=float),
+            "minutos": np.nan_to_num(np.array(tiempo, dtype=float)) / 60,
+            "peso": np.array(peso, dtype=float),
+        }
+
+    @staticmethod
+    def batch(user_ids, hasta=None, dias=VENTANA_DIAS, series=False):
+        """
+        Métricas de muchos usuarios en una pasada. Devuelve {user_id: métricas}.
+        Con `series=True` incluye las medias móviles diarias de 7 y 28 días de los
+        últimos 28 días (para gráficas).
+        """
+        if not NUMPY_AVAILABLE:
+            return {}
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        dias = max(dias, CRONICA_DIAS)
+        hasta = hasta or date.today()
+        desde = hasta - timedelta(days=dias - 1)
+        datos = TrainingAnalyticsService.load_series(user_ids, desde, hasta)
+
+        n = len(user_ids)
+        ids = np.array(user_ids, dtype=np.int64)
+        orden = np.argsort(ids)
+        grupo = orden[np.searchsorted(ids[orden], datos["user_id"])]
+        dia = datos["dia"]
+
+        # Matriz usuarios x días con la carga diaria
+        carga = np.nan_to_num(datos["esfuerzo"]) * datos["minutos"]
+        diaria = np.bincount(grupo * dias + dia, weights=carga, minlength=n * dias).reshape(n, dias)
+        media_7 = _medias_moviles(diaria, AGUDA_DIAS)
+        media_28 = _medias_moviles(diaria, CRONICA_DIAS)
+        aguda = media_7[:, -1]
+        cronica = media_28[:, -1]
+        acwr = np.divide(aguda, cronica, out=np.full(n, np.nan), where=cronica > 0)
+
+        esfuerzo_7 = _media_por_grupo(grupo, datos["esfuerzo"], dia >= dias - AGUDA_DIAS, n)
+        esfuerzo_28 = _media_por_grupo(grupo, datos["esfuerzo"], dia >= dias - CRONICA_DIAS, n)
+        semanas = dia / 7.0
+        pendiente_esfuerzo = _pendientes(grupo, semanas, datos["esfuerzo"], n)
+        pendiente_peso = _pendientes(grupo, semanas, datos["peso"], n)
+        sesiones = np.bincount(grupo, minlength=n)
+        sesiones_7 = np.bincount(grupo[dia >= dias - AGUDA_DIAS], minlength=n)
+
+        resultado = {}
+        for i, user_id in enumerate(user_ids):
+            valor_acwr = _valor(acwr[i])
+            metricas = {
+                "sesiones": int(sesiones[i]),
+                "sesiones_7d": int(sesiones_7[i]),
+                "carga_aguda": _valor(aguda[i], 1),
+                "carga_cronica": _valor(cronica[i], 1),
+                "acwr": valor_acwr,
+                "zona_acwr": _zona_acwr(valor_acwr),
+                "esfuerzo_7d": _valor(esfuerzo_7[i], 1),
+                "esfuerzo_28d": _valor(esfuerzo_28[i], 1),
+                "pendiente_esfuerzo": _valor(pendiente_esfuerzo[i], 3),
+                "pendiente_peso": _valor(pendiente_peso[i], 3),
+            }
+            if series:
+                metricas["serie_7d"] = np.round(media_7[i, -CRONICA_DIAS:], 1).tolist()
+                metricas["serie_28d"] = np.round(media_28[i, -CRONICA_DIAS:], 1).tolist()
+            resultado[user_id] = metricas
+        return resultado
+
+    @staticmethod
+    def for_user(user, hasta=None, dias=VENTANA_DIAS):
+        """Métricas de un usuario con sus series móviles (None si NumPy no está disponible)"""
+        user_id = getattr(user, "pk", user)
+        return TrainingAnalyticsService.batch([user_id], hasta=hasta, dias=dias, series=True).get(user_id)
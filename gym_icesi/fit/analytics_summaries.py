@@ -0,0 +1,143 @@
+"""
+Resúmenes precalculados del panel de analítica del administrador.
+En PostgreSQL cada resumen es una vista materializada con índice único, de modo que se
+puede refrescar con REFRESH MATERIALIZED VIEW CONCURRENTLY sin bloquear las lecturas. En
+otros motores (SQLite en desarrollo y tests) es una tabla que se reemplaza dentro de una
+transacción. admin_analytics lee cada resumen con una sola consulta.
+"""
+import logging
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+
+from .models import (
+    ExercisePopularitySummary,
+    FacultyActivitySummary,
+    RoutinePopularitySummary,
+    TrainerEffectivenessSummary,
+)
+
+logger = logging.getLogger(__name__)
+
+VENTANA_FACULTADES_DIAS = 30
+
+# faculty_activity solo cuenta empleados: STUDENTS no tiene facultad (solo campus_code).
+# {desde}: inicio de la ventana de actividad (literal en la vista materializada, parámetro en tablas)
+SUMMARIES = {
+    "faculty_activity": (FacultyActivitySummary, """
+        SELECT f.name AS facultad,
+               COUNT(DISTINCT pl.user_id) AS usuarios_activos,
+               COUNT(pl.id) AS sesiones
+        FROM fit_progresslog pl
+        JOIN auth_user u ON pl.user_id = u.id
+        JOIN users usr ON u.username = usr.username
+        JOIN employees e ON usr.employee_id = e.id
+        JOIN faculties f ON e.faculty_code = f.code
+        WHERE pl.fecha >= {desde}
+        GROUP BY f.name
+    """),
+    "trainer_effectiveness": (TrainerEffectivenessSummary, """
+        SELECT a.trainer_id,
+               u.username,
+               a.asignados,
+               COALESCE(s.sesiones, 0) AS sesiones_totales,
+               COALESCE(r.recomendaciones, 0) AS recomendaciones
+        FROM (
+            SELECT trainer_id, COUNT(DISTINCT user_id) AS asignados
+            FROM fit_trainerassignment
+            WHERE activo = TRUE
+            GROUP BY trainer_id
+        ) a
+        JOIN auth_user u ON u.id = a.trainer_id
+        LEFT JOIN (
+            SELECT ta.trainer_id, COUNT(pl.id) AS sesiones
+            FROM (SELECT DISTINCT trainer_id, user_id FROM fit_trainerassignment WHERE activo = TRUE) ta
+            JOIN fit_progresslog pl ON pl.user_id = ta.user_id
+            GROUP BY ta.trainer_id
+        ) s ON s.trainer_id = a.trainer_id
+        LEFT JOIN (
+            SELECT trainer_id, COUNT(*) AS recomendaciones
+            FROM fit_trainerrecommendation
+            GROUP BY trainer_id
+        ) r ON r.trainer_id = a.trainer_id
+    """),
+    "exercise_popularity": (ExercisePopularitySummary, """
+        SELECT e.id AS exercise_id, e.nombre, e.tipo, COUNT(ri.id) AS veces_usado
+        FROM fit_routineitem ri
+        JOIN fit_exercise e ON e.id = ri.exercise_id
+        GROUP BY e.id, e.nombre, e.tipo
+    """),
+    "routine_popularity": (RoutinePopularitySummary, """
+        SELECT r.nombre, COUNT(pl.id) AS veces_usada
+        FROM fit_progresslog pl
+        JOIN fit_routine r ON r.id = pl.routine_id
+        GROUP BY r.nombre
+    """),
+}
+
+
+def _columnas(model):
+    return [field.column for field in model._meta.concrete_fields]
+
+
+class AnalyticsSummaryService:
+    """Creación y refresco de los resúmenes de analítica"""
+
+    @staticmethod
+    def uses_materialized_views():
+        return connection.vendor == "postgresql"
+
+    @staticmethod
+    def refresh(nombre, concurrently=True, rebuild=False):
+        """Refresca un resumen creándolo si no existe. Devuelve el número de filas"""
+        model, sql = SUMMARIES[nombre]
+        if AnalyticsSummaryService.uses_materialized_views():
+            AnalyticsSummaryService._refresh_materialized(model, sql, concurrently, rebuild)
+        else:
+            AnalyticsSummaryService._refresh_table(model, sql, rebuild)
+        return model.objects.count()
+
+    @staticmethod
+    def _refresh_materialized(model, sql, concurrently, rebuild):
+        qn = connection.ops.quote_name
+        vista = model._meta.db_table
+        pk = model._meta.pk.column
+        with connection.cursor() as cur:
+            if rebuild:
+                cur.execute(f"DROP MATERIALIZED VIEW IF EXISTS {qn(vista)}")
+            cur.execute("SELECT 1 FROM pg_matviews WHERE matviewname = %s", [vista])
+            if cur.fetchone() is None:
+                # Recién creada con datos: no hace falta refrescarla
+                desde = f"CURRENT_DATE - {VENTANA_FACULTADES_DIAS}"
+                cur.execute(f"CREATE MATERIALIZED VIEW {qn(vista)} AS {sql.format(desde=desde)}")
+                # El índice único es requisito de REFRESH ... CONCURRENTLY
+                cur.execute(f"CREATE UNIQUE INDEX {qn(vista + '_pk')} ON {qn(vista)} ({qn(pk)})")
+                return
+            modo = "CONCURRENTLY " if concurrently else ""
+            cur.execute(f"REFRESH MATERIALIZED VIEW {modo}{qn(vista)}")
+
+    @staticmethod
+    def _refresh_table(model, sql, rebuild):
+        qn = connection.ops.quote_name
+        tabla = model._meta.db_table
+        existentes = connection.introspection.table_names()
+        with connection.cursor() as cur:
+            if rebuild and tabla in existentes:
+                cur.execute(f"DROP TABLE {qn(tabla)}")
+                existentes.remove(tabla)
+            if tabla not in existentes:
+                # DDL generado desde el modelo, sin schema_editor (usable dentro de transacciones)
+                ddl, params = connection.SchemaEditorClass(connection).table_sql(model)
+                cur.execute(ddl, params)
+        columnas = ", ".join(qn(c) for c in _columnas(model))
+        desde = date.today() - timedelta(days=VENTANA_FACULTADES_DIAS)
+        params = [desde] if "{desde}" in sql else []
+        with transaction.atomic():
+            with connection.cursor() as cur:
+                cur.execute(f"DELETE FROM {qn(tabla)}")
+                try:
+                    with transaction.atomic():
+                        cur.execute(f"INSERT INTO {qn(tabla)} ({columnas}) {sql.format(desde='%s')}", params)
+                except Exception as e:
+                    # Sin BD institucional el resumen de facultades queda vacío
+                    logger.warning(f"No se pudo calcular el resumen {tabla}: {e}")
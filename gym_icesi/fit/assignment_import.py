@@ -0,0 +1,185 @@
+"""
+Importación masiva de asignaciones usuario -> entrenador desde CSV.
+El archivo se lee en streaming y se procesa por lotes: en cada lote los usernames se resuelven
+con dos consultas (usuarios y entrenadores), el lote se compara con las asignaciones existentes
+de esos usuarios y solo se escriben las diferencias (bulk_update de desactivaciones y
+reactivaciones, bulk_create de asignaciones nuevas y de su historial) en una transacción. El
+espejo en MongoDB se hace con un bulk_write por lote.
+"""
+import csv
+import logging
+from datetime import date
+
+from django.contrib.auth.models import User
+
+from .assignment_service import instructores
+from .models import AssignmentHistory, TrainerAssignment
+from .mongodb_service import TrainerAssignmentService as MongoAssignmentService
+from .stats_service import StatsDispatcher
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+ENCABEZADOS = {"usuario", "user", "username"}
+
+
+def read_pairs(lineas):
+    """
+    Genera (número de línea, usuario, entrenador) a partir de las líneas de un CSV con dos
+    columnas. Se omiten las líneas vacías y un encabezado opcional (usuario,entrenador).
+    """
+    for numero, fila in enumerate(csv.reader(lineas), start=1):
+        fila = [celda.strip() for celda in fila]
+        if not any(fila):
+            continue
+        if numero == 1 and fila[0].lower() in ENCABEZADOS:
+            continue
+        if len(fila) < 2 or not fila[0] or not fila[1]:
+            yield numero, None, None
+            continue
+        yield numero, fila[0], fila[1]
+
+
+def _lotes(pares, tamano):
+    lote = []
+    for par in pares:
+        lote.append(par)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+class AssignmentImportService:
+    """Servicio de importación de asignaciones por lotes"""
+
+    @staticmethod
+    def import_csv(lineas, administrador=None, dry_run=False, batch_size=BATCH_SIZE):
+        """
+        Importa las parejas del CSV. Si un usuario aparece varias veces vale la última.
+        Devuelve un resumen con `creadas`, `reactivadas`, `desactivadas`, `sin_cambios` y
+        `errores` [(línea, mensaje)].
+        """
+        resumen = {"creadas": 0, "reactivadas": 0, "desactivadas": 0, "sin_cambios": 0, "errores": []}
+        for lote in _lotes(read_pairs(lineas), max(batch_size, 1)):
+            AssignmentImportService._import_batch(lote, administrador, dry_run, resumen)
+        return resumen
+
+    @staticmethod
+    def _import_batch(lote, administrador, dry_run, resumen):
+        usuarios = dict(
+            User.objects.filter(
+                username__in={u for _, u, _ in lote if u}, is_staff=False, is_superuser=False
+            ).values_list("username", "id")
+        )
+        entrenadores = dict(
+            instructores().filter(username__in={t for _, _, t in lote if t}).values_list("username", "id")
+        )
+
+        # Última pareja válida de cada usuario: {user_id: (línea, trainer_id)}
+        deseadas = {}
+        for numero, username, trainer_username in lote:
+            if username is None:
+                resumen["errores"].append((numero, "Se esperaban dos columnas: usuario,entrenador"))
+            elif username not in usuarios:
+                resumen["errores"].append((numero, f"Usuario no encontrado: {username}"))
+            elif trainer_username not in entrenadores:
+                resumen["errores"].append((numero, f"Entrenador no encontrado: {trainer_username}"))
+            else:
+                deseadas[usuarios[username]] = (numero, entrenadores[trainer_username])
+        if not deseadas:
+            return
+
+        with StatsDispatcher.coalesce():
+            existentes = {}
+            for asignacion in (
+                TrainerAssignment.objects.select_for_update()
+                .filter(user_id__in=list(deseadas))
+                .select_related("user", "trainer")
+                .order_by("id")
+            ):
+                existentes.setdefault(asignacion.user_id, []).append(asignacion)
+
+            desactivar, reactivar, crear = [], [], []
+            for user_id, (numero, trainer_id) in deseadas.items():
+                filas = existentes.get(user_id, [])
+                inactivas = {a.trainer_id for a in filas if not a.activo}
+                salientes = [a for a in filas if a.activo and a.trainer_id != trainer_id]
+                conflictos = [a for a in salientes if a.trainer_id in inactivas]
+                if conflictos:
+                    # (usuario, entrenador, activo) es único: ya hay una desactivada igual
+                    resumen["errores"].append((
+                        numero,
+                        f"No se puede desactivar la asignación con {conflictos[0].trainer.username}: "
+                        "ya existe una desactivada",
+                    ))
+                    continue
+                desactivar.extend(salientes)
+                if any(a.activo and a.trainer_id == trainer_id for a in filas):
+                    if not salientes:
+                        resumen["sin_cambios"] += 1
+                    continue
+                anterior = next((a for a in filas if not a.activo and a.trainer_id == trainer_id), None)
+                if anterior is not None:
+                    reactivar.append(anterior)
+                else:
+                    crear.append(TrainerAssignment(user_id=user_id, trainer_id=trainer_id, activo=True))
+
+            resumen["desactivadas"] += len(desactivar)
+            resumen["reactivadas"] += len(reactivar)
+            resumen["creadas"] += len(crear)
+            if dry_run or not (desactivar or reactivar or crear):
+                return
+
+            # Primero las desactivaciones para liberar (usuario, entrenador, activo=True)
+            for asignacion in desactivar:
+                asignacion.activo = False
+            for asignacion in reactivar:
+                asignacion.activo = True
+            TrainerAssignment.objects.bulk_update(desactivar, ["activo"], batch_size=500)
+            TrainerAssignment.objects.bulk_update(reactivar, ["activo"], batch_size=500)
+            nuevas = TrainerAssignment.objects.bulk_create(crear, batch_size=500)
+
+            autor = administrador.username if administrador else "el sistema"
+            AssignmentHistory.objects.bulk_create(
+                [
+                    AssignmentHistory(
+                        assignment=a, accion=accion, administrador=administrador, notas=f"Importación CSV por {autor}"
+                    )
+                    for accion, asignaciones in (("desactivada", desactivar), ("reactivada", reactivar), ("creada", nuevas))
+                    for a in asignaciones
+                ],
+                batch_size=500,
+            )
+            # bulk_create no emite post_save: se marcan los meses de los entrenadores afectados
+            hoy = date.today()
+            for trainer_id in {a.trainer_id for a in nuevas}:
+                StatsDispatcher.trainer(trainer_id, hoy, "asignaciones_nuevas", 1)
+
+        # Las filas existentes traen user y trainer; las nuevas solo sus ids
+        nombres = {user_id: username for username, user_id in usuarios.items()}
+        nombres.update({trainer_id: username for username, trainer_id in entrenadores.items()})
+        documentos = [
+            {
+                "assignment_id": a.id,
+                "user_id": a.user.username,
+                "trainer_id": a.trainer.username,
+                "fecha_asignacion": a.fecha_asignacion,
+                "activo": a.activo,
+            }
+            for a in [*desactivar, *reactivar]
+        ] + [
+            {
+                "assignment_id": a.id,
+                "user_id": nombres[a.user_id],
+                "trainer_id": nombres[a.trainer_id],
+                "fecha_asignacion": a.fecha_asignacion,
+                "activo": True,
+            }
+            for a in nuevas
+        ]
+        try:
+            MongoAssignmentService.save_assignments(documentos)
+        except Exception as e:
+            logger.warning(f"No se pudieron guardar las asignaciones importadas en MongoDB: {e}")
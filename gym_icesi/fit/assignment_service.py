@@ -0,0 +1,210 @@
+"""
+Asignación automática de entrenadores.
+Reparte los usuarios sin entrenador activo entre los instructores respetando la capacidad de
+cada uno (registro de configuración), prefiriendo un instructor de la misma facultad o sede del usuario y,
+entre los candidatos, el de menor carga. Cada grupo de afinidad es un montículo (heapq) de
+(carga, id) con invalidación perezosa, así elegir entrenador cuesta O(log n). El plan se calcula
+con un número fijo de consultas y se guarda con bulk_create de asignaciones e historial en una
+sola transacción; plan() sin apply() sirve de vista previa.
+"""
+import heapq
+import logging
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .config_service import ConfigService
+
+from .institutional_service import InstitutionalService
+from .models import AssignmentHistory, TestAccount, TrainerAssignment
+from .mongodb_service import TrainerAssignmentService as MongoAssignmentService
+from .stats_service import StatsDispatcher
+
+logger = logging.getLogger(__name__)
+
+# Capacidad general y, por entrenador, `capacidad_entrenador:<username>`
+CAPACIDAD_CLAVE = "capacidad_entrenador"
+
+# Afinidades en orden de preferencia (claves de InstitutionalService.info_many)
+AFINIDADES = ("faculty", "campus")
+AFINIDAD_NOMBRES = {"faculty": "misma facultad", "campus": "misma sede"}
+
+
+def _tomar(heap, carga, capacidades):
+    """Entrenador de menor carga del montículo, descartando entradas obsoletas o sin cupo"""
+    while heap:
+        carga_entrada, trainer_id = heap[0]
+        if carga_entrada == carga[trainer_id] and carga[trainer_id] < capacidades[trainer_id]:
+            return trainer_id
+        heapq.heappop(heap)
+    return None
+
+
+def instructores():
+    """Queryset de los instructores activos"""
+    queryset = User.objects.filter(is_active=True)
+    if InstitutionalService.available():
+        return queryset.filter(username__in=InstitutionalService.instructor_usernames())
+    # Sin BD institucional los entrenadores son el staff que no es superusuario
+    return queryset.filter(is_staff=True, is_superuser=False)
+
+
+class TrainerAutoAssignService:
+    """Servicio de reparto automático de usuarios sin entrenador"""
+
+    @staticmethod
+    def trainers():
+        """Instructores activos con su carga actual en `asignados_activos` (una consulta)"""
+        return list(
+            instructores().annotate(
+                asignados_activos=Count(
+                    "trainer_assignment_trainer", filter=Q(trainer_assignment_trainer__activo=True)
+                )
+            ).order_by("id")
+        )
+
+    @staticmethod
+    def unassigned():
+        """Usuarios estándar sin asignación activa, en orden de alta"""
+        queryset = User.objects.filter(is_active=True, is_staff=False, is_superuser=False).exclude(
+            id__in=TestAccount.objects.values("user_id")
+        )
+        if InstitutionalService.available():
+            queryset = queryset.filter(username__in=InstitutionalService.eligible_usernames())
+        activas = TrainerAssignment.objects.filter(user=OuterRef("pk"), activo=True)
+        return queryset.filter(~Exists(activas)).order_by("id")
+
+    @staticmethod
+    def capacities(trainers):
+        """{trainer_id: capacidad}: la clave específica del entrenador o la general (sin consultas)"""
+        return {trainer.id: ConfigService.get(CAPACIDAD_CLAVE, trainer.username) for trainer in trainers}
+
+    @staticmethod
+    def plan(limit=None):
+        """
+        Calcula el reparto sin escribir nada. Devuelve un dict con
+        `asignaciones` [(usuario, entrenador, afinidad | None)], `sin_cupo` [usuarios] y
+        `entrenadores` [(entrenador, capacidad, carga actual, carga final)].
+        """
+        trainers = TrainerAutoAssignService.trainers()
+        usuarios = TrainerAutoAssignService.unassigned()
+        usuarios = list(usuarios[:limit] if limit else usuarios)
+        capacidades = TrainerAutoAssignService.capacities(trainers)
+        info = InstitutionalService.info_many(
+            [t.username for t in trainers] + [u.username for u in usuarios]
+        )
+        por_id = {trainer.id: trainer for trainer in trainers}
+        carga = {trainer.id: trainer.asignados_activos for trainer in trainers}
+
+        # Montículo general y uno por (afinidad, valor); grupos_de: montículos de cada entrenador
+        general = []
+        grupos = {}
+        grupos_de = {}
+        for trainer in trainers:
+            if carga[trainer.id] >= capacidades[trainer.id]:
+                continue
+            montones = [general]
+            datos = info.get(trainer.username, {})
+            for afinidad in AFINIDADES:
+                if datos.get(afinidad):
+                    montones.append(grupos.setdefault((afinidad, datos[afinidad]), []))
+            grupos_de[trainer.id] = montones
+            for heap in montones:
+                heap.append((carga[trainer.id], trainer.id))
+        for heap in [general, *grupos.values()]:
+            heapq.heapify(heap)
+
+        def afines(usuario):
+            datos = info.get(usuario.username, {})
+            return [(a, grupos[(a, datos.get(a))]) for a in AFINIDADES if (a, datos.get(a)) in grupos]
+
+        # Primero los usuarios con instructores afines, para que no les quiten el cupo los demás
+        usuarios.sort(key=lambda u: not afines(u))
+
+        asignaciones = []
+        sin_cupo = []
+        for usuario in usuarios:
+            elegido = motivo = None
+            for afinidad, heap in afines(usuario):
+                elegido = _tomar(heap, carga, capacidades)
+                if elegido is not None:
+                    motivo = afinidad
+                    break
+            if elegido is None:
+                elegido = _tomar(general, carga, capacidades)
+            if elegido is None:
+                sin_cupo.append(usuario)
+                continue
+            carga[elegido] += 1
+            if carga[elegido] < capacidades[elegido]:
+                for heap in grupos_de[elegido]:
+                    heapq.heappush(heap, (carga[elegido], elegido))
+            asignaciones.append((usuario, por_id[elegido], motivo))
+
+        return {
+            "asignaciones": asignaciones,
+            "sin_cupo": sin_cupo,
+            "entrenadores": [
+                (t, capacidades[t.id], t.asignados_activos, carga[t.id]) for t in trainers
+            ],
+        }
+
+    @staticmethod
+    def apply(plan, administrador=None):
+        """
+        Guarda el plan en una transacción (bulk_create de asignaciones y de historial) y lo
+        refleja en MongoDB con un solo bulk_write. Se omiten los usuarios que recibieron
+        entrenador después de calcular el plan; sus filas de usuario se bloquean antes de
+        comprobarlo. Devuelve las asignaciones creadas.
+        """
+        if not plan["asignaciones"]:
+            return []
+        autor = administrador.username if administrador else "el sistema"
+        user_ids = sorted({u.id for u, _, _ in plan["asignaciones"]})
+        with StatsDispatcher.coalesce():
+            # Se bloquean las filas de los usuarios (en orden de id): sin asignación activa no hay
+            # fila de TrainerAssignment que bloquear y dos ejecuciones concurrentes crearían ambas
+            list(User.objects.select_for_update().filter(pk__in=user_ids).order_by("pk").values_list("pk", flat=True))
+            ocupados = set(
+                TrainerAssignment.objects.select_for_update()
+                .filter(user_id__in=user_ids, activo=True)
+                .values_list("user_id", flat=True)
+            )
+            pendientes = [fila for fila in plan["asignaciones"] if fila[0].id not in ocupados]
+            nuevas = TrainerAssignment.objects.bulk_create(
+                [TrainerAssignment(user=usuario, trainer=trainer, activo=True) for usuario, trainer, _ in pendientes],
+                batch_size=500,
+            )
+            AssignmentHistory.objects.bulk_create(
+                [
+                    AssignmentHistory(
+                        assignment=asignacion,
+                        accion="creada",
+                        administrador=administrador,
+                        notas=f"Asignación automática por {autor}"
+                        + (f" ({AFINIDAD_NOMBRES[motivo]})" if motivo else ""),
+                    )
+                    for asignacion, (_, _, motivo) in zip(nuevas, pendientes)
+                ],
+                batch_size=500,
+            )
+            # bulk_create no emite post_save: se marcan los meses de los entrenadores afectados
+            hoy = date.today()
+            for trainer_id in {asignacion.trainer_id for asignacion in nuevas}:
+                StatsDispatcher.trainer(trainer_id, hoy, "asignaciones_nuevas", 1)
+
+        try:
+            MongoAssignmentService.save_assignments([
+                {
+                    "assignment_id": asignacion.id,
+                    "user_id": asignacion.user.username,
+                    "trainer_id": asignacion.trainer.username,
+                    "fecha_asignacion": asignacion.fecha_asignacion,
+                    "activo": True,
+                }
+                for asignacion in nuevas
+            ])
+        except Exception as e:
+            logger.warning(f"No se pudieron guardar las asignaciones en MongoDB: {e}")
+        return nuevas
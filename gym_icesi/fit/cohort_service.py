@@ -0,0 +1,133 @@
+"""
+Comparación de los asignados de un entrenador (cohorte).
+Las métricas de todos los asignados salen de una sola consulta agrupada por usuario sobre el
+rollup diario (DailyActivity) de las últimas VENTANA_DIAS, y cada métrica se convierte en
+percentil dentro de la cohorte con NumPy. El resultado se cachea por entrenador y día.
+"""
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+from .models import DailyActivity, TrainerAssignment
+
+KEY_PREFIX = "fit:cohort"
+VENTANA_DIAS = 28
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# Métricas comparadas: a mayor valor, mejor percentil
+METRICAS = ("sesiones_semana", "esfuerzo_promedio", "adherencia", "tendencia_volumen")
+
+
+def percentiles(valores):
+    """
+    Percentil (0-100) de cada valor dentro del arreglo, con rango medio para empates.
+    Los valores NaN quedan fuera de la comparación y reciben NaN.
+    """
+    valores = np.asarray(valores, dtype=float)
+    validos = np.sort(valores[~np.isnan(valores)])
+    n = len(validos)
+    if n == 0:
+        return np.full(len(valores), np.nan)
+    menores = np.searchsorted(validos, valores, side="left")
+    iguales = np.searchsorted(validos, valores, side="right") - menores
+    resultado = (menores + 0.5 * iguales) / n * 100
+    resultado[np.isnan(valores)] = np.nan
+    return resultado
+
+
+def _redondear(valor, decimales=1):
+    return None if valor is None else round(valor, decimales)
+
+
+class TrainerCohortService:
+    """Servicio de métricas y percentiles de la cohorte de un entrenador"""
+
+    @staticmethod
+    def metrics(trainer_id, hoy=None, dias=VENTANA_DIAS):
+        """
+        Métricas por asignado activo: sesiones por semana, esfuerzo promedio, adherencia
+        (% de días con actividad) y tendencia de volumen (% de cambio de minutos entre la
+        segunda y la primera mitad de la ventana). Dos consultas: asignados y agregados.
+        """
+        hoy = hoy or date.today()
+        desde = hoy - timedelta(days=dias - 1)
+        mitad = desde + timedelta(days=dias // 2)
+        asignados = list(
+            TrainerAssignment.objects.filter(trainer_id=trainer_id, activo=True)
+            .order_by("user__username")
+            .values_list("user_id", "user__username")
+        )
+        agregados = {
+            fila["user_id"]: fila
+            for fila in DailyActivity.objects.filter(
+                user_id__in=[user_id for user_id, _ in asignados], fecha__range=(desde, hoy)
+            )
+            .order_by()
+            .values("user_id")
+            .annotate(
+                sesiones=Sum("sesiones"),
+                dias_activos=Count("id"),
+                esfuerzo_sum=Sum("esfuerzo_sum"),
+                tiempo_previo=Sum("tiempo_total", filter=Q(fecha__lt=mitad)),
+                tiempo_reciente=Sum("tiempo_total", filter=Q(fecha__gte=mitad)),
+            )
+        }
+        filas = []
+        for user_id, username in asignados:
+            fila = agregados.get(user_id, {})
+            sesiones = fila.get("sesiones") or 0
+            previo = fila.get("tiempo_previo") or 0
+            reciente = fila.get("tiempo_reciente") or 0
+            filas.append({
+                "user_id": user_id,
+                "username": username,
+                "sesiones": sesiones,
+                "sesiones_semana": round(sesiones / (dias / 7), 2),
+                "esfuerzo_promedio": _redondear(fila["esfuerzo_sum"] / sesiones) if sesiones else None,
+                "adherencia": round((fila.get("dias_activos") or 0) / dias * 100, 1),
+                "volumen_minutos": round((previo + reciente) / 60),
+                "tendencia_volumen": _redondear((reciente - previo) / previo * 100) if previo else None,
+            })
+        return filas
+
+    @staticmethod
+    def rank(filas):
+        """Añade a cada fila `percentiles` {métrica: 0-100 | None}, calculados por columna"""
+        if not filas:
+            return filas
+        for fila in filas:
+            fila["percentiles"] = dict.fromkeys(METRICAS)
+        if not NUMPY_AVAILABLE:
+            return filas
+        for metrica in METRICAS:
+            columna = np.array(
+                [np.nan if f[metrica] is None else f[metrica] for f in filas], dtype=float
+            )
+            for fila, p in zip(filas, percentiles(columna)):
+                fila["percentiles"][metrica] = None if np.isnan(p) else int(round(p))
+        return filas
+
+    @staticmethod
+    def get(trainer_id, hoy=None):
+        """Cohorte con percentiles, cacheada por entrenador y día"""
+        hoy = hoy or date.today()
+        key = f"{KEY_PREFIX}:{trainer_id}:{hoy.isoformat()}"
+        datos = cache.get(key)
+        if datos is None:
+            filas = TrainerCohortService.rank(TrainerCohortService.metrics(trainer_id, hoy))
+            datos = {
+                "fecha": hoy.isoformat(),
+                "ventana_dias": VENTANA_DIAS,
+                "metricas": list(METRICAS),
+                "asignados": filas,
+            }
+            cache.set(key, datos, CACHE_TIMEOUT)
+        return datos
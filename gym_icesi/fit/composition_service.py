@@ -0,0 +1,144 @@
+"""
+Composición de rutinas por tipo de ejercicio.
+Mantiene la tabla RoutineComposition (rutina -> {tipo: peso, duración total}) para que las
+distribuciones por tipo de los reportes sean una sola consulta agrupada sobre ProgressLog.
+"""
+from django.db import connections, transaction
+from django.db.models import Count, F, FloatField, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import RoutineComposition, RoutineItem
+
+
+def composition_rows(items):
+    """
+    Agrupa los ítems por tipo de ejercicio.
+    Devuelve {routine_id: {tipo: {"items", "duracion_seg"}}}.
+    """
+    rows = (
+        items.values("routine_id", "exercise__tipo")
+        .annotate(
+            items=Count("id"),
+            duracion_seg=Sum(
+                Coalesce("tiempo_seg", F("exercise__duracion_min") * 60, Value(0))
+            ),
+        )
+        .order_by()
+    )
+    composicion = {}
+    for row in rows:
+        composicion.setdefault(row["routine_id"], {})[row["exercise__tipo"]] = {
+            "items": row["items"],
+            "duracion_seg": row["duracion_seg"] or 0,
+        }
+    return composicion
+
+
+class RoutineCompositionService:
+    """Servicio para mantener y consultar la composición de rutinas"""
+
+    @staticmethod
+    def rebuild(routine_ids):
+        """Recalcula la composición de las rutinas indicadas"""
+        if isinstance(routine_ids, int):
+            routine_ids = [routine_ids]
+        routine_ids = list(routine_ids)
+        if not routine_ids:
+            return 0
+
+        composicion = composition_rows(RoutineItem.objects.filter(routine_id__in=routine_ids))
+        nuevas = []
+        for routine_id, tipos in composicion.items():
+            total_items = sum(t["items"] for t in tipos.values())
+            for tipo, datos in tipos.items():
+                nuevas.append(RoutineComposition(
+                    routine_id=routine_id,
+                    tipo=tipo,
+                    items=datos["items"],
+                    peso=datos["items"] / total_items,
+                    duracion_seg=datos["duracion_seg"],
+                ))
+
+        with transaction.atomic():
+            RoutineComposition.objects.filter(routine_id__in=routine_ids).delete()
+            RoutineComposition.objects.bulk_create(nuevas)
+        return len(nuevas)
+
+    @staticmethod
+    def rebuild_for_exercise(exercise_id):
+        """Recalcula las rutinas que usan un ejercicio (p. ej. si cambió su tipo)"""
+        routine_ids = (
+            RoutineItem.objects.filter(exercise_id=exercise_id)
+            .values_list("routine_id", flat=True)
+            .distinct()
+        )
+        return RoutineCompositionService.rebuild(routine_ids)
+
+    @staticmethod
+    def type_distribution(logs):
+        """
+        Distribución por tipo de ejercicio de un queryset de ProgressLog en una consulta.
+        Devuelve {tipo: {"sesiones": sesiones que incluyen el tipo,
+                         "tiempo": tiempo_seg atribuido proporcionalmente al peso del tipo}}.
+        """
+        rows = (
+            logs.filter(routine__composition__isnull=False)
+            .values("routine__composition__tipo")
+            .annotate(
+                sesiones=Count("id"),
+                tiempo=Sum(
+                    F("tiempo_seg") * F("routine__composition__peso"),
+                    output_field=FloatField(),
+                ),
+            )
+            .order_by("routine__composition__tipo")
+        )
+        return {
+            row["routine__composition__tipo"]: {
+                "sesiones": row["sesiones"],
+                "tiempo": row["tiempo"] or 0,
+            }
+            for row in rows
+        }
+
+    @staticmethod
+    def load_balance(logs):
+        """
+        Balance de carga por tipo de ejercicio de un queryset de ProgressLog en una consulta.
+        Los registros se preagregan por rutina en una tabla derivada y el volumen de cada
+        rutina (sesiones, repeticiones, tiempo) se reparte entre sus tipos según el peso de la
+        composición, sin multiplicar filas de ProgressLog por ítem.
+        Devuelve una lista ordenada por tipo de {"tipo", "sesiones", "total_reps", "total_tiempo"}.
+        """
+        por_rutina = (
+            logs.order_by()
+            .values("routine_id")
+            .annotate(
+                sesiones=Count("id"),
+                reps=Coalesce(Sum("repeticiones"), Value(0)),
+                tiempo=Coalesce(Sum("tiempo_seg"), Value(0)),
+            )
+        )
+        sql, params = por_rutina.query.sql_with_params()
+        tabla = connections[logs.db].ops.quote_name(RoutineComposition._meta.db_table)
+        with connections[logs.db].cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT c.tipo, SUM(c.peso * r.sesiones), SUM(c.peso * r.reps), SUM(c.peso * r.tiempo)
+                FROM ({sql}) r
+                JOIN {tabla} c ON c.routine_id = r.routine_id
+                GROUP BY c.tipo
+                ORDER BY c.tipo
+                """,
+                params,
+            )
+            rows = cur.fetchall()
+        return [
+            {
+                "tipo": tipo,
+                "sesiones": round(sesiones or 0, 1),
+                "total_reps": round(reps or 0),
+                "total_tiempo": round(tiempo or 0),
+            }
+            for tipo, sesiones, reps, tiempo in rows
+        ]
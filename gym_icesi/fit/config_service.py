@@ -0,0 +1,209 @@
+"""
+Registro tipado de la configuración del sistema (SystemConfig).
+Las claves conocidas se declaran en REGISTRO con su tipo, valor por defecto y límites; las demás
+(p. ej. los checkpoints de precompute_reports) siguen siendo texto libre. Los valores declarados
+se leen de la BD una vez y quedan en un diccionario del proceso: leer una clave es una búsqueda en
+ese diccionario. La versión de la configuración se deriva de la BD (última fecha_actualizacion y
+número de filas de las claves declaradas), que comparten todos los procesos: cada proceso la
+consulta como máximo una vez cada CHECK_INTERVAL segundos y recarga todas las claves con una
+consulta si cambió. El proceso que guarda un cambio recarga en la siguiente lectura.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max, Q
+
+from .models import SystemConfig
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL = 2  # Segundos entre comprobaciones de la versión en la BD
+
+VERDADEROS = {"true", "1", "si", "sí", "yes", "on"}
+FALSOS = {"false", "0", "no", "off"}
+
+
+class Setting:
+    """
+    Clave declarada. Con `por_entidad` admite además `<clave>:<entidad>` (p. ej. la capacidad de
+    un entrenador concreto) con el mismo tipo y, si falta, el valor general.
+    """
+
+    TIPOS = {int: "entero", float: "decimal", bool: "sí/no", str: "texto"}
+
+    def __init__(self, clave, tipo, defecto, descripcion, minimo=None, maximo=None, por_entidad=False):
+        self.clave = clave
+        self.tipo = tipo
+        self.defecto = defecto
+        self.descripcion = descripcion
+        self.minimo = minimo
+        self.maximo = maximo
+        self.por_entidad = por_entidad
+
+    @property
+    def tipo_nombre(self):
+        return self.TIPOS[self.tipo]
+
+    def parse(self, valor):
+        """Convierte el texto guardado al tipo declarado; ValidationError si no es válido"""
+        texto = str(valor).strip()
+        if self.tipo is bool:
+            if texto.lower() in VERDADEROS:
+                return True
+            if texto.lower() in FALSOS:
+                return False
+            raise ValidationError(f"'{self.clave}' debe ser true o false")
+        try:
+            convertido = self.tipo(texto)
+        except ValueError:
+            raise ValidationError(f"'{self.clave}' debe ser de tipo {self.tipo_nombre}")
+        if self.minimo is not None and convertido < self.minimo:
+            raise ValidationError(f"'{self.clave}' debe ser mayor o igual que {self.minimo}")
+        if self.maximo is not None and convertido > self.maximo:
+            raise ValidationError(f"'{self.clave}' debe ser menor o igual que {self.maximo}")
+        return convertido
+
+    def format(self, valor):
+        """Texto a guardar en SystemConfig.valor"""
+        if self.tipo is bool:
+            return "true" if valor else "false"
+        return str(valor)
+
+
+REGISTRO = {
+    setting.clave: setting
+    for setting in (
+        Setting(
+            "capacidad_entrenador", int, 30,
+            "Máximo de usuarios con asignación activa por entrenador (admite capacidad_entrenador:<username>)",
+            minimo=0, por_entidad=True,
+        ),
+        Setting(
+            "moderacion_contenido_activa", bool, True,
+            "Encolar para moderación los ejercicios personalizados y las rutinas prediseñadas",
+        ),
+    )
+}
+
+_valores = {}
+_version = None
+_comprobado = 0.0
+
+
+def _setting(clave):
+    """Setting de una clave declarada (directa o `<clave>:<entidad>`), o None si es libre"""
+    if clave in REGISTRO:
+        return REGISTRO[clave]
+    base, separador, _ = clave.partition(":")
+    setting = REGISTRO.get(base) if separador else None
+    return setting if setting is not None and setting.por_entidad else None
+
+
+def _filtro_declaradas():
+    """Q de las filas de SystemConfig con claves declaradas (y sus variantes por entidad)"""
+    filtro = Q(clave__in=list(REGISTRO))
+    for setting in REGISTRO.values():
+        if setting.por_entidad:
+            filtro |= Q(clave__startswith=f"{setting.clave}:")
+    return filtro
+
+
+class ConfigService:
+    """Lectura tipada y cacheada de la configuración del sistema"""
+
+    @staticmethod
+    def _check_interval():
+        return getattr(settings, "CONFIG_CHECK_INTERVAL", CHECK_INTERVAL)
+
+    @staticmethod
+    def _global_version():
+        """(última actualización, filas) de las claves declaradas; el conteo detecta los borrados"""
+        datos = SystemConfig.objects.filter(_filtro_declaradas()).aggregate(
+            ultima=Max("fecha_actualizacion"), filas=Count("id")
+        )
+        return datos["ultima"], datos["filas"]
+
+    @staticmethod
+    def _sync():
+        """Recarga los valores si cambió la versión en la BD (comprobada cada CHECK_INTERVAL)"""
+        global _valores, _version, _comprobado
+        ahora = time.monotonic()
+        if _version is not None and ahora - _comprobado < ConfigService._check_interval():
+            return
+        version = ConfigService._global_version()
+        _comprobado = ahora
+        if version == _version:
+            return
+        valores = {}
+        for clave, valor in SystemConfig.objects.filter(_filtro_declaradas()).values_list("clave", "valor"):
+            try:
+                valores[clave] = _setting(clave).parse(valor)
+            except ValidationError:
+                # Valor inválido guardado por otra vía: se usa el defecto
+                logger.warning(f"Valor inválido en SystemConfig '{clave}': {valor!r}")
+        _valores, _version = valores, version
+
+    @staticmethod
+    def get(clave, entidad=None):
+        """
+        Valor tipado de una clave declarada. Con `entidad` se busca primero `<clave>:<entidad>`
+        y después el valor general; si no hay ninguno, el defecto declarado.
+        """
+        setting = REGISTRO[clave]
+        ConfigService._sync()
+        if entidad is not None:
+            valor = _valores.get(f"{clave}:{entidad}")
+            if valor is not None:
+                return valor
+        return _valores.get(clave, setting.defecto)
+
+    @staticmethod
+    def get_many(claves, entidad=None):
+        """{clave: valor} de varias claves declaradas"""
+        ConfigService._sync()
+        return {clave: ConfigService.get(clave, entidad) for clave in claves}
+
+    @staticmethod
+    def is_declared(clave):
+        return _setting(clave) is not None
+
+    @staticmethod
+    def validate(clave, valor):
+        """
+        Texto normalizado a guardar para `clave`. Las claves declaradas se validan contra su
+        tipo y límites (ValidationError); las libres se guardan tal cual.
+        """
+        setting = _setting(clave)
+        if setting is None:
+            return valor
+        return setting.format(setting.parse(valor))
+
+    @staticmethod
+    def set(clave, valor, descripcion=None):
+        """Valida y guarda una clave; las señales de SystemConfig invalidan el cache"""
+        valor = ConfigService.validate(clave, valor)
+        defaults = {"valor": valor}
+        if descripcion is not None:
+            defaults["descripcion"] = descripcion
+        config, _ = SystemConfig.objects.update_or_create(clave=clave, defaults=defaults)
+        return config
+
+    @staticmethod
+    def invalidate():
+        """
+        Descarta los valores de este proceso. Los demás detectan el cambio por la versión de la
+        BD en su siguiente comprobación.
+        """
+        global _version
+        _version = None
+
+    @staticmethod
+    def declared():
+        """Claves declaradas con su valor actual, para la pantalla de configuración"""
+        ConfigService._sync()
+        return [
+            {"setting": setting, "valor": _valores.get(clave, setting.defecto), "definido": clave in _valores}
+            for clave, setting in sorted(REGISTRO.items())
+        ]
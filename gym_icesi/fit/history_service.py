@@ -0,0 +1,105 @@
+"""
+Consulta del historial de asignaciones para auditoría.
+Los filtros por usuario y entrenador admiten parte del username o del nombre: se resuelven con
+el índice de trigramas de UserSearchIndex (PeopleSearchService.matching) y filtran por las
+asignaciones de esas personas con el índice (assignment, -fecha, -id). El administrador (que no
+está en el índice de búsqueda) se resuelve por username exacto (índice único de auth_user) y usa
+el índice (administrador, -fecha, -id). El rango de fechas compara la columna directamente (sin
+extraer la fecha) para poder usar los índices. Las páginas se leen con cursor sobre
+(-fecha, -id) en lugar de OFFSET y la exportación CSV se genera en streaming.
+"""
+import csv
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .activity_feed import decode_cursor, encode_cursor
+from .models import AssignmentHistory, TrainerAssignment
+from .search_service import PeopleSearchService
+
+HISTORIAL_PAGE_SIZE = 50
+EXPORT_CHUNK_SIZE = 2000
+
+FILTROS = ("user", "trainer", "admin", "accion", "desde", "hasta")
+COLUMNAS_CSV = ["fecha", "usuario", "entrenador", "accion", "administrador", "notas"]
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _user_id(username):
+    """Id del username exacto (índice único) o None"""
+    return User.objects.filter(username=username.strip()).values_list("id", flat=True).first()
+
+
+class _Echo:
+    """Pseudo-archivo para csv.writer: devuelve cada línea en lugar de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+class AssignmentHistoryService:
+    """Servicio de filtrado, paginación y exportación del historial de asignaciones"""
+
+    @staticmethod
+    def filtered(filtros):
+        """
+        Historial filtrado y ordenado por (-fecha, -id). `filtros` admite user y trainer (parte
+        del username o del nombre), admin (username exacto), accion y el rango desde/hasta
+        (fechas ISO, ambos incluidos).
+        Lanza ValueError si una fecha no es válida.
+        """
+        historial = AssignmentHistory.objects.all()
+        for campo in ("user", "trainer"):
+            if filtros.get(campo, "").strip():
+                personas = PeopleSearchService.matching(filtros[campo]).values("user_id")
+                historial = historial.filter(
+                    assignment_id__in=TrainerAssignment.objects.filter(**{f"{campo}_id__in": personas}).values("id")
+                )
+        if filtros.get("admin"):
+            admin_id = _user_id(filtros["admin"])
+            if admin_id is None:
+                # Username inexistente: sin resultados (y sin confundir el admin con los registros del sistema)
+                return historial.none()
+            historial = historial.filter(administrador_id=admin_id)
+        if filtros.get("accion"):
+            historial = historial.filter(accion=filtros["accion"])
+        for campo, lookup, dias in (("desde", "fecha__gte", 0), ("hasta", "fecha__lt", 1)):
+            if filtros.get(campo):
+                fecha = parse_date(filtros[campo])
+                if fecha is None:
+                    raise ValueError(f"Fecha inválida: {filtros[campo]}")
+                historial = historial.filter(**{lookup: _inicio_dia(fecha + timedelta(days=dias))})
+        return historial.order_by("-fecha", "-id")
+
+    @staticmethod
+    def page(historial, cursor=None, limit=HISTORIAL_PAGE_SIZE):
+        """Una página del historial desde `cursor`. Devuelve (registros, cursor siguiente o None)"""
+        if cursor:
+            fecha, registro_id = decode_cursor(cursor)
+            historial = historial.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=registro_id))
+        pagina = list(
+            historial.select_related("assignment__user", "assignment__trainer", "administrador")[:limit + 1]
+        )
+        siguiente = encode_cursor(pagina[limit - 1]) if len(pagina) > limit else None
+        return pagina[:limit], siguiente
+
+    @staticmethod
+    def export_rows(historial):
+        """Líneas CSV del historial (encabezado incluido), leídas por bloques con iterator()"""
+        writer = csv.writer(_Echo())
+        yield writer.writerow(COLUMNAS_CSV)
+        filas = historial.values_list(
+            "fecha", "assignment__user__username", "assignment__trainer__username",
+            "accion", "administrador__username", "notas",
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for fecha, usuario, entrenador, accion, administrador, notas in filas:
+            yield writer.writerow([
+                timezone.localtime(fecha).strftime("%Y-%m-%d %H:%M:%S"),
+                usuario, entrenador, accion, administrador or "", notas,
+            ])
@@ -0,0 +1,245 @@
+"""
+Consultas por lotes a la base de datos institucional (tablas users, students, employees).
+A diferencia de get_institutional_info (una consulta por usuario), resuelve una página
+completa de usuarios con un número fijo de consultas. Si las tablas no existen (p. ej. SQLite
+sin BD institucional) devuelve resultados vacíos. Cada consulta se ejecuta en su propio
+savepoint: un error solo deshace esa sentencia y no deja abortada la transacción en curso.
+"""
+import logging
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import TestAccount
+
+logger = logging.getLogger(__name__)
+
+# Usuarios estándar del gimnasio: estudiantes y empleados que no son instructores ni administrativos
+ELEGIBLES_SQL = """
+    SELECT u.username
+    FROM users u
+    WHERE u.is_active = %s
+    AND (
+        u.role = 'STUDENT'
+        OR (
+            u.role = 'EMPLOYEE'
+            AND u.employee_id IS NOT NULL
+            AND EXISTS (
+                SELECT 1 FROM employees e
+                WHERE e.id = u.employee_id
+                AND UPPER(e.employee_type) NOT IN ('INSTRUCTOR', 'ADMINISTRATIVO')
+            )
+        )
+    )
+"""
+
+INSTRUCTORES_SQL = """
+    SELECT u.username
+    FROM users u
+    JOIN employees e ON u.employee_id = e.id
+    WHERE u.role = 'EMPLOYEE'
+    AND UPPER(e.employee_type) = 'INSTRUCTOR'
+"""
+
+SYNC_CACHE_KEY = "fit:institutional:sync"
+SYNC_INTERVAL = 300  # Segundos entre sincronizaciones de usuarios Django
+
+_disponible = None
+
+
+def _placeholders(valores):
+    return ", ".join(["%s"] * len(valores))
+
+
+def _fetchall(sql, params=()):
+    """Filas de una consulta dentro de un savepoint (DatabaseError si falla)"""
+    with transaction.atomic(), connection.cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+class InstitutionalService:
+    """Servicio de lectura por lotes de datos institucionales"""
+
+    @staticmethod
+    def available():
+        """Si la BD institucional está disponible (se comprueba una vez por proceso)"""
+        global _disponible
+        if _disponible is None:
+            try:
+                _disponible = "users" in connection.introspection.table_names()
+            except Exception:
+                _disponible = False
+        return _disponible
+
+    @staticmethod
+    def eligible_usernames(role=None, campus=None):
+        """
+        Subconsulta SQL (para filtros username__in) con los usernames de usuarios estándar,
+        opcionalmente restringidos por rol o campus (estudiantes).
+        """
+        sql = ELEGIBLES_SQL
+        params = [True]
+        if role:
+            sql += " AND u.role = %s"
+            params.append(role)
+        if campus:
+            sql += """
+                AND u.student_id IN (
+                    SELECT s.id FROM students s JOIN campuses c ON s.campus_code = c.code WHERE c.name = %s
+                )
+            """
+            params.append(campus)
+        return RawSQL(sql, params)
+
+    @staticmethod
+    def instructor_usernames():
+        """Subconsulta SQL (para filtros username__in) con los usernames de los instructores"""
+        return RawSQL(INSTRUCTORES_SQL, [])
+
+    @staticmethod
+    def sync_users(force=False):
+        """
+        Crea en bloque los usuarios Django que faltan para los usuarios institucionales estándar
+        y los instructores (una consulta anti-join y un bulk_create por grupo; los instructores
+        con is_staff) y quita permisos de staff/superusuario a los usuarios estándar. Devuelve
+        {"creados": n, "modificados": [ids]} con los ids de los usuarios existentes cuyos
+        permisos cambiaron (los creados se identifican por id creciente, ver
+        PeopleSearchService.refresh). Sin `force` se ejecuta como máximo una vez cada
+        SYNC_INTERVAL segundos.
+        """
+        resultado = {"creados": 0, "modificados": []}
+        if not InstitutionalService.available():
+            return resultado
+        if not force and not cache.add(SYNC_CACHE_KEY, 1, SYNC_INTERVAL):
+            return resultado
+        auth_user = connection.ops.quote_name(User._meta.db_table)
+        for sql, params, is_staff in ((ELEGIBLES_SQL, [True], False), (INSTRUCTORES_SQL, [], True)):
+            with connection.cursor() as cur:
+                cur.execute(
+                    f"""
+                    SELECT x.username FROM ({sql}) x
+                    WHERE LOWER(x.username) NOT LIKE %s
+                    AND NOT EXISTS (SELECT 1 FROM {auth_user} au WHERE au.username = x.username)
+                    """,
+                    [*params, f"%{TestAccount.PATRON}%"],
+                )
+                faltantes = [fila[0] for fila in cur.fetchall()]
+            User.objects.bulk_create(
+                [User(username=username, is_staff=is_staff, is_superuser=False) for username in faltantes],
+                ignore_conflicts=True,
+                batch_size=1000,
+            )
+            resultado["creados"] += len(faltantes)
+        resultado["modificados"] = list(
+            User.objects.filter(username__in=InstitutionalService.eligible_usernames())
+            .filter(Q(is_staff=True) | Q(is_superuser=True))
+            .values_list("id", flat=True)
+        )
+        if resultado["modificados"]:
+            User.objects.filter(id__in=resultado["modificados"]).update(is_staff=False, is_superuser=False)
+        return resultado
+
+    @staticmethod
+    def campuses():
+        try:
+            return [row[0] for row in _fetchall("SELECT DISTINCT name FROM campuses ORDER BY name")]
+        except DatabaseError:
+            return []
+
+    @staticmethod
+    def info_many(usernames):
+        """
+        {username: datos} con las mismas claves que get_institutional_info
+        (role, student_id, employee_id, first_name, last_name, email, campus y, para
+        empleados, faculty).
+        Tres consultas como máximo, sin importar cuántos usuarios haya.
+        """
+        usernames = list(dict.fromkeys(usernames))
+        if not usernames:
+            return {}
+        resultado = {}
+        try:
+            filas = _fetchall(
+                f"""
+                SELECT username, role, student_id, employee_id
+                FROM users
+                WHERE username IN ({_placeholders(usernames)}) AND is_active = %s
+                """,
+                [*usernames, True],
+            )
+            for username, role, student_id, employee_id in filas:
+                resultado[username] = {"role": role, "student_id": student_id, "employee_id": employee_id}
+
+            por_estudiante = {d["student_id"]: u for u, d in resultado.items() if d["student_id"]}
+            if por_estudiante:
+                filas = _fetchall(
+                    f"""
+                    SELECT s.id, s.first_name, s.last_name, s.email, c.name AS campus
+                    FROM students s
+                    JOIN campuses c ON s.campus_code = c.code
+                    WHERE s.id IN ({_placeholders(por_estudiante)})
+                    """,
+                    list(por_estudiante),
+                )
+                for sid, first_name, last_name, email, campus in filas:
+                    resultado[por_estudiante[sid]].update(
+                        {"first_name": first_name, "last_name": last_name, "email": email, "campus": campus}
+                    )
+
+            por_empleado = {
+                d["employee_id"]: u for u, d in resultado.items() if d["employee_id"] and not d["student_id"]
+            }
+            if por_empleado:
+                filas = _fetchall(
+                    f"""
+                    SELECT e.id, e.first_name, e.last_name, e.email, f.name AS faculty, c.name AS campus
+                    FROM employees e
+                    JOIN faculties f ON e.faculty_code = f.code
+                    LEFT JOIN campuses c ON e.campus_code = c.code
+                    WHERE e.id IN ({_placeholders(por_empleado)})
+                    """,
+                    list(por_empleado),
+                )
+                for eid, first_name, last_name, email, faculty, campus in filas:
+                    resultado[por_empleado[eid]].update({
+                        "first_name": first_name, "last_name": last_name, "email": email,
+                        "faculty": faculty, "campus": campus,
+                    })
+        except DatabaseError as e:
+            logger.debug(f"Datos institucionales no disponibles: {e}")
+        return resultado
+
+    @staticmethod
+    def search_usernames(termino, usernames_qs):
+        """
+        Usernames de `usernames_qs` (queryset con values_list("username")) cuyo nombre o
+        apellido institucional contiene `termino`. Una consulta: el queryset se usa como subconsulta.
+        """
+        termino = (termino or "").strip().lower()
+        if not termino:
+            return []
+        sub_sql, sub_params = usernames_qs.query.sql_with_params()
+        patron = f"%{termino}%"
+        try:
+            filas = _fetchall(
+                f"""
+                SELECT u.username
+                FROM users u
+                LEFT JOIN students s ON s.id = u.student_id
+                LEFT JOIN employees e ON e.id = u.employee_id
+                WHERE u.username IN ({sub_sql})
+                  AND (
+                    LOWER(COALESCE(s.first_name, '') || ' ' || COALESCE(s.last_name, '')) LIKE %s
+                    OR LOWER(COALESCE(e.first_name, '') || ' ' || COALESCE(e.last_name, '')) LIKE %s
+                  )
+                """,
+                [*sub_params, patron, patron],
+            )
+            return [fila[0] for fila in filas]
+        except DatabaseError as e:
+            logger.debug(f"Búsqueda institucional no disponible: {e}")
+            return []
@@ -0,0 +1,44 @@
+"""
+Comando de gestión para asignar entrenador automáticamente a los usuarios que no tienen uno
+Uso: python manage.py auto_assign_trainers [--dry-run] [--limit N] [--admin USERNAME]
+
+Reparte los usuarios sin asignación activa entre los instructores según su capacidad
+(SystemConfig `capacidad_entrenador` y `capacidad_entrenador:<username>`), su afinidad de
+facultad o sede y su carga actual. Con --dry-run solo muestra el plan.
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from fit.assignment_service import AFINIDAD_NOMBRES, TrainerAutoAssignService
+
+
+class Command(BaseCommand):
+    help = 'Asigna entrenador a los usuarios sin asignación activa respetando la capacidad de cada instructor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Mostrar el plan sin guardar')
+        parser.add_argument('--limit', type=int, help='Máximo de usuarios a asignar')
+        parser.add_argument('--admin', help='Username del administrador que figura en el historial')
+
+    def handle(self, *args, **options):
+        administrador = None
+        if options['admin']:
+            administrador = User.objects.filter(username=options['admin']).first()
+            if administrador is None:
+                raise CommandError(f'No existe el usuario {options["admin"]}')
+
+        plan = TrainerAutoAssignService.plan(limit=options['limit'])
+
+        for trainer, capacidad, antes, despues in plan['entrenadores']:
+            self.stdout.write(f'{trainer.username}: {antes} -> {despues} / {capacidad}')
+        for usuario, trainer, motivo in plan['asignaciones']:
+            detalle = f' ({AFINIDAD_NOMBRES[motivo]})' if motivo else ''
+            self.stdout.write(f'  {usuario.username} -> {trainer.username}{detalle}')
+        if plan['sin_cupo']:
+            self.stdout.write(self.style.WARNING(f'{len(plan["sin_cupo"])} usuarios sin cupo disponible'))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'[DRY-RUN] Se crearían {len(plan["asignaciones"])} asignaciones'))
+            return
+        nuevas = TrainerAutoAssignService.apply(plan, administrador=administrador)
+        self.stdout.write(self.style.SUCCESS(f'[OK] {len(nuevas)} asignaciones creadas'))
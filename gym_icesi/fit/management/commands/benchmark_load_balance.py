@@ -0,0 +1,112 @@
+"""
+Comando de gestión para medir la agregación de balance de carga por tipo de ejercicio
+Uso: python manage.py benchmark_load_balance [--logs 100000] [--items 8] [--repeticiones 5]
+
+Crea datos sintéticos dentro de una transacción que se revierte al final y compara la
+agregación anterior (JOIN a routine__items__exercise__tipo) con la basada en la composición
+precalculada de las rutinas.
+"""
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.db.models import Count, Sum
+
+from fit.composition_service import RoutineCompositionService
+from fit.models import Exercise, ProgressLog, Routine, RoutineItem
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compara el tiempo de consulta del balance de carga antes y después (datos sintéticos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logs', type=int, default=100000, help='Registros de progreso sintéticos')
+        parser.add_argument('--rutinas', type=int, default=20, help='Rutinas del usuario sintético')
+        parser.add_argument('--items', type=int, default=8, help='Ítems por rutina')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Ejecuciones por variante')
+
+    def _medir(self, funcion, repeticiones):
+        tiempos = []
+        resultado = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultado = funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        return min(tiempos), resultado
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._benchmark(options)
+                raise _Rollback()
+        except _Rollback:
+            self.stdout.write('Datos sintéticos revertidos')
+
+    def _benchmark(self, options):
+        user = User.objects.create_user(username='benchmark_load_balance')
+        tipos = [t for t, _ in Exercise.TIPO]
+        ejercicios = [
+            Exercise.objects.create(nombre=f'Benchmark {i}', tipo=tipos[i % len(tipos)], duracion_min=5)
+            for i in range(options['items'])
+        ]
+        rutinas = []
+        for r in range(options['rutinas']):
+            rutina = Routine.objects.create(nombre=f'Benchmark {r}', user=user)
+            # Los ítems se crean en bloque: la composición se calcula una vez al final
+            RoutineItem.objects.bulk_create([
+                RoutineItem(routine=rutina, exercise=ejercicios[(r + i) % len(ejercicios)], orden=i)
+                for i in range(options['items'])
+            ])
+            rutinas.append(rutina)
+        RoutineCompositionService.rebuild([r.id for r in rutinas])
+
+        hoy = date.today()
+        ProgressLog.objects.bulk_create(
+            [
+                ProgressLog(
+                    user=user,
+                    routine=rutinas[i % len(rutinas)],
+                    fecha=hoy - timedelta(days=i % 730),
+                    repeticiones=10 + i % 5,
+                    tiempo_seg=600 + i % 300,
+                    esfuerzo=1 + i % 10,
+                )
+                for i in range(options['logs'])
+            ],
+            batch_size=5000,
+        )
+        self.stdout.write(f"{options['logs']} registros, {options['rutinas']} rutinas de {options['items']} ítems")
+
+        logs = ProgressLog.objects.filter(user=user)
+
+        def anterior():
+            return list(
+                logs.values('routine__items__exercise__tipo')
+                .annotate(total_reps=Sum('repeticiones'), total_tiempo=Sum('tiempo_seg'), sesiones=Count('id'))
+                .order_by()
+            )
+
+        def nueva():
+            return RoutineCompositionService.load_balance(logs)
+
+        reset_queries()
+        t_anterior, filas_anteriores = self._medir(anterior, options['repeticiones'])
+        t_nueva, filas_nuevas = self._medir(nueva, options['repeticiones'])
+
+        total_reps = logs.aggregate(total=Sum('repeticiones'))['total'] or 0
+        self.stdout.write(f'Motor: {connection.vendor}')
+        self.stdout.write(
+            f'Antes:   {t_anterior * 1000:8.1f} ms  reps atribuidas={sum(f["total_reps"] or 0 for f in filas_anteriores)}'
+        )
+        self.stdout.write(
+            f'Después: {t_nueva * 1000:8.1f} ms  reps atribuidas={sum(f["total_reps"] for f in filas_nuevas)}'
+        )
+        self.stdout.write(f'Reps reales: {total_reps}')
+        if t_nueva:
+            self.stdout.write(self.style.SUCCESS(f'[OK] Aceleración: {t_anterior / t_nueva:.1f}x'))
@@ -0,0 +1,48 @@
+"""
+Comando de gestión para crear y verificar los índices de MongoDB
+Uso: python manage.py ensure_mongo_indexes [--dry-run] [--collection NOMBRE] [--strict]
+
+Compara los índices de cada colección con el registro declarativo (fit.mongo_indexes), crea los
+que faltan e informa de los índices con opciones distintas a las declaradas y de los que no
+están declarados. Con --strict termina con error si hay divergencias.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from fit.mongo_indexes import MongoIndexRegistry
+from fit.mongodb_service import MongoDBService
+
+
+class Command(BaseCommand):
+    help = 'Crea los índices declarados de MongoDB y reporta las diferencias con los existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo reportar, sin crear índices')
+        parser.add_argument('--collection', choices=MongoIndexRegistry.collections(), help='Solo esta colección')
+        parser.add_argument('--strict', action='store_true', help='Terminar con error si hay índices divergentes')
+
+    def handle(self, *args, **options):
+        if not MongoDBService.is_available():
+            raise CommandError('MongoDB no está disponible')
+        db = MongoDBService.get_db()
+
+        nombres = [options['collection']] if options['collection'] else MongoIndexRegistry.collections()
+        faltantes = divergentes = 0
+        for nombre in nombres:
+            informe = MongoIndexRegistry.ensure(db, nombre, dry_run=options['dry_run'])
+            self.stdout.write(f'{nombre}: {len(informe["correctos"])} correctos')
+            for indice in informe['faltantes']:
+                accion = 'Se crearía' if options['dry_run'] else 'Creado'
+                self.stdout.write(f'  {accion}: {indice}')
+            for indice, detalle in informe['divergentes']:
+                self.stdout.write(self.style.WARNING(f'  Divergente: {indice} ({detalle})'))
+            for indice in informe['no_declarados']:
+                self.stdout.write(self.style.WARNING(f'  No declarado: {indice}'))
+            faltantes += len(informe['faltantes'])
+            divergentes += len(informe['divergentes'])
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'[DRY-RUN] Se crearían {faltantes} índices'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'[OK] {faltantes} índices creados'))
+        if divergentes and options['strict']:
+            raise CommandError(f'{divergentes} índices difieren de la definición')
@@ -0,0 +1,48 @@
+"""
+Comando de gestión para importar asignaciones usuario -> entrenador desde un CSV
+Uso: python manage.py import_assignments archivo.csv [--dry-run] [--batch-size 1000] [--admin USERNAME]
+
+El CSV tiene dos columnas (usuario,entrenador) con encabezado opcional. Se comparan con las
+asignaciones activas y solo se aplican las diferencias. Con --dry-run solo se muestra el resumen.
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from fit.assignment_import import BATCH_SIZE, AssignmentImportService
+
+
+class Command(BaseCommand):
+    help = 'Importa asignaciones de entrenadores desde un CSV usuario,entrenador'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del CSV')
+        parser.add_argument('--dry-run', action='store_true', help='Mostrar los cambios sin guardar')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Filas por lote')
+        parser.add_argument('--admin', help='Username del administrador que figura en el historial')
+
+    def handle(self, *args, **options):
+        administrador = None
+        if options['admin']:
+            administrador = User.objects.filter(username=options['admin']).first()
+            if administrador is None:
+                raise CommandError(f'No existe el usuario {options["admin"]}')
+
+        try:
+            with open(options['archivo'], newline='', encoding='utf-8-sig') as lineas:
+                resumen = AssignmentImportService.import_csv(
+                    lineas, administrador=administrador, dry_run=options['dry_run'], batch_size=options['batch_size'],
+                )
+        except OSError as e:
+            raise CommandError(f'No se pudo leer {options["archivo"]}: {e}')
+
+        for numero, mensaje in resumen['errores']:
+            self.stdout.write(self.style.WARNING(f'  Línea {numero}: {mensaje}'))
+        detalle = (
+            f'{resumen["creadas"]} creadas, {resumen["reactivadas"]} reactivadas, '
+            f'{resumen["desactivadas"]} desactivadas, {resumen["sin_cambios"]} sin cambios, '
+            f'{len(resumen["errores"])} errores'
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'[DRY-RUN] {detalle}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'[OK] Asignaciones importadas: {detalle}'))
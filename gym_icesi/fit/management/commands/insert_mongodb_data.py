@@ -129,6 +129,8 @@ class Command(BaseCommand):
                 except Exception as e:
                     self.stdout.write(self.style.WARNING(f'Error insertando actividad: {e}'))
         
+        # Los logs se encolan en el buffer: se escriben antes de terminar
+        ActivityLogService.flush()
         self.stdout.write(self.style.SUCCESS(f'✅ {activity_count} logs de actividad insertados'))
         
         # Resumen
@@ -0,0 +1,154 @@
+"""
+Comando de gestión para precalcular los reportes de los usuarios (snapshots)
+Uso: python manage.py precompute_reports [--year AAAA --month M] [--workers N] [--chunk-size N] [--resume]
+
+Pensado para ejecutarse de noche (p. ej. cron) antes de los picos de fin de mes: calcula
+los reportes mensuales de progreso y adherencia y el balance de carga del día para todos
+los usuarios activos, en bloques repartidos entre procesos, y los guarda en ReportSnapshot.
+El avance se guarda en SystemConfig para poder reanudar con --resume. Del balance de carga solo
+se conserva el snapshot del día: los de días anteriores se eliminan.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from fit import reports
+from fit.models import SystemConfig
+from fit.report_snapshots import ReportSnapshotService, month_key
+
+REPORTES = ("progress", "adherence", "load_balance")
+
+
+def _init_worker():
+    """Inicializa un proceso del pool: Django listo y conexión a BD propia"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        # Arranque con spawn: el proceso no hereda la configuración del padre
+        django.setup()
+    # Cada proceso abre su propia conexión en la primera consulta
+    connections.close_all()
+
+
+def _precompute_chunk(user_ids, year, month, hoy_iso, reportes):
+    """Calcula y guarda los snapshots de un bloque de usuarios. Devuelve (guardados, errores)"""
+    hoy = date.fromisoformat(hoy_iso)
+    periodo_mes = month_key(year, month)
+    # Los usuarios cuyos datos cambien durante el cálculo no se guardan
+    inicio = time.time()
+    snapshots = []
+    errores = []
+    for user_id in user_ids:
+        try:
+            if "progress" in reportes:
+                snapshots.append(("progress", user_id, periodo_mes, reports.progress_context(user_id, year, month)))
+            if "adherence" in reportes:
+                snapshots.append(("adherence", user_id, periodo_mes, reports.adherence_context(user_id, year, month)))
+            if "load_balance" in reportes:
+                snapshots.append(("load_balance", user_id, hoy_iso, reports.load_balance_context(user_id, hoy)))
+        except Exception as e:
+            errores.append(f"usuario {user_id}: {e}")
+    return ReportSnapshotService.store_many(snapshots, calculado_desde=inicio), errores
+
+
+class Command(BaseCommand):
+    help = 'Precalcula en paralelo los reportes mensuales de los usuarios activos y guarda snapshots'
+
+    def add_arguments(self, parser):
+        hoy = date.today()
+        parser.add_argument('--year', type=int, default=hoy.year, help='Año del reporte mensual')
+        parser.add_argument('--month', type=int, default=hoy.month, help='Mes del reporte mensual')
+        parser.add_argument('--reportes', default=','.join(REPORTES), help=f'Reportes separados por coma ({", ".join(REPORTES)})')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Procesos (0 = en este proceso)')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Usuarios por bloque')
+        parser.add_argument('--resume', action='store_true', help='Reanudar desde el último checkpoint del periodo')
+
+    def handle(self, *args, **options):
+        year, month = options['year'], options['month']
+        try:
+            reports.month_bounds(year, month)
+        except ValueError:
+            raise CommandError(f'Mes inválido: {year}-{month}')
+        reportes = tuple(r.strip() for r in options['reportes'].split(',') if r.strip())
+        invalidos = set(reportes) - set(REPORTES)
+        if invalidos:
+            raise CommandError(f'Reportes no soportados: {", ".join(sorted(invalidos))}')
+        hoy_iso = date.today().isoformat()
+        checkpoint_key = f'precompute_reports:{month_key(year, month)}'
+
+        users = User.objects.filter(is_active=True, is_staff=False, is_superuser=False).order_by('id')
+        if options['resume']:
+            ultimo = SystemConfig.objects.filter(clave=checkpoint_key).values_list('valor', flat=True).first()
+            if ultimo:
+                users = users.filter(id__gt=int(ultimo))
+                self.stdout.write(f'Reanudando después del usuario {ultimo}')
+        user_ids = list(users.values_list('id', flat=True))
+        size = max(options['chunk_size'], 1)
+        chunks = [user_ids[i:i + size] for i in range(0, len(user_ids), size)]
+        if not chunks:
+            self.stdout.write(self.style.SUCCESS('[OK] No hay usuarios pendientes'))
+            return
+
+        self.stdout.write(
+            f'Precalculando {", ".join(reportes)} de {month_key(year, month)} para '
+            f'{len(user_ids)} usuarios en {len(chunks)} bloques'
+        )
+        self._procesados = 0
+        self._guardados = 0
+        self._errores = []
+        self._completados = set()
+        self._siguiente = 0
+
+        args = (year, month, hoy_iso, reportes)
+        if options['workers'] <= 0:
+            for i, chunk in enumerate(chunks):
+                self._registrar(i, chunks, _precompute_chunk(chunk, *args), len(user_ids), checkpoint_key)
+        else:
+            # Cerrar las conexiones del padre antes de crear los procesos: no se comparten sockets
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+                futuros = {pool.submit(_precompute_chunk, chunk, *args): i for i, chunk in enumerate(chunks)}
+                for futuro in as_completed(futuros):
+                    self._registrar(futuros[futuro], chunks, futuro.result(), len(user_ids), checkpoint_key)
+
+        if 'load_balance' in reportes:
+            # Días anteriores de usuarios que ya no se procesan (inactivos, staff...)
+            ReportSnapshotService.purge_daily(hoy_iso)
+
+        self.stdout.write('')
+        for error in self._errores[:20]:
+            self.stdout.write(self.style.WARNING(f'  {error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'[OK] {self._guardados} snapshots guardados ({len(self._errores)} errores)'
+        ))
+
+    def _registrar(self, indice, chunks, resultado, total, checkpoint_key):
+        """Acumula el resultado de un bloque, avanza el checkpoint y muestra el progreso"""
+        guardados, errores = resultado
+        self._guardados += guardados
+        self._errores.extend(errores)
+        self._procesados += len(chunks[indice])
+        self._completados.add(indice)
+
+        # El checkpoint solo avanza sobre bloques consecutivos terminados
+        avance = self._siguiente
+        while self._siguiente in self._completados:
+            self._siguiente += 1
+        if self._siguiente > avance:
+            SystemConfig.objects.update_or_create(
+                clave=checkpoint_key,
+                defaults={
+                    'valor': str(chunks[self._siguiente - 1][-1]),
+                    'descripcion': 'Último usuario procesado por precompute_reports',
+                },
+            )
+
+        porcentaje = self._procesados * 100 // total
+        self.stdout.write(f'\r  [{self._procesados}/{total}] {porcentaje}%', ending='')
+        self.stdout.flush()
@@ -0,0 +1,43 @@
+"""
+Comando de gestión para reconstruir el rollup diario de actividad (DailyActivity)
+Uso: python manage.py rebuild_daily_activity [--user USERNAME] [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]
+"""
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from fit.rollup_service import DailyActivityService
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde ProgressLog el resumen diario de actividad usado por los reportes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Reconstruir solo para este username')
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Filas por bulk_create')
+
+    def _parse_fecha(self, valor):
+        if not valor:
+            return None
+        try:
+            return date.fromisoformat(valor)
+        except ValueError:
+            raise CommandError(f'Fecha inválida: {valor} (formato AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            user_ids = list(User.objects.filter(username=options['user']).values_list('id', flat=True))
+            if not user_ids:
+                raise CommandError(f"Usuario no encontrado: {options['user']}")
+
+        total = DailyActivityService.rebuild(
+            user_ids=user_ids,
+            desde=self._parse_fecha(options['desde']),
+            hasta=self._parse_fecha(options['hasta']),
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'[OK] Rollup diario reconstruido: {total} filas'))
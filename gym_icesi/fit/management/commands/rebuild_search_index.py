@@ -0,0 +1,21 @@
+"""
+Comando de gestión para reconstruir el índice de búsqueda de usuarios y entrenadores
+Uso: python manage.py rebuild_search_index [--batch-size 1000]
+
+Sincroniza los usuarios de la BD institucional y reescribe UserSearchIndex (username y nombre
+normalizados) para el autocompletado de las pantallas de asignación.
+"""
+from django.core.management.base import BaseCommand
+
+from fit.search_service import BATCH_SIZE, PeopleSearchService
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda del autocompletado de usuarios y entrenadores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Usuarios por lote')
+
+    def handle(self, *args, **options):
+        total = PeopleSearchService.rebuild(batch_size=max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(f'[OK] Índice de búsqueda reconstruido: {total} entradas'))
@@ -0,0 +1,60 @@
+"""
+Comando de gestión para recalcular las estadísticas mensuales de todos los usuarios
+Uso: python manage.py recalc_stats [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD] [--solo user|trainer] [--dry-run]
+
+Reconstruye UserMonthlyStats y TrainerMonthlyStats de los meses del rango a partir de
+Routine, ProgressLog, TrainerAssignment y TrainerRecommendation. Con --dry-run solo muestra
+las diferencias con los valores guardados.
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fit.stats_service import StatsRecalculator
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las estadísticas mensuales de usuarios y entrenadores para un rango de meses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD, se toma su mes completo). Por defecto el mes actual')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD, se toma su mes completo). Por defecto hoy')
+        parser.add_argument('--solo', choices=['user', 'trainer'], help='Recalcular solo un tipo de estadísticas')
+        parser.add_argument('--dry-run', action='store_true', help='Mostrar las diferencias sin guardar')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Filas por upsert')
+        parser.add_argument('--limit', type=int, default=50, help='Diferencias a mostrar por tipo')
+
+    def _parse_fecha(self, valor, defecto):
+        if not valor:
+            return defecto
+        try:
+            return date.fromisoformat(valor)
+        except ValueError:
+            raise CommandError(f'Fecha inválida: {valor} (formato AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        hoy = date.today()
+        desde = self._parse_fecha(options['desde'], hoy.replace(day=1))
+        hasta = self._parse_fecha(options['hasta'], hoy)
+        if desde > hasta:
+            raise CommandError('--desde debe ser anterior a --hasta')
+        tipos = (options['solo'],) if options['solo'] else ('user', 'trainer')
+
+        cambios = StatsRecalculator.recalculate(
+            desde, hasta, tipos=tipos, dry_run=options['dry_run'], chunk_size=max(options['chunk_size'], 1),
+        )
+
+        for tipo, filas in cambios.items():
+            self.stdout.write(f'{tipo}: {len(filas)} filas con diferencias')
+            for owner_id, anio, mes, antes, despues in filas[:options['limit']]:
+                antes_txt = ', '.join(f'{k}={v}' for k, v in antes.items()) if antes else 'sin fila'
+                despues_txt = ', '.join(f'{k}={v}' for k, v in despues.items())
+                self.stdout.write(f'  {owner_id} {anio}-{mes:02d}: {antes_txt} -> {despues_txt}')
+            if len(filas) > options['limit']:
+                self.stdout.write(f'  ... y {len(filas) - options["limit"]} más')
+
+        total = sum(len(filas) for filas in cambios.values())
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'[DRY-RUN] {total} filas se actualizarían'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'[OK] Estadísticas recalculadas: {total} filas actualizadas'))
@@ -0,0 +1,34 @@
+"""
+Comando de gestión para recalcular desde cero las rachas de entrenamiento
+Uso: python manage.py recompute_streaks [--user USERNAME]
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from fit.models import ProgressLog
+from fit.streak_service import StreakService
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la racha actual, racha máxima y último día activo de los usuarios'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Recalcular solo para este username')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(
+            id__in=ProgressLog.objects.values('user_id')
+        ).order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user'])
+
+        total = 0
+        for user in users.iterator():
+            streak = StreakService.recompute(user)
+            total += 1
+            self.stdout.write(
+                f'{user.username}: actual={streak.racha_actual} '
+                f'maxima={streak.racha_maxima} ultima={streak.ultima_fecha}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'\n[OK] Rachas recalculadas para {total} usuarios'))
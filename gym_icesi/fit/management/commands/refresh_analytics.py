@@ -0,0 +1,44 @@
+"""
+Comando de gestión para refrescar los resúmenes del panel de analítica del administrador
+Uso: python manage.py refresh_analytics [--only NOMBRE ...] [--no-concurrently] [--rebuild]
+
+En PostgreSQL crea (la primera vez) y refresca las vistas materializadas con
+REFRESH MATERIALIZED VIEW CONCURRENTLY; en otros motores recalcula las tablas de resumen.
+Pensado para ejecutarse periódicamente (p. ej. cada hora con cron).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from fit.analytics_summaries import SUMMARIES, AnalyticsSummaryService
+
+
+class Command(BaseCommand):
+    help = 'Refresca las vistas materializadas / tablas de resumen de admin_analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', nargs='+', choices=list(SUMMARIES), help='Refrescar solo estos resúmenes')
+        parser.add_argument('--no-concurrently', action='store_true', help='Refresco bloqueante (más rápido, bloquea lecturas)')
+        parser.add_argument('--rebuild', action='store_true', help='Eliminar y volver a crear (tras cambiar la definición)')
+
+    def handle(self, *args, **options):
+        motor = 'vistas materializadas' if AnalyticsSummaryService.uses_materialized_views() else 'tablas de resumen'
+        self.stdout.write(f'Refrescando {motor}...')
+        errores = 0
+        for nombre in options['only'] or SUMMARIES:
+            inicio = time.perf_counter()
+            try:
+                filas = AnalyticsSummaryService.refresh(
+                    nombre, concurrently=not options['no_concurrently'], rebuild=options['rebuild'],
+                )
+            except DatabaseError as e:
+                errores += 1
+                self.stdout.write(self.style.WARNING(f'  {nombre}: error al refrescar: {e}'))
+                continue
+            ms = (time.perf_counter() - inicio) * 1000
+            self.stdout.write(f'  {nombre}: {filas} filas ({ms:.0f} ms)')
+        if errores:
+            self.stdout.write(self.style.WARNING(f'[WARNING] {errores} resúmenes no se pudieron refrescar'))
+        else:
+            self.stdout.write(self.style.SUCCESS('[OK] Resúmenes de analítica actualizados'))
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_composition(apps, schema_editor):
+    """Calcula la composición de las rutinas existentes"""
+    RoutineItem = apps.get_model('fit', 'RoutineItem')
+    RoutineComposition = apps.get_model('fit', 'RoutineComposition')
+    rows = (
+        RoutineItem.objects.values('routine_id', 'exercise__tipo')
+        .annotate(
+            items=Count('id'),
+            duracion_seg=Sum(Coalesce('tiempo_seg', F('exercise__duracion_min') * 60, Value(0))),
+        )
+        .order_by()
+    )
+    totales = {}
+    for row in rows:
+        totales[row['routine_id']] = totales.get(row['routine_id'], 0) + row['items']
+    RoutineComposition.objects.bulk_create(
+        [
+            RoutineComposition(
+                routine_id=row['routine_id'],
+                tipo=row['exercise__tipo'],
+                items=row['items'],
+                peso=row['items'] / totales[row['routine_id']],
+                duracion_seg=row['duracion_seg'] or 0,
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fit', '0008_userstreak'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoutineComposition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('cardio', 'Cardio'), ('fuerza', 'Fuerza'), ('movilidad', 'Movilidad')], max_length=12)),
+                ('items', models.PositiveIntegerField(default=0)),
+                ('peso', models.FloatField(default=0)),
+                ('duracion_seg', models.PositiveIntegerField(default=0)),
+                ('routine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='composition', to='fit.routine')),
+            ],
+            options={
+                'unique_together': {('routine', 'tipo')},
+            },
+        ),
+        migrations.RunPython(backfill_composition, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_daily_activity(apps, schema_editor):
+    """Construye el rollup diario a partir de los registros de progreso existentes"""
+    ProgressLog = apps.get_model('fit', 'ProgressLog')
+    DailyActivity = apps.get_model('fit', 'DailyActivity')
+    rows = (
+        ProgressLog.objects.values('user_id', 'fecha')
+        .annotate(
+            sesiones=Count('id'),
+            tiempo_total=Coalesce(Sum('tiempo_seg'), Value(0)),
+            esfuerzo_sum=Coalesce(Sum('esfuerzo'), Value(0)),
+            esfuerzo_max=Coalesce(Max('esfuerzo'), Value(0)),
+            reps_total=Coalesce(Sum('repeticiones'), Value(0)),
+            peso_max=Max('peso_usado'),
+        )
+        .order_by()
+    )
+    DailyActivity.objects.bulk_create(
+        [DailyActivity(**{**row, 'peso_max': row['peso_max'] or 0}) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fit', '0009_routinecomposition'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('sesiones', models.PositiveIntegerField(default=0)),
+                ('tiempo_total', models.PositiveIntegerField(default=0)),
+                ('esfuerzo_sum', models.PositiveIntegerField(default=0)),
+                ('esfuerzo_max', models.PositiveSmallIntegerField(default=0)),
+                ('reps_total', models.PositiveIntegerField(default=0)),
+                ('peso_max', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'fecha')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from datetime import datetime, time
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_activity_events(apps, schema_editor):
+    """Crea los eventos del feed a partir de los registros, rutinas y mensajes existentes"""
+    ProgressLog = apps.get_model('fit', 'ProgressLog')
+    Routine = apps.get_model('fit', 'Routine')
+    Message = apps.get_model('fit', 'Message')
+    ActivityEvent = apps.get_model('fit', 'ActivityEvent')
+
+    def eventos():
+        for log_id, user_id, fecha, rutina in ProgressLog.objects.values_list(
+            'id', 'user_id', 'fecha', 'routine__nombre'
+        ).iterator(chunk_size=2000):
+            yield ActivityEvent(
+                user_id=user_id, tipo='progreso', objeto_id=log_id,
+                resumen=f'Registró progreso en {rutina}'[:200],
+                fecha=timezone.make_aware(datetime.combine(fecha, time.min)),
+            )
+        for routine_id, user_id, fecha, nombre in Routine.objects.filter(es_predisenada=False).values_list(
+            'id', 'user_id', 'fecha_creacion', 'nombre'
+        ).iterator(chunk_size=2000):
+            yield ActivityEvent(
+                user_id=user_id, tipo='rutina', objeto_id=routine_id,
+                resumen=f'Creó la rutina {nombre}'[:200], fecha=fecha,
+            )
+        for message_id, user_id, destinatario_id, fecha, asunto in Message.objects.values_list(
+            'id', 'remitente_id', 'destinatario_id', 'fecha', 'asunto'
+        ).iterator(chunk_size=2000):
+            yield ActivityEvent(
+                user_id=user_id, destinatario_id=destinatario_id, tipo='mensaje', objeto_id=message_id,
+                resumen=f'Envió un mensaje: {asunto}'[:200], fecha=fecha,
+            )
+
+    lote = []
+    for evento in eventos():
+        lote.append(evento)
+        if len(lote) >= 2000:
+            ActivityEvent.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        ActivityEvent.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fit', '0011_reportsnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('progreso', 'Registro de progreso'), ('rutina', 'Rutina creada'), ('preset_adoptado', 'Rutina prediseñada adoptada'), ('mensaje', 'Mensaje enviado'), ('recomendacion_leida', 'Recomendación leída')], max_length=20)),
+                ('objeto_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('resumen', models.CharField(blank=True, max_length=200)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('destinatario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-fecha', '-id'], name='fit_activit_user_id_997440_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_activity_events, migrations.RunPython.noop),
+    ]
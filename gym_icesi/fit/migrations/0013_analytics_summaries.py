@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fit', '0012_activityevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExercisePopularitySummary',
+            fields=[
+                ('exercise_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('nombre', models.CharField(max_length=120)),
+                ('tipo', models.CharField(max_length=20)),
+                ('veces_usado', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'fit_mv_exercise_popularity',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='FacultyActivitySummary',
+            fields=[
+                ('facultad', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('usuarios_activos', models.IntegerField()),
+                ('sesiones', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'fit_mv_faculty_activity',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RoutinePopularitySummary',
+            fields=[
+                ('nombre', models.CharField(max_length=120, primary_key=True, serialize=False)),
+                ('veces_usada', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'fit_mv_routine_popularity',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TrainerEffectivenessSummary',
+            fields=[
+                ('trainer_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('username', models.CharField(max_length=150)),
+                ('asignados', models.IntegerField()),
+                ('sesiones_totales', models.IntegerField()),
+                ('recomendaciones', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'fit_mv_trainer_effectiveness',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+FTS_SQLITE = [
+    """
+    CREATE VIRTUAL TABLE fit_usersearchindex_fts USING fts5(
+        texto, content='fit_usersearchindex', content_rowid='user_id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER fit_usersearchindex_ai AFTER INSERT ON fit_usersearchindex BEGIN
+        INSERT INTO fit_usersearchindex_fts(rowid, texto) VALUES (new.user_id, new.texto);
+    END
+    """,
+    """
+    CREATE TRIGGER fit_usersearchindex_ad AFTER DELETE ON fit_usersearchindex BEGIN
+        INSERT INTO fit_usersearchindex_fts(fit_usersearchindex_fts, rowid, texto)
+        VALUES ('delete', old.user_id, old.texto);
+    END
+    """,
+    """
+    CREATE TRIGGER fit_usersearchindex_au AFTER UPDATE ON fit_usersearchindex BEGIN
+        INSERT INTO fit_usersearchindex_fts(fit_usersearchindex_fts, rowid, texto)
+        VALUES ('delete', old.user_id, old.texto);
+        INSERT INTO fit_usersearchindex_fts(rowid, texto) VALUES (new.user_id, new.texto);
+    END
+    """,
+]
+
+
+def create_trigram_index(apps, schema_editor):
+    """Índice de trigramas sobre `texto`: pg_trgm en PostgreSQL, FTS5 trigram en SQLite"""
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        try:
+            # Crear la extensión requiere permisos; sin ella la búsqueda recorre la tabla
+            with transaction.atomic(using=schema_editor.connection.alias):
+                schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except Exception:
+            return
+        schema_editor.execute(
+            "CREATE INDEX fit_usersearchindex_trgm ON fit_usersearchindex USING gin (texto gin_trgm_ops)"
+        )
+    elif vendor == "sqlite":
+        for sql in FTS_SQLITE:
+            schema_editor.execute(sql)
+
+
+def drop_trigram_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS fit_usersearchindex_trgm")
+    elif vendor == "sqlite":
+        for trigger in ("ai", "ad", "au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS fit_usersearchindex_{trigger}")
+        schema_editor.execute("DROP TABLE IF EXISTS fit_usersearchindex_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('fit', '0013_analytics_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchIndex',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('rol', models.CharField(choices=[('usuario', 'Usuario'), ('entrenador', 'Entrenador')], max_length=20)),
+                ('username', models.CharField(max_length=150)),
+                ('nombre', models.CharField(blank=True, max_length=200)),
+                ('texto', models.CharField(max_length=400)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['rol', 'username'], name='fit_usersea_rol_73d910_idx')],
+            },
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:36
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def dedupe_moderations(apps, schema_editor):
+    """Conserva solo el registro más reciente de cada contenido"""
+    ContentModeration = apps.get_model('fit', 'ContentModeration')
+    ultimos = (
+        ContentModeration.objects.values('tipo_contenido', 'contenido_id')
+        .annotate(ultimo=Max('id'))
+        .values_list('ultimo', flat=True)
+    )
+    ContentModeration.objects.exclude(id__in=list(ultimos)).delete()
+
+
+def enqueue_pending_content(apps, schema_editor):
+    """
+    Crea el registro pendiente de los ejercicios personalizados y rutinas prediseñadas que no
+    tienen uno, con la fecha de creación del contenido para conservar el orden de llegada.
+    """
+    ContentModeration = apps.get_model('fit', 'ContentModeration')
+    modelos = {
+        'exercise': (apps.get_model('fit', 'Exercise'), {'es_personalizado': True}),
+        'routine': (apps.get_model('fit', 'Routine'), {'es_predisenada': True}),
+    }
+    for tipo, (model, filtro) in modelos.items():
+        existentes = ContentModeration.objects.filter(tipo_contenido=tipo).values('contenido_id')
+        nuevos = list(model.objects.filter(**filtro).exclude(id__in=existentes).values_list('id', flat=True))
+        ContentModeration.objects.bulk_create(
+            [
+                ContentModeration(tipo_contenido=tipo, contenido_id=contenido_id, estado='pendiente')
+                for contenido_id in nuevos
+            ],
+            batch_size=1000,
+        )
+        # auto_now_add fija la fecha al crear: solo los registros recién creados toman la del contenido
+        for inicio in range(0, len(nuevos), 1000):
+            ContentModeration.objects.filter(
+                tipo_contenido=tipo, contenido_id__in=nuevos[inicio:inicio + 1000]
+            ).update(
+                fecha_creacion=Coalesce(
+                    Subquery(model.objects.filter(id=OuterRef('contenido_id')).values('fecha_creacion')[:1]),
+                    F('fecha_creacion'),
+                )
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fit', '0014_usersearchindex'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_moderations, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contentmoderation',
+            index=models.Index(fields=['estado', 'fecha_creacion', 'id'], name='fit_content_estado_afcab1_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='contentmoderation',
+            constraint=models.UniqueConstraint(fields=('tipo_contenido', 'contenido_id'), name='fit_moderacion_contenido_unico'),
+        ),
+        migrations.RunPython(enqueue_pending_content, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fit', '0015_moderation_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignmenthistory',
+            index=models.Index(fields=['-fecha', '-id'], name='fit_assignm_fecha_f409e1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmenthistory',
+            index=models.Index(fields=['accion', '-fecha', '-id'], name='fit_assignm_accion_a8d2a7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmenthistory',
+            index=models.Index(fields=['administrador', '-fecha', '-id'], name='fit_assignm_adminis_db0c9e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmenthistory',
+            index=models.Index(fields=['assignment', '-fecha', '-id'], name='fit_assignm_assignm_ddec3b_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 20:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def flag_test_accounts(apps, schema_editor):
+    """Marca las cuentas de prueba existentes (misma regla que TestAccount.matches)"""
+    User = apps.get_model('auth', 'User')
+    TestAccount = apps.get_model('fit', 'TestAccount')
+    ids = list(User.objects.filter(username__icontains='test').values_list('id', flat=True))
+    TestAccount.objects.bulk_create([TestAccount(user_id=user_id) for user_id in ids], batch_size=1000)
+    # Las cuentas de prueba no se indexan para la búsqueda
+    apps.get_model('fit', 'UserSearchIndex').objects.filter(user_id__in=ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('fit', '0017_cache_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestAccount',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(flag_test_accounts, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 
 class Exercise(models.Model):
     TIPO = [('cardio','Cardio'), ('fuerza','Fuerza'), ('movilidad','Movilidad')]
@@ -45,6 +47,16 @@ class RoutineItem(models.Model):
     class Meta:
         ordering = ['orden']
 
+class RoutineComposition(models.Model):
+    """Composición precalculada de una rutina por tipo de ejercicio (se mantiene desde RoutineItem)"""
+    routine = models.ForeignKey(Routine, on_delete=models.CASCADE, related_name='composition')
+    tipo = models.CharField(max_length=12, choices=Exercise.TIPO)
+    items = models.PositiveIntegerField(default=0)
+    peso = models.FloatField(default=0)  # Fracción de los ítems de la rutina de este tipo (0-1)
+    duracion_seg = models.PositiveIntegerField(default=0)  # Duración total de los ítems de este tipo
+    class Meta:
+        unique_together = [('routine','tipo')]
+
 class TrainerAssignment(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='trainer_assignment_user')
     trainer = models.ForeignKey(User, on_delete=models.PROTECT, related_name='trainer_assignment_trainer')
@@ -65,6 +77,49 @@ class ProgressLog(models.Model):
     class Meta:
         indexes = [models.Index(fields=['user','fecha'])]
 
+class DailyActivity(models.Model):
+    """Resumen diario de actividad por usuario (rollup mantenido desde ProgressLog)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_activity')
+    fecha = models.DateField()
+    sesiones = models.PositiveIntegerField(default=0)
+    tiempo_total = models.PositiveIntegerField(default=0)  # Segundos
+    esfuerzo_sum = models.PositiveIntegerField(default=0)
+    esfuerzo_max = models.PositiveSmallIntegerField(default=0)
+    reps_total = models.PositiveIntegerField(default=0)
+    peso_max = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    class Meta:
+        unique_together = [('user','fecha')]
+
+class ReportSnapshot(models.Model):
+    """Resultado precalculado de un reporte de usuario (comando precompute_reports)"""
+    REPORTES = [('progress','Progreso mensual'),('adherence','Adherencia'),('load_balance','Balance de carga')]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='report_snapshots')
+    reporte = models.CharField(max_length=20, choices=REPORTES)
+    periodo = models.CharField(max_length=10)  # AAAA-MM (mensual) o AAAA-MM-DD (diario)
+    datos = models.JSONField(encoder=DjangoJSONEncoder)
+    fecha_calculo = models.DateTimeField(auto_now=True)
+    class Meta:
+        unique_together = [('user','reporte','periodo')]
+
+class ActivityEvent(models.Model):
+    """Evento de actividad de un usuario para el feed de su entrenador"""
+    TIPOS = [
+        ('progreso','Registro de progreso'),
+        ('rutina','Rutina creada'),
+        ('preset_adoptado','Rutina prediseñada adoptada'),
+        ('mensaje','Mensaje enviado'),
+        ('recomendacion_leida','Recomendación leída'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_events')
+    # Eventos dirigidos a un usuario concreto (mensajes, recomendaciones leídas); null = visibles al entrenador
+    destinatario = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name='+')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    objeto_id = models.PositiveIntegerField(null=True, blank=True)
+    resumen = models.CharField(max_length=200, blank=True)
+    fecha = models.DateTimeField(default=timezone.now)
+    class Meta:
+        indexes = [models.Index(fields=['user','-fecha','-id'])]
+
 class UserMonthlyStats(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     anio = models.PositiveIntegerField()
@@ -74,6 +129,15 @@ class UserMonthlyStats(models.Model):
     class Meta:
         unique_together = [('user','anio','mes')]
 
+class UserStreak(models.Model):
+    """Rachas de entrenamiento mantenidas incrementalmente a partir de ProgressLog"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='streak')
+    racha_actual = models.PositiveIntegerField(default=0)  # Días consecutivos que terminan en ultima_fecha
+    racha_maxima = models.PositiveIntegerField(default=0)
+    ultima_fecha = models.DateField(null=True, blank=True)  # Último día con actividad registrada
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    def __str__(self): return f'Racha de {self.user.username}: {self.racha_actual}'
+
 class TrainerMonthlyStats(models.Model):
     trainer = models.ForeignKey(User, on_delete=models.CASCADE)
     anio = models.PositiveIntegerField()
@@ -172,6 +236,13 @@ class AssignmentHistory(models.Model):
     notas = models.TextField(blank=True)
     class Meta:
         ordering = ['-fecha']
+        # Páginas por cursor (-fecha, -id), también dentro de cada filtro de auditoría
+        indexes = [
+            models.Index(fields=['-fecha','-id']),
+            models.Index(fields=['accion','-fecha','-id']),
+            models.Index(fields=['administrador','-fecha','-id']),
+            models.Index(fields=['assignment','-fecha','-id']),
+        ]
 
 class ContentModeration(models.Model):
     """Moderación de contenido (ejercicios y rutinas)"""
@@ -185,6 +256,9 @@ class ContentModeration(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     class Meta:
         ordering = ['-fecha_creacion']
+        # Un registro de moderación (su estado) por contenido; la cola se lee por (estado, fecha, id)
+        constraints = [models.UniqueConstraint(fields=['tipo_contenido','contenido_id'], name='fit_moderacion_contenido_unico')]
+        indexes = [models.Index(fields=['estado','fecha_creacion','id'])]
 
 class SystemConfig(models.Model):
     """Configuración global del sistema"""
@@ -193,4 +267,77 @@ class SystemConfig(models.Model):
     descripcion = models.TextField(blank=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
-    def __str__(self): return f'{self.clave} = {self.valor}'
\ No newline at end of file
+    def __str__(self): return f'{self.clave} = {self.valor}'
+
+class UserSearchIndex(models.Model):
+    """
+    Texto de búsqueda (username y nombre institucional, en minúsculas y sin tildes) de usuarios y
+    entrenadores para el autocompletado. El índice de trigramas se crea en la migración:
+    GIN pg_trgm en PostgreSQL, tabla FTS5 con tokenizador trigram en SQLite.
+    """
+    ROLES = [('usuario','Usuario'),('entrenador','Entrenador')]
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    rol = models.CharField(max_length=20, choices=ROLES)
+    username = models.CharField(max_length=150)
+    nombre = models.CharField(max_length=200, blank=True)
+    texto = models.CharField(max_length=400)
+    class Meta:
+        indexes = [models.Index(fields=['rol','username'])]
+
+
+class TestAccount(models.Model):
+    """
+    Cuentas de prueba, marcadas al indexar usuarios (PeopleSearchService.index_users) para que los
+    listados las excluyan por clave primaria en lugar de recorrer auth_user con LIKE '%test%'.
+    """
+    PATRON = 'test'
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+
+    @classmethod
+    def matches(cls, username):
+        """Regla única de cuenta de prueba: el username contiene 'test' (sin distinguir mayúsculas)"""
+        return cls.PATRON in username.lower()
+
+
+# ----------------------------------------------------
+# Resúmenes de analítica del administrador (comando refresh_analytics):
+# vistas materializadas en PostgreSQL, tablas de resumen en otros motores
+# ----------------------------------------------------
+class FacultyActivitySummary(models.Model):
+    """Usuarios activos y sesiones por facultad en los últimos 30 días"""
+    facultad = models.CharField(max_length=100, primary_key=True)
+    usuarios_activos = models.IntegerField()
+    sesiones = models.IntegerField()
+    class Meta:
+        managed = False
+        db_table = 'fit_mv_faculty_activity'
+
+class TrainerEffectivenessSummary(models.Model):
+    """Asignados activos, sesiones de sus asignados y recomendaciones por entrenador"""
+    trainer_id = models.IntegerField(primary_key=True)
+    username = models.CharField(max_length=150)
+    asignados = models.IntegerField()
+    sesiones_totales = models.IntegerField()
+    recomendaciones = models.IntegerField()
+    class Meta:
+        managed = False
+        db_table = 'fit_mv_trainer_effectiveness'
+
+class ExercisePopularitySummary(models.Model):
+    """Veces que cada ejercicio aparece en rutinas"""
+    exercise_id = models.IntegerField(primary_key=True)
+    nombre = models.CharField(max_length=120)
+    tipo = models.CharField(max_length=20)
+    veces_usado = models.IntegerField()
+    class Meta:
+        managed = False
+        db_table = 'fit_mv_exercise_popularity'
+
+class RoutinePopularitySummary(models.Model):
+    """Sesiones registradas por nombre de rutina"""
+    nombre = models.CharField(max_length=120, primary_key=True)
+    veces_usada = models.IntegerField()
+    class Meta:
+        managed = False
+        db_table = 'fit_mv_routine_popularity'
+
@@ -0,0 +1,99 @@
+"""
+Cola de moderación de ejercicios personalizados y rutinas prediseñadas.
+Cada contenido revisable tiene un único registro ContentModeration (único por tipo y id) que
+guarda su estado; las señales lo crean en estado pendiente al guardarse el contenido. La cola
+es la lista de registros pendientes por orden de llegada, leída con el índice
+(estado, fecha_creacion, id) en lugar de un anti-join contra todo el contenido. Las acciones
+en bloque actualizan los registros con un UPDATE dentro de una transacción.
+"""
+from django.utils import timezone
+
+from .models import ContentModeration, Exercise, Routine, RoutineItem
+from .stats_service import StatsDispatcher
+
+# Estados que siguen en la cola (lo editado por el moderador aún no está aprobado)
+EN_COLA = ("pendiente", "editado")
+
+ACCIONES = {"aprobar": "aprobado", "rechazar": "rechazado", "editar": "editado"}
+
+TIPOS = {"exercise": Exercise, "routine": Routine}
+
+
+def is_reviewable(tipo, contenido):
+    """Ejercicios creados por usuarios/entrenadores y rutinas prediseñadas"""
+    if tipo == "exercise":
+        return contenido.es_personalizado
+    return contenido.es_predisenada
+
+
+class ModerationService:
+    """Servicio de la cola de moderación"""
+
+    @staticmethod
+    def enqueue(tipo, contenido_id):
+        """Registro pendiente del contenido si aún no tiene uno (un INSERT, sin consulta previa)"""
+        ContentModeration.objects.bulk_create(
+            [ContentModeration(tipo_contenido=tipo, contenido_id=contenido_id, estado="pendiente")],
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def discard(tipo, contenido_id):
+        """Saca de la cola un contenido eliminado (los ya revisados quedan como historial)"""
+        ContentModeration.objects.filter(
+            tipo_contenido=tipo, contenido_id=contenido_id, estado__in=EN_COLA
+        ).delete()
+
+    @staticmethod
+    def queue(tipo=None):
+        """Registros en cola, del más antiguo al más reciente"""
+        cola = ContentModeration.objects.filter(estado__in=EN_COLA)
+        if tipo in TIPOS:
+            cola = cola.filter(tipo_contenido=tipo)
+        return cola.order_by("fecha_creacion", "id")
+
+    @staticmethod
+    def attach_content(moderaciones):
+        """Asigna `contenido` a cada registro de una página: una consulta por tipo"""
+        moderaciones = list(moderaciones)
+        for tipo, model in TIPOS.items():
+            ids = [m.contenido_id for m in moderaciones if m.tipo_contenido == tipo]
+            if not ids:
+                continue
+            queryset = model.objects.select_related("user") if model is Routine else model.objects.all()
+            contenidos = queryset.in_bulk(ids)
+            for moderacion in moderaciones:
+                if moderacion.tipo_contenido == tipo:
+                    moderacion.contenido = contenidos.get(moderacion.contenido_id)
+        return moderaciones
+
+    @staticmethod
+    def review(ids, accion, moderador, comentarios=""):
+        """
+        Aplica `accion` (aprobar, rechazar, editar) a los registros en cola de `ids` en una
+        transacción. Al rechazar se elimina el contenido, salvo los ejercicios que ya usan
+        otras rutinas. Devuelve (registros revisados, contenidos eliminados).
+        """
+        estado = ACCIONES[accion]
+        eliminados = 0
+        with StatsDispatcher.coalesce():
+            moderaciones = list(
+                ContentModeration.objects.select_for_update()
+                .filter(id__in=ids, estado__in=EN_COLA)
+                .values_list("id", "tipo_contenido", "contenido_id")
+            )
+            ContentModeration.objects.filter(id__in=[m[0] for m in moderaciones]).update(
+                estado=estado, moderador=moderador, fecha_revision=timezone.now(), comentarios=comentarios,
+            )
+            if accion == "rechazar":
+                ejercicios = [c for _, tipo, c in moderaciones if tipo == "exercise"]
+                rutinas = [c for _, tipo, c in moderaciones if tipo == "routine"]
+                # Borrado en cascada: estadísticas recalculadas una vez por mes afectado
+                eliminados += Routine.objects.filter(id__in=rutinas).delete()[1].get(Routine._meta.label, 0)
+                eliminados += (
+                    Exercise.objects.filter(id__in=ejercicios)
+                    .exclude(id__in=RoutineItem.objects.values("exercise_id"))
+                    .delete()[1]
+                    .get(Exercise._meta.label, 0)
+                )
+        return len(moderaciones), eliminados
@@ -0,0 +1,100 @@
+"""
+Registro declarativo de los índices de las colecciones de MongoDB.
+INDICES define por colección las claves y opciones de cada índice. MongoIndexRegistry compara
+la definición con los índices existentes (una llamada a index_information por colección), crea
+los que faltan y reporta las divergencias: índices con la misma clave y distintas opciones (no
+se recrean automáticamente) e índices que no están declarados. Se aplica con el comando
+ensure_mongo_indexes y, de forma perezosa, la primera vez que cada proceso usa una colección.
+"""
+
+INDICES = {
+    "progress_logs": [
+        ([("user_id", 1), ("fecha", -1)], {}),
+        ([("routine_id", 1), ("fecha", -1)], {}),
+    ],
+    "user_activity_logs": [
+        ([("user_id", 1), ("timestamp", -1)], {}),
+        ([("action", 1), ("timestamp", -1)], {}),
+    ],
+    "exercise_details": [
+        ([("exercise_id", 1)], {"unique": True}),
+        ([("tags", 1)], {}),
+    ],
+    "exercises": [
+        ([("exercise_id", 1)], {"unique": True}),
+        ([("user_id", 1), ("created_at", -1)], {}),
+        ([("tipo", 1)], {}),
+    ],
+    "user_routines": [
+        ([("routine_id", 1)], {"unique": True}),
+        ([("user_id", 1), ("created_at", -1)], {}),
+        ([("trainer_id", 1)], {}),
+    ],
+    "routine_templates": [
+        ([("routine_id", 1)], {"unique": True}),
+        ([("trainer_id", 1), ("created_at", -1)], {}),
+        ([("tags", 1)], {}),
+    ],
+    "trainer_assignments": [
+        ([("assignment_id", 1)], {"unique": True}),
+        ([("user_id", 1), ("activo", 1)], {}),
+        ([("trainer_id", 1), ("activo", 1)], {}),
+    ],
+}
+
+# Opciones que se comparan siempre, con su valor cuando no se indican
+OPCIONES_DEFECTO = {"unique": False, "sparse": False}
+
+
+def index_name(claves):
+    """Nombre por defecto que MongoDB da al índice (p. ej. user_id_1_fecha_-1)"""
+    return "_".join(f"{campo}_{direccion}" for campo, direccion in claves)
+
+
+def _clave(claves):
+    return tuple((campo, int(direccion) if isinstance(direccion, (int, float)) else direccion) for campo, direccion in claves)
+
+
+class MongoIndexRegistry:
+    """Aplicación y verificación de los índices declarados en INDICES"""
+
+    @staticmethod
+    def collections():
+        return list(INDICES)
+
+    @staticmethod
+    def ensure(db, nombre, dry_run=False):
+        """
+        Compara los índices de la colección `nombre` con su definición y crea los que faltan
+        (salvo con `dry_run`). Devuelve un informe con `faltantes` (creados o por crear),
+        `correctos`, `divergentes` [(índice, detalle)] y `no_declarados`.
+        """
+        collection = db[nombre]
+        existentes = {
+            _clave(info["key"]): (indice, info)
+            for indice, info in collection.index_information().items()
+            if indice != "_id_"
+        }
+        informe = {"faltantes": [], "correctos": [], "divergentes": [], "no_declarados": []}
+        declaradas = set()
+        for claves, opciones in INDICES[nombre]:
+            clave = _clave(claves)
+            declaradas.add(clave)
+            if clave not in existentes:
+                if not dry_run:
+                    collection.create_index(claves, **opciones)
+                informe["faltantes"].append(index_name(claves))
+                continue
+            indice, info = existentes[clave]
+            esperadas = {**OPCIONES_DEFECTO, **opciones}
+            diferencias = [
+                f"{opcion}={info.get(opcion, OPCIONES_DEFECTO.get(opcion))!r} (se esperaba {valor!r})"
+                for opcion, valor in esperadas.items()
+                if info.get(opcion, OPCIONES_DEFECTO.get(opcion)) != valor
+            ]
+            if diferencias:
+                informe["divergentes"].append((indice, ", ".join(diferencias)))
+            else:
+                informe["correctos"].append(indice)
+        informe["no_declarados"] = sorted(indice for clave, (indice, _) in existentes.items() if clave not in declaradas)
+        return informe
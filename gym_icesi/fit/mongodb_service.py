@@ -1,30 +1,145 @@
 """
 Servicio para interactuar con MongoDB (NoSQL)
-Maneja la conexión y operaciones CRUD para datos NoSQL
+Maneja la conexión y operaciones CRUD para datos NoSQL. La disponibilidad la decide un
+circuito (MongoCircuitBreaker): en funcionamiento normal no se hace ping antes de cada
+operación y, durante una caída, las llamadas no intentan conectar hasta el siguiente sondeo.
 """
 try:
-    from pymongo import MongoClient
-    from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+    from pymongo import MongoClient, UpdateOne
+    from pymongo.errors import BulkWriteError, ConnectionFailure, ServerSelectionTimeoutError
     from bson import ObjectId
     PYMONGO_AVAILABLE = True
 except ImportError:
     PYMONGO_AVAILABLE = False
     MongoClient = None
+    UpdateOne = None
+    BulkWriteError = Exception
     ConnectionFailure = Exception
     ServerSelectionTimeoutError = Exception
     ObjectId = None
 
 from django.conf import settings
 from datetime import datetime, date
+import atexit
+import collections
+import functools
 import logging
 import os
+import threading
+import time
+
+from .mongo_indexes import MongoIndexRegistry
 
 logger = logging.getLogger(__name__)
 
+# Errores que indican que el servidor no está accesible (abren el circuito)
+ERRORES_CONEXION = (ConnectionFailure,) if PYMONGO_AVAILABLE else ()
+
+CERRADO = "cerrado"
+ABIERTO = "abierto"
+SEMIABIERTO = "semiabierto"
+
+
+class MongoCircuitBreaker:
+    """
+    Estado de salud de MongoDB compartido por todos los servicios del módulo.
+    - cerrado: MongoDB responde; las llamadas pasan sin ping.
+    - abierto: tras un fallo no se intenta conectar hasta el próximo sondeo; las llamadas
+      devuelven "no disponible" sin tocar la red.
+    - semiabierto: llegó la hora del sondeo; una sola llamada hace ping y cierra o vuelve a abrir
+      el circuito. La espera entre sondeos empieza en MONGODB_PROBE_INTERVAL y se duplica con cada
+      fallo consecutivo hasta MONGODB_PROBE_MAX_INTERVAL.
+    Al arrancar el estado es semiabierto: la primera llamada comprueba la conexión.
+    """
+    _lock = threading.Lock()
+    estado = SEMIABIERTO
+    fallos = 0
+    proximo_sondeo = 0.0
+    sondeando = False
+    ultimo_error = None
+
+    @classmethod
+    def _espera(cls):
+        base = getattr(settings, "MONGODB_PROBE_INTERVAL", 5)
+        maximo = getattr(settings, "MONGODB_PROBE_MAX_INTERVAL", 300)
+        return min(base * 2 ** max(cls.fallos - 1, 0), maximo)
+
+    @classmethod
+    def start_probe(cls):
+        """True si esta llamada debe sondear (circuito no cerrado, plazo cumplido y nadie sondeando)"""
+        with cls._lock:
+            if cls.estado == CERRADO or cls.sondeando:
+                return False
+            if cls.estado == ABIERTO and time.monotonic() < cls.proximo_sondeo:
+                return False
+            cls.estado = SEMIABIERTO
+            cls.sondeando = True
+            return True
+
+    @classmethod
+    def record_success(cls):
+        with cls._lock:
+            if cls.estado != CERRADO:
+                logger.info("MongoDB disponible: circuito cerrado")
+            cls.estado = CERRADO
+            cls.fallos = 0
+            cls.sondeando = False
+            cls.ultimo_error = None
+
+    @classmethod
+    def record_failure(cls, error):
+        with cls._lock:
+            cls.fallos += 1
+            cls.estado = ABIERTO
+            cls.sondeando = False
+            cls.ultimo_error = str(error)
+            cls.proximo_sondeo = time.monotonic() + cls._espera()
+            logger.warning(f"MongoDB no disponible ({error}); próximo intento en {cls._espera()}s")
+
+    @classmethod
+    def reset(cls):
+        """Vuelve al estado inicial (la próxima llamada sondea)"""
+        with cls._lock:
+            cls.estado = SEMIABIERTO
+            cls.fallos = 0
+            cls.proximo_sondeo = 0.0
+            cls.sondeando = False
+            cls.ultimo_error = None
+
+    @classmethod
+    def status(cls):
+        """Último estado conocido, sin tocar la red"""
+        return {
+            "estado": cls.estado,
+            "fallos": cls.fallos,
+            "ultimo_error": cls.ultimo_error,
+            "proximo_sondeo_seg": max(round(cls.proximo_sondeo - time.monotonic(), 1), 0) if cls.estado == ABIERTO else 0,
+        }
+
+
+def mongo_operation(defecto=None):
+    """
+    Envuelve una operación de los servicios: si falla por conexión se abre el circuito y se
+    devuelve `defecto` (o `defecto()` si es invocable, p. ej. list), como si MongoDB no estuviera
+    disponible.
+    """
+    def decorador(func):
+        @functools.wraps(func)
+        def envoltura(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except ERRORES_CONEXION as e:
+                MongoCircuitBreaker.record_failure(e)
+                logger.warning(f"MongoDB falló en {func.__qualname__}: {e}")
+                return defecto() if callable(defecto) else defecto
+        return envoltura
+    return decorador
+
 class MongoDBService:
     """Servicio singleton para MongoDB"""
     _client = None
     _db = None
+    _indices_aplicados = set()
     
     @classmethod
     def get_client(cls):
@@ -75,23 +190,58 @@ class MongoDBService:
                 cls._db = client[config['db']]
         return cls._db
     
+    @classmethod
+    def collection(cls, nombre):
+        """
+        Colección `nombre`, con sus índices declarados (mongo_indexes) aplicados la primera vez
+        que el proceso la usa. None si no hay base de datos.
+        """
+        db = cls.get_db()
+        if db is None:
+            return None
+        if nombre not in cls._indices_aplicados:
+            try:
+                informe = MongoIndexRegistry.ensure(db, nombre)
+                for indice, detalle in informe["divergentes"]:
+                    logger.warning(f"Índice de MongoDB distinto al declarado en {nombre}.{indice}: {detalle}")
+            except ERRORES_CONEXION:
+                raise
+            except Exception as e:
+                logger.warning(f"No se pudieron verificar los índices de {nombre}: {e}")
+            cls._indices_aplicados.add(nombre)
+        return db[nombre]
+
     @classmethod
     def is_available(cls):
-        """Verifica si MongoDB está disponible"""
+        """
+        Verifica si MongoDB está disponible según el circuito: con el circuito cerrado no hace
+        ping, abierto responde False sin conectar y solo el sondeo pendiente hace ping.
+        """
+        if not PYMONGO_AVAILABLE or not settings.MONGODB_ENABLED:
+            return False
+        if MongoCircuitBreaker.estado == CERRADO:
+            return True
+        if not MongoCircuitBreaker.start_probe():
+            return False
         try:
-            client = cls.get_client()
-            if client:
-                client.admin.command('ping')
-                return True
-        except:
-            pass
-        return False
+            if cls._client is None:
+                # get_client crea el cliente y hace ping; devuelve None si no se pudo conectar
+                if cls.get_client() is None:
+                    raise ConnectionFailure("No se pudo crear el cliente de MongoDB")
+            else:
+                cls._client.admin.command('ping')
+        except Exception as e:
+            MongoCircuitBreaker.record_failure(e)
+            return False
+        MongoCircuitBreaker.record_success()
+        return True
 
 
 class ProgressLogService:
     """Servicio para gestionar registros de progreso en MongoDB"""
     
     @staticmethod
+    @mongo_operation()
     def save_detailed_progress(user_id, routine_id, exercise_id, fecha, **kwargs):
         """
         Guarda un registro detallado de progreso en MongoDB
@@ -107,11 +257,9 @@ class ProgressLogService:
             logger.warning("MongoDB no disponible, no se guardó progreso detallado")
             return None
         
-        db = MongoDBService.get_db()
-        if db is None:
+        collection = MongoDBService.collection("progress_logs")
+        if collection is None:
             return None
-
-        collection = db.progress_logs
         
         document = {
             "user_id": str(user_id),
@@ -130,15 +278,12 @@ class ProgressLogService:
             "updated_at": datetime.utcnow()
         }
         
-        # Crear índices si no existen
-        collection.create_index([("user_id", 1), ("fecha", -1)])
-        collection.create_index([("routine_id", 1), ("fecha", -1)])
-        
         result = collection.insert_one(document)
         logger.info(f"Progreso detallado guardado en MongoDB: {result.inserted_id}")
         return result.inserted_id
     
     @staticmethod
+    @mongo_operation(list)
     def get_user_progress(user_id, start_date=None, end_date=None, limit=100):
         """
         Obtiene el historial de progreso de un usuario
@@ -152,11 +297,9 @@ class ProgressLogService:
         if not MongoDBService.is_available():
             return []
         
-        db = MongoDBService.get_db()
-        if db is None:
+        collection = MongoDBService.collection("progress_logs")
+        if collection is None:
             return []
-
-        collection = db.progress_logs
         query = {"user_id": str(user_id)}
         
         if start_date or end_date:
@@ -170,13 +313,191 @@ class ProgressLogService:
         return list(cursor)
 
 
+# Política cuando la cola del buffer está llena
+DESCARTAR_NUEVO = "descartar_nuevo"      # Se pierde el documento que llega
+DESCARTAR_ANTIGUO = "descartar_antiguo"  # Se pierde el más antiguo de la cola
+ESCRIBIR = "escribir"                    # Contrapresión: quien registra escribe un lote antes de encolar
+POLITICAS = (DESCARTAR_NUEVO, DESCARTAR_ANTIGUO, ESCRIBIR)
+
+
+class ActivityLogBuffer:
+    """
+    Buffer en memoria de los logs de actividad, seguro entre hilos. Los documentos se acumulan
+    en una cola acotada (max_size) y un hilo en segundo plano los escribe con
+    insert_many(ordered=False) en lotes de batch_size cuando se llena un lote, cada
+    flush_interval segundos y al terminar el proceso. Con MongoDB no disponible los documentos
+    esperan en la cola (un lote que falla por conexión vuelve a ella); si se llena se aplica
+    `politica`. Los contadores cuentan documentos: escritos, descartados por desbordamiento de la
+    cola y fallidos (rechazados por MongoDB, que no se reintentan).
+    """
+
+    def __init__(self, max_size=10000, batch_size=100, flush_interval=5.0, politica=DESCARTAR_NUEVO):
+        if politica not in POLITICAS:
+            raise ValueError(f"Política desconocida: {politica}")
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.politica = politica
+        self.escritos = 0
+        self.descartados = 0
+        self.fallidos = 0
+        self._cola = collections.deque()
+        self._lock = threading.Lock()
+        self._escritura = threading.Lock()  # Un lote a la vez
+        self._pendiente = threading.Event()
+        self._hilo = None
+        self._pid = None
+        self._cerrado = False
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_size=getattr(settings, "ACTIVITY_LOG_MAX_QUEUE", 10000),
+            batch_size=getattr(settings, "ACTIVITY_LOG_BATCH_SIZE", 100),
+            flush_interval=getattr(settings, "ACTIVITY_LOG_FLUSH_INTERVAL", 5.0),
+            politica=getattr(settings, "ACTIVITY_LOG_OVERFLOW", DESCARTAR_NUEVO),
+        )
+
+    def add(self, documento):
+        """Encola un documento sin esperar a MongoDB. Devuelve False si se descartó"""
+        self._iniciar()
+        if self.politica == ESCRIBIR and len(self._cola) >= self.max_size:
+            self.flush_batch()
+        with self._lock:
+            if len(self._cola) >= self.max_size:
+                if self.politica == DESCARTAR_ANTIGUO:
+                    self._cola.popleft()
+                    self.descartados += 1
+                else:
+                    self.descartados += 1
+                    return False
+            self._cola.append(documento)
+            lleno = len(self._cola) >= self.batch_size
+        if lleno:
+            self._pendiente.set()
+        return True
+
+    def flush_batch(self):
+        """Escribe un lote (si MongoDB está disponible). Devuelve los documentos escritos"""
+        with self._escritura:
+            if not self._cola or not MongoDBService.is_available():
+                return 0
+            with self._lock:
+                lote = [self._cola.popleft() for _ in range(min(self.batch_size, len(self._cola)))]
+            # insert_many asigna el _id a cada documento antes de enviarlo: los que ya lo tienen
+            # vuelven de un intento anterior que pudo escribirlos antes de perder la conexión
+            reintentados = {i for i, doc in enumerate(lote) if "_id" in doc}
+            try:
+                collection = MongoDBService.collection("user_activity_logs")
+                if collection is None:
+                    raise ConnectionFailure("Sin base de datos de MongoDB")
+                escritos = len(collection.insert_many(lote, ordered=False).inserted_ids)
+            except BulkWriteError as e:
+                # ordered=False: se escriben todos los documentos válidos del lote. Un _id duplicado
+                # de un documento reintentado es una escritura ya confirmada, no un fallo
+                duplicados = sum(
+                    1 for error in e.details.get("writeErrors", [])
+                    if error.get("code") == 11000 and error.get("index") in reintentados
+                )
+                escritos = e.details.get("nInserted", 0) + duplicados
+            except ERRORES_CONEXION as e:
+                # El lote vuelve al frente de la cola; el circuit breaker decide cuándo reintentar
+                MongoCircuitBreaker.record_failure(e)
+                self._reencolar(lote)
+                logger.warning(f"MongoDB no disponible, {len(lote)} logs de actividad vuelven a la cola: {e}")
+                return 0
+            except Exception as e:
+                logger.warning(f"No se pudieron escribir {len(lote)} logs de actividad: {e}")
+                escritos = 0
+            with self._lock:
+                self.escritos += escritos
+                self.fallidos += len(lote) - escritos
+            return escritos
+
+    def _reencolar(self, lote):
+        """
+        Devuelve un lote no escrito al frente de la cola en su orden original. Si no cabe
+        (max_size) se descartan sus documentos más antiguos y cuentan como descartados.
+        """
+        with self._lock:
+            espacio = max(self.max_size - len(self._cola), 0)
+            sobrantes = max(len(lote) - espacio, 0)
+            self._cola.extendleft(reversed(lote[sobrantes:]))
+            self.descartados += sobrantes
+
+    def flush(self):
+        """Escribe todo lo encolado (se detiene si un lote no avanza, p. ej. sin MongoDB)"""
+        total = 0
+        while self._cola:
+            pendientes = len(self._cola)
+            total += self.flush_batch()
+            if len(self._cola) >= pendientes:
+                break
+        return total
+
+    def stats(self):
+        return {
+            "pendientes": len(self._cola),
+            "escritos": self.escritos,
+            "descartados": self.descartados,
+            "fallidos": self.fallidos,
+        }
+
+    def close(self):
+        """Detiene el hilo y escribe lo pendiente (registrado con atexit)"""
+        self._cerrado = True
+        self._pendiente.set()
+        self.flush()
+
+    def _iniciar(self):
+        """Arranca el hilo de escritura en este proceso (también tras un fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Proceso hijo: lo heredado de la cola lo escribe el proceso padre
+                self._cola.clear()
+            self._cerrado = False
+            self._hilo = threading.Thread(target=self._bucle, name="activity-log-buffer", daemon=True)
+            self._hilo.start()
+            if self._pid is None:
+                atexit.register(self.close)
+            self._pid = os.getpid()
+
+    def _bucle(self):
+        while not self._cerrado:
+            self._pendiente.wait(self.flush_interval)
+            self._pendiente.clear()
+            if self._cerrado:
+                return
+            try:
+                # Lotes completos mientras haya; al vencer el intervalo, también el incompleto
+                while self.flush_batch() and len(self._cola) >= self.batch_size:
+                    pass
+            except Exception as e:
+                logger.warning(f"Error en el buffer de logs de actividad: {e}")
+
+
 class ActivityLogService:
     """Servicio para registrar logs de actividad"""
     
+    _buffer = None
+    
+    @classmethod
+    def buffer(cls):
+        if cls._buffer is None:
+            cls._buffer = ActivityLogBuffer.from_settings()
+        return cls._buffer
+    
     @staticmethod
+    @mongo_operation()
     def log_activity(user_id, action, entity_type=None, entity_id=None, metadata=None, request=None):
         """
-        Registra una actividad del usuario en MongoDB
+        Registra una actividad del usuario en MongoDB. Con ACTIVITY_LOG_BUFFERED (por defecto)
+        el documento se encola en el buffer y se escribe en lote más tarde; el id se asigna al
+        encolar.
         
         Args:
             user_id: ID del usuario
@@ -186,15 +507,9 @@ class ActivityLogService:
             metadata: Diccionario con información adicional
             request: Objeto request de Django (opcional)
         """
-        if not MongoDBService.is_available():
+        if not PYMONGO_AVAILABLE or not settings.MONGODB_ENABLED:
             return None
         
-        db = MongoDBService.get_db()
-        if db is None:
-            return None
-
-        collection = db.user_activity_logs
-        
         document = {
             "user_id": str(user_id),
             "action": action,
@@ -208,18 +523,33 @@ class ActivityLogService:
             document["ip_address"] = request.META.get("REMOTE_ADDR", "")
             document["user_agent"] = request.META.get("HTTP_USER_AGENT", "")
         
-        # Crear índices si no existen
-        collection.create_index([("user_id", 1), ("timestamp", -1)])
-        collection.create_index([("action", 1), ("timestamp", -1)])
+        if getattr(settings, "ACTIVITY_LOG_BUFFERED", True):
+            document["_id"] = ObjectId()
+            return document["_id"] if ActivityLogService.buffer().add(document) else None
+        
+        if not MongoDBService.is_available():
+            return None
+        
+        collection = MongoDBService.collection("user_activity_logs")
+        if collection is None:
+            return None
         
         result = collection.insert_one(document)
         return result.inserted_id
+    
+    @staticmethod
+    def flush():
+        """Escribe los logs encolados (p. ej. al final de un comando)"""
+        if ActivityLogService._buffer is None:
+            return 0
+        return ActivityLogService._buffer.flush()
 
 
 class ExerciseDetailsService:
     """Servicio para gestionar detalles extendidos de ejercicios"""
 
     @staticmethod
+    @mongo_operation()
     def save_exercise_details(exercise_id, **kwargs):
         """
         Guarda detalles extendidos de un ejercicio
@@ -231,12 +561,10 @@ class ExerciseDetailsService:
         if not MongoDBService.is_available():
             return None
 
-        db = MongoDBService.get_db()
-        if db is None:
+        collection = MongoDBService.collection("exercise_details")
+        if collection is None:
             return None
 
-        collection = db.exercise_details
-
         document = {
             "exercise_id": int(exercise_id),
             "variaciones": kwargs.get("variaciones", []),
@@ -251,9 +579,6 @@ class ExerciseDetailsService:
         }
 
         # Usar upsert para actualizar si existe o crear si no
-        collection.create_index([("exercise_id", 1)], unique=True)
-        collection.create_index([("tags", 1)])
-
         result = collection.update_one(
             {"exercise_id": int(exercise_id)},
             {"$set": document},
@@ -262,16 +587,15 @@ class ExerciseDetailsService:
         return result.upserted_id or exercise_id
 
     @staticmethod
+    @mongo_operation()
     def get_exercise_details(exercise_id):
         """Obtiene los detalles extendidos de un ejercicio"""
         if not MongoDBService.is_available():
             return None
 
-        db = MongoDBService.get_db()
-        if db is None:
+        collection = MongoDBService.collection("exercise_details")
+        if collection is None:
             return None
-
-        collection = db.exercise_details
         return collection.find_one({"exercise_id": int(exercise_id)})
 
 
@@ -279,6 +603,7 @@ class ExerciseService:
     """Servicio para gestionar ejercicios en MongoDB (complemento a BD relacional)"""
 
     @staticmethod
+    @mongo_operation()
     def save_exercise(exercise_id, user_id, **kwargs):
         """
         Guarda información del ejercicio en MongoDB
@@ -292,12 +617,10 @@ class ExerciseService:
             logger.warning("MongoDB no disponible, no se guardó ejercicio")
             return None
 
-        db = MongoDBService.get_db()
-        if db is None:
+        collection = MongoDBService.collection("exercises")
+        if collection is None:
             return None
 
-        collection = db.exercises
-
         document = {
             "exercise_id": int(exercise_id),
             "user_id": str(user_id) if user_id else None,
@@ -312,11 +635,6 @@ class ExerciseService:
             "updated_at": datetime.utcnow()
         }
 
-        # Crear índices
-        collection.create_index([("exercise_id", 1)], unique=True)
-        collection.create_index([("user_id", 1), ("created_at", -1)])
-        collection.create_index([("tipo", 1)])
-
         result = collection.update_one(
             {"exercise_id": int(exercise_id)},
             {"$set": document},
@@ -330,6 +648,7 @@ class RoutineService:
     """Servicio para gestionar rutinas en MongoDB (complemento a BD relacional)"""
 
     @staticmethod
+    @mongo_operation()
     def save_user_routine(routine_id, user_id, **kwargs):
         """
         Guarda información de rutina de usuario en MongoDB
@@ -343,12 +662,10 @@ class RoutineService:
             logger.warning("MongoDB no disponible, no se guardó rutina")
             return None
 
-        db = MongoDBService.get_db()
-        if db is None:
+        collection = MongoDBService.collection("user_routines")
+        if collection is None:
             return None
 
-        collection = db.user_routines
-
         document = {
             "routine_id": int(routine_id),
             "user_id": str(user_id),
@@ -362,11 +679,6 @@ class RoutineService:
             "updated_at": datetime.utcnow()
         }
 
-        # Crear índices
-        collection.create_index([("routine_id", 1)], unique=True)
-        collection.create_index([("user_id", 1), ("created_at", -1)])
-        collection.create_index([("trainer_id", 1)])
-
         result = collection.update_one(
             {"routine_id": int(routine_id)},
             {"$set": document},
@@ -376,6 +688,7 @@ class RoutineService:
         return result.upserted_id or routine_id
 
     @staticmethod
+    @mongo_operation()
     def save_routine_template(routine_id, trainer_id, **kwargs):
         """
         Guarda plantilla de rutina prediseñada en MongoDB
@@ -389,12 +702,10 @@ class RoutineService:
             logger.warning("MongoDB no disponible, no se guardó plantilla")
             return None
 
-        db = MongoDBService.get_db()
-        if db is None:
+        collection = MongoDBService.collection("routine_templates")
+        if collection is None:
             return None
 
-        collection = db.routine_templates
-
         document = {
             "routine_id": int(routine_id),
             "trainer_id": str(trainer_id),
@@ -411,11 +722,6 @@ class RoutineService:
             "updated_at": datetime.utcnow()
         }
 
-        # Crear índices
-        collection.create_index([("routine_id", 1)], unique=True)
-        collection.create_index([("trainer_id", 1), ("created_at", -1)])
-        collection.create_index([("tags", 1)])
-
         result = collection.update_one(
             {"routine_id": int(routine_id)},
             {"$set": document},
@@ -425,16 +731,15 @@ class RoutineService:
         return result.upserted_id or routine_id
 
     @staticmethod
+    @mongo_operation(list)
     def get_user_routines(user_id, limit=50):
         """Obtiene las rutinas de un usuario desde MongoDB"""
         if not MongoDBService.is_available():
             return []
 
-        db = MongoDBService.get_db()
-        if db is None:
+        collection = MongoDBService.collection("user_routines")
+        if collection is None:
             return []
-
-        collection = db.user_routines
         cursor = collection.find({"user_id": str(user_id)}).sort("created_at", -1).limit(limit)
         return list(cursor)
 
@@ -443,6 +748,7 @@ class TrainerAssignmentService:
     """Servicio para gestionar asignaciones de entrenadores en MongoDB"""
 
     @staticmethod
+    @mongo_operation()
     def save_assignment(assignment_id, user_id, trainer_id, **kwargs):
         """
         Guarda asignación de entrenador en MongoDB
@@ -457,12 +763,10 @@ class TrainerAssignmentService:
             logger.warning("MongoDB no disponible, no se guardó asignación")
             return None
 
-        db = MongoDBService.get_db()
-        if db is None:
+        collection = MongoDBService.collection("trainer_assignments")
+        if collection is None:
             return None
 
-        collection = db.trainer_assignments
-
         document = {
             "assignment_id": int(assignment_id),
             "user_id": str(user_id),
@@ -475,11 +779,6 @@ class TrainerAssignmentService:
             "updated_at": datetime.utcnow()
         }
 
-        # Crear índices
-        collection.create_index([("assignment_id", 1)], unique=True)
-        collection.create_index([("user_id", 1), ("activo", 1)])
-        collection.create_index([("trainer_id", 1), ("activo", 1)])
-
         result = collection.update_one(
             {"assignment_id": int(assignment_id)},
             {"$set": document},
@@ -489,16 +788,56 @@ class TrainerAssignmentService:
         return result.upserted_id or assignment_id
 
     @staticmethod
+    @mongo_operation(0)
+    def save_assignments(assignments):
+        """
+        Refleja un lote de asignaciones con un solo bulk_write (upsert por assignment_id).
+        `assignments`: dicts con assignment_id, user_id, trainer_id, fecha_asignacion y activo.
+        """
+        if not assignments:
+            return 0
+        if not MongoDBService.is_available():
+            logger.warning("MongoDB no disponible, no se guardaron asignaciones")
+            return 0
+
+        collection = MongoDBService.collection("trainer_assignments")
+        if collection is None:
+            return 0
+
+        ahora = datetime.utcnow()
+        operaciones = []
+        for datos in assignments:
+            fecha = datos.get("fecha_asignacion") or ahora
+            if not isinstance(fecha, datetime):
+                fecha = datetime.combine(fecha, datetime.min.time())
+            operaciones.append(UpdateOne(
+                {"assignment_id": int(datos["assignment_id"])},
+                {
+                    "$set": {
+                        "user_id": str(datos["user_id"]),
+                        "trainer_id": str(datos["trainer_id"]),
+                        "fecha_asignacion": fecha,
+                        "activo": datos.get("activo", True),
+                        "updated_at": ahora,
+                    },
+                    "$setOnInsert": {"notas": "", "objetivos": [], "created_at": ahora},
+                },
+                upsert=True,
+            ))
+        result = collection.bulk_write(operaciones, ordered=False)
+        logger.info(f"Asignaciones de entrenador guardadas en MongoDB: {len(operaciones)}")
+        return result.upserted_count + result.modified_count
+
+    @staticmethod
+    @mongo_operation(list)
     def get_trainer_assignees(trainer_id, active_only=True):
         """Obtiene los usuarios asignados a un entrenador"""
         if not MongoDBService.is_available():
             return []
 
-        db = MongoDBService.get_db()
-        if db is None:
+        collection = MongoDBService.collection("trainer_assignments")
+        if collection is None:
             return []
-
-        collection = db.trainer_assignments
         query = {"trainer_id": str(trainer_id)}
         if active_only:
             query["activo"] = True
@@ -0,0 +1,165 @@
+"""
+Cache de resultados de reportes.
+Los reportes mensuales se guardan con clave (reporte, usuario, año, mes, versión de datos):
+los meses cerrados expiran tras REPORT_CACHE_CLOSED_TIMEOUT segundos y el mes en curso tras
+REPORT_CACHE_TIMEOUT segundos. Las versiones viven en el cache compartido (CACHES), así una
+invalidación se ve en todos los procesos. Los contadores de hits/misses se acumulan en memoria
+del proceso y se suman al cache compartido como máximo una vez cada STATS_FLUSH_INTERVAL
+segundos: un acierto no escribe en el cache. Cuando cambia un ProgressLog/Routine se incrementa la versión
+del mes afectado, de modo que solo ese periodo se recalcula. Los reportes sobre todo el
+historial usan una versión por usuario y la fecha del día en la clave.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "fit:report"
+# Incrementar cuando cambie la forma de los contextos cacheados (los meses cerrados no expiran)
+CONTEXT_VERSION = 2
+STATS_FLUSH_INTERVAL = 30  # Segundos entre volcados de los contadores del proceso
+
+_pendientes = Counter()  # {(reporte, resultado): n} aún no volcados al cache compartido
+_pendientes_lock = threading.Lock()
+_volcado = time.monotonic()
+
+
+def _now_version():
+    # Valor inicial distinto en cada arranque para no reutilizar versiones si la clave se pierde
+    return int(time.time() * 1000)
+
+
+class ReportCache:
+    """Cache de contextos de reportes con invalidación por versión de datos"""
+
+    @staticmethod
+    def _timeout_current():
+        return getattr(settings, "REPORT_CACHE_TIMEOUT", 300)
+
+    @staticmethod
+    def _timeout_closed():
+        # Finito aunque el mes esté cerrado: acota cualquier versión que no llegara a invalidarse
+        return getattr(settings, "REPORT_CACHE_CLOSED_TIMEOUT", 7 * 24 * 3600)
+
+    # ---------------------------- Versiones ----------------------------
+    @staticmethod
+    def _version_key(user_id, year=None, month=None):
+        if year is None:
+            return f"{KEY_PREFIX}:ver:{user_id}"
+        return f"{KEY_PREFIX}:ver:{user_id}:{year}:{month}"
+
+    @staticmethod
+    def _get_version(key):
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, _now_version(), None)
+            version = cache.get(key)
+        return version
+
+    @staticmethod
+    def _bump(key):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _now_version(), None)
+
+    @staticmethod
+    def invalidate(user_id, fecha=None):
+        """
+        Invalida los reportes de un usuario para el mes de `fecha` (por defecto el actual)
+        y los reportes que dependen de todo su historial.
+        """
+        fecha = fecha or date.today()
+        ReportCache._bump(ReportCache._version_key(user_id, fecha.year, fecha.month))
+        ReportCache._bump(ReportCache._version_key(user_id))
+
+    # ---------------------------- Métricas ----------------------------
+    @staticmethod
+    def _count(report, outcome):
+        global _volcado
+        with _pendientes_lock:
+            _pendientes[(report, outcome)] += 1
+            volcar = time.monotonic() - _volcado >= STATS_FLUSH_INTERVAL
+        if volcar:
+            ReportCache.flush_stats()
+
+    @staticmethod
+    def flush_stats():
+        """Suma al cache compartido los contadores acumulados en este proceso"""
+        global _volcado
+        with _pendientes_lock:
+            pendientes = dict(_pendientes)
+            _pendientes.clear()
+            _volcado = time.monotonic()
+        for (report, outcome), n in pendientes.items():
+            key = f"{KEY_PREFIX}:stats:{report}:{outcome}"
+            try:
+                if not cache.add(key, n, None):
+                    cache.incr(key, n)
+            except ValueError:
+                cache.set(key, n, None)
+            except Exception as e:
+                logger.warning(f"No se pudieron guardar las métricas del cache de reportes: {e}")
+
+    @staticmethod
+    def stats(reports):
+        """Hits, misses y tasa de aciertos por reporte (incluye lo pendiente de este proceso)"""
+        ReportCache.flush_stats()
+        resultado = {}
+        for report in reports:
+            hits = cache.get(f"{KEY_PREFIX}:stats:{report}:hit", 0)
+            misses = cache.get(f"{KEY_PREFIX}:stats:{report}:miss", 0)
+            total = hits + misses
+            resultado[report] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / total * 100, 1) if total else 0,
+            }
+        return resultado
+
+    # ---------------------------- Lectura ----------------------------
+    @staticmethod
+    def _get_or_compute(report, key, timeout, compute):
+        context = cache.get(key)
+        if context is not None:
+            ReportCache._count(report, "hit")
+            return context
+        ReportCache._count(report, "miss")
+        context = compute()
+        try:
+            cache.set(key, context, timeout)
+        except Exception as e:
+            # Un contexto no serializable no debe romper el reporte
+            logger.warning(f"No se pudo cachear el reporte {report}: {e}")
+        return context
+
+    @staticmethod
+    def monthly(report, user_id, year, month, compute, hoy=None):
+        """
+        Contexto de un reporte mensual. `compute` se ejecuta solo en un fallo de cache
+        y no debe incluir datos que dependan del día actual.
+        """
+        hoy = hoy or date.today()
+        version = ReportCache._get_version(ReportCache._version_key(user_id, year, month))
+        key = f"{KEY_PREFIX}:{report}:c{CONTEXT_VERSION}:{user_id}:{year}:{month}:v{version}"
+        cerrado = (year, month) < (hoy.year, hoy.month)
+        timeout = ReportCache._timeout_closed() if cerrado else ReportCache._timeout_current()
+        return ReportCache._get_or_compute(report, key, timeout, compute)
+
+    @staticmethod
+    def rolling(report, user_id, compute, hoy=None):
+        """Contexto de un reporte sobre todo el historial o ventanas relativas a hoy"""
+        hoy = hoy or date.today()
+        version = ReportCache._get_version(ReportCache._version_key(user_id))
+        key = f"{KEY_PREFIX}:{report}:c{CONTEXT_VERSION}:{user_id}:v{version}:{hoy.isoformat()}"
+        return ReportCache._get_or_compute(report, key, ReportCache._timeout_current(), compute)
+
+
+atexit.register(ReportCache.flush_stats)
@@ -0,0 +1,159 @@
+"""
+Snapshots precalculados de reportes.
+El comando precompute_reports guarda en ReportSnapshot el contexto de los reportes de cada
+usuario; las vistas los sirven antes de recalcular desde los datos. Cualquier cambio en los
+datos de un periodo elimina su snapshot (ver fit.signals).
+Los tipos que JSON no conserva (fechas, Decimal, tuplas y diccionarios con claves no texto) se
+guardan etiquetados con "__tipo__" y solo esos se reconstruyen: un texto con forma de fecha o
+una clave "2024" siguen siendo texto. De los reportes diarios se guarda solo el último día.
+Cada invalidación deja en el cache compartido la hora del cambio del usuario: un snapshot
+calculado antes de esa hora no se guarda (ni se conserva si el cambio llega durante el upsert).
+"""
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import ReportSnapshot
+
+# Reportes que dependen de todo el historial: su snapshot es por día
+REPORTES_DIARIOS = ("load_balance",)
+
+CAMBIO_KEY = "fit:snapshots:cambio:{}"
+CAMBIO_TIMEOUT = 24 * 3600  # Debe cubrir el cálculo más largo de precompute_reports
+
+FORMATO = 2  # Versión de la codificación; los snapshots de otro formato se recalculan
+_TIPO = "__tipo__"
+
+
+def month_key(year, month):
+    return f"{year:04d}-{month:02d}"
+
+
+def _encode(valor):
+    """Contexto a JSON con los tipos no nativos etiquetados"""
+    if isinstance(valor, datetime):
+        return {_TIPO: "datetime", "valor": valor.isoformat()}
+    if isinstance(valor, date):
+        return {_TIPO: "date", "valor": valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {_TIPO: "decimal", "valor": str(valor)}
+    if isinstance(valor, tuple):
+        return {_TIPO: "tuple", "valor": [_encode(v) for v in valor]}
+    if isinstance(valor, dict):
+        if all(isinstance(k, str) for k in valor) and _TIPO not in valor:
+            return {k: _encode(v) for k, v in valor.items()}
+        return {_TIPO: "dict", "valor": [[_encode(k), _encode(v)] for k, v in valor.items()]}
+    if isinstance(valor, list):
+        return [_encode(v) for v in valor]
+    return valor
+
+
+_DECODIFICADORES = {
+    "datetime": datetime.fromisoformat,
+    "date": date.fromisoformat,
+    "decimal": Decimal,
+    "tuple": lambda items: tuple(_decode(v) for v in items),
+    "dict": lambda items: {_decode(k): _decode(v) for k, v in items},
+}
+
+
+def _decode(valor):
+    """Inverso de _encode: reconstruye solo los valores etiquetados"""
+    if isinstance(valor, dict):
+        if _TIPO in valor:
+            return _DECODIFICADORES[valor[_TIPO]](valor["valor"])
+        return {k: _decode(v) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_decode(v) for v in valor]
+    return valor
+
+
+class ReportSnapshotService:
+    """Servicio para guardar, servir e invalidar snapshots de reportes"""
+
+    @staticmethod
+    def get(reporte, user_id, periodo):
+        """Contexto guardado o None"""
+        datos = (
+            ReportSnapshot.objects.filter(user_id=user_id, reporte=reporte, periodo=periodo)
+            .values_list("datos", flat=True)
+            .first()
+        )
+        if not isinstance(datos, dict) or datos.get("formato") != FORMATO:
+            # Sin snapshot o guardado con un formato anterior
+            return None
+        return _decode(datos["contexto"])
+
+    @staticmethod
+    def get_or_compute(reporte, user_id, periodo, compute):
+        """Sirve el snapshot si existe; si no, calcula (sin guardar)"""
+        context = ReportSnapshotService.get(reporte, user_id, periodo)
+        return compute() if context is None else context
+
+    @staticmethod
+    def changed_since(user_ids, desde):
+        """Usuarios de `user_ids` cuyos datos cambiaron (se invalidaron) en o después de `desde`"""
+        user_ids = set(user_ids)
+        marcas = cache.get_many([CAMBIO_KEY.format(user_id) for user_id in user_ids])
+        return {user_id for user_id in user_ids if marcas.get(CAMBIO_KEY.format(user_id), 0) >= desde}
+
+    @staticmethod
+    def store_many(snapshots, calculado_desde=None):
+        """
+        Guarda (upsert) una lista de (reporte, user_id, periodo, contexto) en una sentencia. De
+        los reportes diarios elimina además los días anteriores de esos usuarios. Con
+        `calculado_desde` (time.time() al empezar el cálculo) se omiten los usuarios cuyos datos
+        cambiaron después, y se vuelven a comprobar tras el upsert. Devuelve los guardados.
+        """
+        if calculado_desde is not None:
+            cambiados = ReportSnapshotService.changed_since((s[1] for s in snapshots), calculado_desde)
+            snapshots = [s for s in snapshots if s[1] not in cambiados]
+        if not snapshots:
+            return 0
+        diarios = {}
+        for reporte, user_id, periodo, _ in snapshots:
+            if reporte in REPORTES_DIARIOS:
+                diarios.setdefault((reporte, periodo), []).append(user_id)
+        for (reporte, periodo), user_ids in diarios.items():
+            ReportSnapshot.objects.filter(reporte=reporte, user_id__in=user_ids, periodo__lt=periodo).delete()
+        ReportSnapshot.objects.bulk_create(
+            [
+                ReportSnapshot(
+                    user_id=user_id, reporte=reporte, periodo=periodo,
+                    datos={"formato": FORMATO, "contexto": _encode(contexto)},
+                )
+                for reporte, user_id, periodo, contexto in snapshots
+            ],
+            update_conflicts=True,
+            unique_fields=["user", "reporte", "periodo"],
+            update_fields=["datos", "fecha_calculo"],
+        )
+        if calculado_desde is not None:
+            # Invalidación concurrente al upsert: su borrado pudo ejecutarse antes
+            cambiados = ReportSnapshotService.changed_since((s[1] for s in snapshots), calculado_desde)
+            for reporte, user_id, periodo, _ in snapshots:
+                if user_id in cambiados:
+                    ReportSnapshot.objects.filter(user_id=user_id, reporte=reporte, periodo=periodo).delete()
+            snapshots = [s for s in snapshots if s[1] not in cambiados]
+        return len(snapshots)
+
+    @staticmethod
+    def purge_daily(periodo):
+        """Elimina los snapshots diarios anteriores a `periodo` (p. ej. de usuarios inactivos)"""
+        return ReportSnapshot.objects.filter(reporte__in=REPORTES_DIARIOS, periodo__lt=periodo).delete()[0]
+
+    @staticmethod
+    def invalidate(user_id, fecha=None):
+        """
+        Elimina los snapshots del mes de `fecha` (por defecto el actual) y los diarios del usuario,
+        y marca la hora del cambio para los cálculos en curso.
+        """
+        fecha = fecha or date.today()
+        cache.set(CAMBIO_KEY.format(user_id), time.time(), CAMBIO_TIMEOUT)
+        ReportSnapshot.objects.filter(
+            Q(periodo=month_key(fecha.year, fecha.month)) | Q(reporte__in=REPORTES_DIARIOS),
+            user_id=user_id,
+        ).delete()
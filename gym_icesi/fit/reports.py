@@ -0,0 +1,167 @@
+"""
+Cálculo de los reportes del usuario.
+Funciones puras (sin request) para que las usen tanto las vistas como el precálculo
+nocturno de snapshots (comando precompute_reports).
+"""
+from calendar import monthrange
+from datetime import date
+
+from django.db.models import Count
+
+from .composition_service import RoutineCompositionService
+from .models import ProgressLog, Routine
+from .rollup_service import DailyActivityService, summarize as summarize_activity
+
+
+def month_bounds(year, month):
+    """Primer y último día del mes"""
+    return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+
+
+def adherence_context(user, year, month):
+    """Informe de adherencia y consistencia de un mes (sin la racha actual, que depende de hoy)"""
+    inicio, fin = month_bounds(year, month)
+    dias_del_mes = fin.day
+    logs = ProgressLog.objects.filter(user=user, fecha__range=(inicio, fin))
+    # Totales del mes desde el rollup diario (máximo 31 filas)
+    dias = DailyActivityService.rows(user, inicio, fin)
+    resumen = summarize_activity(dias)
+    dias_activos = resumen["dias_activos"]
+    total_sesiones = resumen["sesiones"]
+    porcentaje_adherencia = round((dias_activos / dias_del_mes) * 100, 1) if dias_del_mes > 0 else 0
+
+    # Días planificados (asumiendo que las rutinas sugieren ciertos días)
+    # Por ahora, calculamos basado en rutinas activas
+    rutinas_activas = Routine.objects.filter(user=user).count()
+    # Estimación: si tiene rutinas, asumimos que planifica entrenar 3-4 veces por semana
+    dias_planificados_estimados = round((dias_del_mes / 7) * 3.5) if rutinas_activas > 0 else 0
+
+    # Sesiones repartidas por tipo según la composición de cada rutina
+    por_tipo = RoutineCompositionService.load_balance(logs)
+
+    # Esfuerzo promedio
+    esfuerzo_promedio = round(resumen["esfuerzo_promedio"], 1)
+
+    # Rutinas más usadas
+    rutinas_mas_usadas = list(
+        logs.values("routine__nombre")
+        .annotate(veces=Count("id"))
+        .order_by("-veces")[:5]
+    )
+
+    # Porcentaje de cumplimiento (días entrenados vs planificados)
+    porcentaje_cumplimiento = 0
+    if dias_planificados_estimados > 0:
+        porcentaje_cumplimiento = round((dias_activos / dias_planificados_estimados) * 100, 1)
+
+    # Mejor semana del mes
+    sesiones_por_semana = {}
+    for dia in dias:
+        semana = (dia.fecha.day - 1) // 7 + 1
+        sesiones_por_semana[semana] = sesiones_por_semana.get(semana, 0) + dia.sesiones
+    mejor_semana = None
+    if sesiones_por_semana:
+        mejor_semana = max(sesiones_por_semana.items(), key=lambda x: x[1])
+
+    return {
+        "year": year,
+        "month": month,
+        "dias_activos": dias_activos,
+        "total_sesiones": total_sesiones,
+        "dias_del_mes": dias_del_mes,
+        "dias_planificados_estimados": dias_planificados_estimados,
+        "porcentaje_adherencia": porcentaje_adherencia,
+        "porcentaje_cumplimiento": porcentaje_cumplimiento,
+        "esfuerzo_promedio": esfuerzo_promedio,
+        "por_tipo": por_tipo,
+        "rutinas_mas_usadas": rutinas_mas_usadas,
+        "mejor_semana": mejor_semana,
+        "periodo": (inicio, fin),
+    }
+
+
+def load_balance_context(user, hoy):
+    """Balance de carga por tipo de ejercicio y evolución de las últimas 4 semanas"""
+    # Volumen atribuido proporcionalmente a cada tipo (sin duplicar por ítem de rutina)
+    agg = RoutineCompositionService.load_balance(
+        ProgressLog.objects.filter(user=user)
+    )
+
+    # Calcular totales
+    total_reps_all = sum(item["total_reps"] or 0 for item in agg)
+    total_tiempo_all = sum(item["total_tiempo"] or 0 for item in agg)
+
+    # Evolución semanal (últimas 4 semanas) desde el rollup diario
+    semanas = DailyActivityService.weekly_sessions(user, 4, hoy)
+
+    return {
+        "agg": agg,
+        "total_reps_all": total_reps_all,
+        "total_tiempo_all": total_tiempo_all,
+        "semanas": semanas,
+    }
+
+
+def progress_context(user, year, month):
+    """Informe de progreso mensual con estadísticas por semana, tipo de ejercicio e hitos"""
+    inicio, fin = month_bounds(year, month)
+    # Logs del mes seleccionado
+    logs = ProgressLog.objects.filter(user=user, fecha__range=(inicio, fin))
+    dias = DailyActivityService.rows(user, inicio, fin)
+    resumen = summarize_activity(dias)
+
+    # Estadísticas básicas (rollup diario: máximo 31 filas)
+    total_sesiones = resumen["sesiones"]
+    dias_activos = resumen["dias_activos"]
+    total_tiempo_seg = resumen["tiempo_total"]
+    total_tiempo_horas = round(total_tiempo_seg / 3600, 1) if total_tiempo_seg else 0
+
+    # Rutinas diferentes usadas
+    rutinas_usadas = logs.values("routine__nombre").distinct().count()
+
+    # Esfuerzo promedio
+    esfuerzo_promedio = round(resumen["esfuerzo_promedio"], 1)
+
+    # Sesiones por semana del mes (para gráfica de barras)
+    sesiones_por_semana = {}
+    for dia in dias:
+        semana = (dia.fecha.day - 1) // 7 + 1
+        sesiones_por_semana[semana] = sesiones_por_semana.get(semana, 0) + dia.sesiones
+
+    # Distribución por tipo de ejercicio (para gráfica de pastel)
+    distribucion_tipo = {
+        tipo: datos["sesiones"]
+        for tipo, datos in RoutineCompositionService.type_distribution(logs).items()
+        if tipo
+    }
+
+    # Hitos del mes
+    hitos = []
+    if total_sesiones > 0:
+        hitos.append(f"Primera sesión del mes: {dias[0].fecha.strftime('%d de %B')}")
+    if total_sesiones >= 10:
+        hitos.append(f"¡10+ sesiones completadas este mes!")
+    if dias_activos >= 15:
+        hitos.append(f"¡15+ días activos este mes!")
+    if esfuerzo_promedio >= 8:
+        hitos.append(f"¡Esfuerzo promedio alto ({esfuerzo_promedio}/10)!")
+
+    # Semana con más sesiones
+    if sesiones_por_semana:
+        semana_max = max(sesiones_por_semana.items(), key=lambda x: x[1])
+        hitos.append(f"Mejor semana: Semana {semana_max[0]} con {semana_max[1]} sesiones")
+
+    return {
+        "year": year,
+        "month": month,
+        "inicio": inicio,
+        "fin": fin,
+        "total_sesiones": total_sesiones,
+        "dias_activos": dias_activos,
+        "total_tiempo_horas": total_tiempo_horas,
+        "rutinas_usadas": rutinas_usadas,
+        "esfuerzo_promedio": esfuerzo_promedio,
+        "sesiones_por_semana": sesiones_por_semana,
+        "distribucion_tipo": distribucion_tipo,
+        "hitos": hitos,
+    }
@@ -0,0 +1,151 @@
+"""
+Rollup diario de actividad.
+Mantiene DailyActivity (una fila por usuario y día) a partir de ProgressLog para que los
+reportes lean como máximo 31 filas por usuario y mes en lugar de recorrer los registros.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import DailyActivity, ProgressLog
+
+
+def _day_aggregates(logs):
+    """Agregados por (usuario, día) de un queryset de ProgressLog"""
+    return (
+        logs.values("user_id", "fecha")
+        .annotate(
+            sesiones=Count("id"),
+            tiempo_total=Coalesce(Sum("tiempo_seg"), Value(0)),
+            esfuerzo_sum=Coalesce(Sum("esfuerzo"), Value(0)),
+            esfuerzo_max=Coalesce(Max("esfuerzo"), Value(0)),
+            reps_total=Coalesce(Sum("repeticiones"), Value(0)),
+            peso_max=Max("peso_usado"),
+        )
+        .order_by()
+    )
+
+
+def summarize(rows):
+    """Totales de un conjunto de filas DailyActivity"""
+    sesiones = sum(r.sesiones for r in rows)
+    esfuerzo_sum = sum(r.esfuerzo_sum for r in rows)
+    return {
+        "sesiones": sesiones,
+        "dias_activos": sum(1 for r in rows if r.sesiones),
+        "tiempo_total": sum(r.tiempo_total for r in rows),
+        "reps_total": sum(r.reps_total for r in rows),
+        "esfuerzo_promedio": esfuerzo_sum / sesiones if sesiones else 0,
+        "esfuerzo_max": max((r.esfuerzo_max for r in rows), default=0),
+        "peso_max": max((r.peso_max for r in rows), default=Decimal("0")),
+    }
+
+
+class DailyActivityService:
+    """Servicio para mantener y consultar el rollup diario de actividad"""
+
+    @staticmethod
+    def register_log(log):
+        """Suma un ProgressLog recién creado a la fila de su día"""
+        campos = {
+            "sesiones": F("sesiones") + 1,
+            "tiempo_total": F("tiempo_total") + (log.tiempo_seg or 0),
+            "esfuerzo_sum": F("esfuerzo_sum") + (log.esfuerzo or 0),
+            "esfuerzo_max": Greatest(F("esfuerzo_max"), Value(log.esfuerzo or 0)),
+            "reps_total": F("reps_total") + (log.repeticiones or 0),
+            "peso_max": Greatest(F("peso_max"), Value(log.peso_usado or Decimal("0"))),
+        }
+        filtro = DailyActivity.objects.filter(user_id=log.user_id, fecha=log.fecha)
+        if filtro.update(**campos):
+            return
+        try:
+            with transaction.atomic():
+                DailyActivity.objects.create(
+                    user_id=log.user_id,
+                    fecha=log.fecha,
+                    sesiones=1,
+                    tiempo_total=log.tiempo_seg or 0,
+                    esfuerzo_sum=log.esfuerzo or 0,
+                    esfuerzo_max=log.esfuerzo or 0,
+                    reps_total=log.repeticiones or 0,
+                    peso_max=log.peso_usado or Decimal("0"),
+                )
+        except IntegrityError:
+            # Otra petición creó la fila del día entre el update y el create
+            filtro.update(**campos)
+
+    @staticmethod
+    def refresh_day(user_id, fecha):
+        """Recalcula la fila de un día desde ProgressLog (tras eliminar o editar registros)"""
+        row = next(iter(_day_aggregates(ProgressLog.objects.filter(user_id=user_id, fecha=fecha))), None)
+        if row is None:
+            DailyActivity.objects.filter(user_id=user_id, fecha=fecha).delete()
+            return
+        defaults = {k: row[k] for k in ("sesiones", "tiempo_total", "esfuerzo_sum", "esfuerzo_max", "reps_total")}
+        defaults["peso_max"] = row["peso_max"] or Decimal("0")
+        # update() primero: en un borrado en cascada del usuario no se deben recrear filas
+        if not DailyActivity.objects.filter(user_id=user_id, fecha=fecha).update(**defaults):
+            DailyActivity.objects.create(user_id=user_id, fecha=fecha, **defaults)
+
+    @staticmethod
+    def rebuild(user_ids=None, desde=None, hasta=None, chunk_size=1000):
+        """
+        Reconstruye el rollup desde cero para los usuarios/rango indicados.
+        Devuelve el número de filas creadas.
+        """
+        logs = ProgressLog.objects.all()
+        existentes = DailyActivity.objects.all()
+        if user_ids is not None:
+            logs = logs.filter(user_id__in=user_ids)
+            existentes = existentes.filter(user_id__in=user_ids)
+        if desde is not None:
+            logs = logs.filter(fecha__gte=desde)
+            existentes = existentes.filter(fecha__gte=desde)
+        if hasta is not None:
+            logs = logs.filter(fecha__lte=hasta)
+            existentes = existentes.filter(fecha__lte=hasta)
+
+        total = 0
+        with transaction.atomic():
+            existentes.delete()
+            lote = []
+            for row in _day_aggregates(logs).iterator(chunk_size=chunk_size):
+                row["peso_max"] = row["peso_max"] or Decimal("0")
+                lote.append(DailyActivity(**row))
+                if len(lote) >= chunk_size:
+                    DailyActivity.objects.bulk_create(lote)
+                    total += len(lote)
+                    lote = []
+            if lote:
+                DailyActivity.objects.bulk_create(lote)
+                total += len(lote)
+        return total
+
+    @staticmethod
+    def rows(user, inicio, fin):
+        """Filas diarias del usuario en el rango (como máximo una por día)"""
+        return list(
+            DailyActivity.objects.filter(
+                user_id=getattr(user, "pk", user), fecha__range=(inicio, fin)
+            ).order_by("fecha")
+        )
+
+    @staticmethod
+    def weekly_sessions(user, semanas, hoy):
+        """Sesiones de las últimas `semanas` semanas (lunes a domingo), de la más antigua a la actual"""
+        inicio_actual = hoy - timedelta(days=hoy.weekday())
+        inicio = inicio_actual - timedelta(weeks=semanas - 1)
+        rows = DailyActivityService.rows(user, inicio, inicio_actual + timedelta(days=6))
+        resultado = []
+        for i in range(semanas - 1, -1, -1):
+            semana_inicio = inicio_actual - timedelta(weeks=i)
+            semana_fin = semana_inicio + timedelta(days=6)
+            resultado.append({
+                "inicio": semana_inicio,
+                "fin": semana_fin,
+                "sesiones": sum(r.sesiones for r in rows if semana_inicio <= r.fecha <= semana_fin),
+            })
+        return resultado
@@ -0,0 +1,217 @@
+"""
+Búsqueda para autocompletado de usuarios y entrenadores.
+UserSearchIndex guarda por persona su rol y un texto normalizado (username y nombre
+institucional, en minúsculas y sin tildes). Las coincidencias de subcadena se resuelven con el
+índice de trigramas: LIKE sobre el GIN pg_trgm en PostgreSQL y MATCH sobre la tabla FTS5 en
+SQLite (términos de 3 o más caracteres; los más cortos buscan por prefijo de palabra). Primero
+van los resultados cuyo username empieza por el término, luego los de nombre y después el resto.
+"""
+import unicodedata
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, Count, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from .assignment_service import instructores
+from .institutional_service import InstitutionalService
+from .models import SystemConfig, TestAccount, TrainerAssignment, UserSearchIndex
+
+LIMITE_DEFECTO = 10
+LIMITE_MAXIMO = 25
+MIN_TRIGRAMA = 3
+
+FTS_TABLE = "fit_usersearchindex_fts"
+REFRESH_CACHE_KEY = "fit:search:refresh"
+REFRESH_INTERVAL = 300  # Segundos entre indexaciones de usuarios nuevos
+REFRESH_CHECKPOINT = "search_index:ultimo_usuario"  # Clave de SystemConfig
+BATCH_SIZE = 1000
+
+_fts_disponible = None
+
+
+def normalize(texto):
+    """Minúsculas, sin tildes y con espacios simples"""
+    sin_tildes = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode()
+    return " ".join(sin_tildes.lower().split())
+
+
+def _fts_match(termino):
+    """Frase FTS5 con el término (las comillas se duplican)"""
+    return '"' + termino.replace('"', '""') + '"'
+
+
+class PeopleSearchService:
+    """Servicio de indexación y búsqueda de personas para el autocompletado"""
+
+    @staticmethod
+    def fts_available():
+        """Si existe la tabla FTS5 (SQLite; se comprueba una vez por proceso)"""
+        global _fts_disponible
+        if _fts_disponible is None:
+            try:
+                _fts_disponible = FTS_TABLE in connection.introspection.table_names()
+            except Exception:
+                _fts_disponible = False
+        return _fts_disponible
+
+    @staticmethod
+    def index_users(users):
+        """
+        Crea o actualiza las entradas de `users` con un upsert en bloque. Los que ya no son
+        usuarios estándar ni instructores (p. ej. administradores) salen del índice. Las cuentas
+        de prueba no se indexan; quedan marcadas en TestAccount.
+        """
+        prueba = {u.id for u in users if TestAccount.matches(u.username)}
+        TestAccount.objects.filter(user_id__in=[u.id for u in users]).exclude(user_id__in=prueba).delete()
+        TestAccount.objects.bulk_create([TestAccount(user_id=i) for i in prueba], ignore_conflicts=True)
+        UserSearchIndex.objects.filter(user_id__in=prueba).delete()
+        users = [u for u in users if u.id not in prueba]
+        if not users:
+            return 0
+        ids = [u.id for u in users]
+        entrenadores = set(instructores().filter(id__in=ids).values_list("id", flat=True))
+        info = {}
+        if InstitutionalService.available():
+            info = InstitutionalService.info_many([u.username for u in users])
+        entradas = []
+        for user in users:
+            if user.id in entrenadores:
+                rol = "entrenador"
+            elif not user.is_staff and not user.is_superuser:
+                rol = "usuario"
+            else:
+                continue
+            datos = info.get(user.username, {})
+            nombre = " ".join(
+                filter(None, [datos.get("first_name", user.first_name), datos.get("last_name", user.last_name)])
+            )
+            entradas.append(UserSearchIndex(
+                user_id=user.id,
+                rol=rol,
+                username=user.username,
+                nombre=nombre[:200],
+                texto=normalize(f"{user.username} {nombre}")[:400],
+            ))
+        UserSearchIndex.objects.filter(user_id__in=ids).exclude(
+            user_id__in=[e.user_id for e in entradas]
+        ).delete()
+        UserSearchIndex.objects.bulk_create(
+            entradas,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["rol", "username", "nombre", "texto"],
+            batch_size=500,
+        )
+        return len(entradas)
+
+    @staticmethod
+    def _index_after(ultimo, batch_size=BATCH_SIZE):
+        """Indexa por lotes los usuarios con id mayor que `ultimo` y avanza el checkpoint"""
+        total = 0
+        while True:
+            lote = list(User.objects.filter(id__gt=ultimo).order_by("id")[:batch_size])
+            if not lote:
+                return total
+            total += PeopleSearchService.index_users(lote)
+            ultimo = lote[-1].id
+            SystemConfig.objects.update_or_create(
+                clave=REFRESH_CHECKPOINT,
+                defaults={"valor": str(ultimo), "descripcion": "Último usuario revisado por el índice de búsqueda"},
+            )
+
+    @staticmethod
+    def rebuild(batch_size=BATCH_SIZE):
+        """Reindexa todos los usuarios por lotes (paginando por id). Devuelve las entradas escritas"""
+        InstitutionalService.sync_users(force=True)
+        return PeopleSearchService._index_after(0, batch_size)
+
+    @staticmethod
+    def refresh(force=False):
+        """
+        Indexa los usuarios creados desde la última revisión (p. ej. con bulk_create al
+        sincronizar la BD institucional) y los que la sincronización cambió de rol. Los usuarios
+        ya revisados que no van al índice (administradores) no se vuelven a consultar. Sin
+        `force`, como máximo una vez cada REFRESH_INTERVAL.
+        """
+        if not force and not cache.add(REFRESH_CACHE_KEY, 1, REFRESH_INTERVAL):
+            return 0
+        modificados = InstitutionalService.sync_users(force=force)["modificados"]
+        total = 0
+        for inicio in range(0, len(modificados), BATCH_SIZE):
+            total += PeopleSearchService.index_users(
+                list(User.objects.filter(id__in=modificados[inicio:inicio + BATCH_SIZE]))
+            )
+        ultimo = SystemConfig.objects.filter(clave=REFRESH_CHECKPOINT).values_list("valor", flat=True).first()
+        return total + PeopleSearchService._index_after(int(ultimo or 0))
+
+    @staticmethod
+    def matching(termino, rol=None):
+        """
+        Entradas (de un rol o de ambos) cuyo texto contiene el término, resuelto con el índice
+        de trigramas. Para usar como subconsulta: `.values("user_id")`.
+        """
+        termino = normalize(termino)
+        queryset = UserSearchIndex.objects.all()
+        if rol:
+            queryset = queryset.filter(rol=rol)
+        if len(termino) < MIN_TRIGRAMA:
+            # Los trigramas necesitan 3 caracteres: términos cortos por prefijo de palabra
+            return queryset.filter(Q(texto__startswith=termino) | Q(texto__contains=f" {termino}"))
+        if connection.vendor == "sqlite" and PeopleSearchService.fts_available():
+            return queryset.filter(
+                user_id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_fts_match(termino)])
+            )
+        # En PostgreSQL LIKE '%término%' usa el índice GIN gin_trgm_ops
+        return queryset.filter(texto__contains=termino)
+
+    @staticmethod
+    def search(termino, rol, limit=LIMITE_DEFECTO):
+        """
+        Entradas del rol que coinciden con el término, ordenadas por relevancia. Los usuarios
+        traen `entrenador_actual` y los entrenadores `asignados` (asignaciones activas).
+        """
+        termino = normalize(termino)
+        if not termino:
+            return []
+        queryset = PeopleSearchService.matching(termino, rol).annotate(
+            relevancia=Case(
+                When(texto__startswith=termino, then=Value(0)),
+                When(texto__contains=f" {termino}", then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            )
+        )
+        activas = TrainerAssignment.objects.filter(activo=True)
+        if rol == "usuario":
+            queryset = queryset.annotate(
+                entrenador_actual=Subquery(
+                    activas.filter(user_id=OuterRef("user_id")).order_by("-id").values("trainer__username")[:1]
+                )
+            )
+        else:
+            queryset = queryset.annotate(
+                asignados=Coalesce(
+                    Subquery(
+                        activas.filter(trainer_id=OuterRef("user_id"))
+                        .order_by()
+                        .values("trainer_id")
+                        .annotate(n=Count("id"))
+                        .values("n")[:1]
+                    ),
+                    0,
+                    output_field=IntegerField(),
+                )
+            )
+        return list(queryset.order_by("relevancia", "username")[:limit])
+
+    @staticmethod
+    def serialize(entrada):
+        datos = {"id": entrada.user_id, "username": entrada.username, "nombre": entrada.nombre}
+        if entrada.rol == "usuario":
+            datos["entrenador_actual"] = entrada.entrenador_actual
+        else:
+            datos["asignados"] = entrada.asignados
+        return datos
@@ -2,41 +2,194 @@
 """
 Señales Django para actualización automática de estadísticas
 """
-from datetime import date
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.contrib.auth.models import User
 from django.dispatch import receiver
 
-from .models import Routine, ProgressLog, TrainerAssignment, TrainerRecommendation
-from .views import update_user_stats, update_trainer_stats
+from .models import Exercise, Message, Routine, RoutineItem, ProgressLog, SystemConfig, TrainerAssignment, TrainerRecommendation
+from .activity_feed import ActivityFeedService
+from .composition_service import RoutineCompositionService
+from .config_service import ConfigService
+from .moderation_service import ModerationService, is_reviewable
+from .report_cache import ReportCache
+from .report_snapshots import ReportSnapshotService
+from .search_service import PeopleSearchService
+from .rollup_service import DailyActivityService
+from .stats_service import StatsDispatcher
+from .streak_service import StreakService
+
+
+def _invalidar_reportes(user_id, fecha=None):
+    """Invalida el cache y los snapshots de reportes del periodo afectado"""
+    ReportCache.invalidate(user_id, fecha)
+    ReportSnapshotService.invalidate(user_id, fecha)
 
 
 @receiver(post_save, sender=Routine)
 def routine_saved(sender, instance, created, **kwargs):
     """Actualiza estadísticas cuando se crea una rutina"""
     if created:
-        hoy = date.today()
-        update_user_stats(instance.user, hoy.year, hoy.month)
+        StatsDispatcher.user(instance.user_id, instance.fecha_creacion, "rutinas_iniciadas", 1)
+        if not instance.es_predisenada:
+            if getattr(instance, "_preset_origen", None):
+                ActivityFeedService.record(
+                    instance.user_id, "preset_adoptado", instance.id,
+                    f"Adoptó la rutina {instance._preset_origen.nombre}",
+                )
+            else:
+                ActivityFeedService.record(instance.user_id, "rutina", instance.id, f"Creó la rutina {instance.nombre}")
+    if ConfigService.get("moderacion_contenido_activa") and is_reviewable("routine", instance):
+        ModerationService.enqueue("routine", instance.id)
+    _invalidar_reportes(instance.user_id)
+
+
+@receiver(post_delete, sender=Routine)
+def routine_deleted(sender, instance, **kwargs):
+    """Descuenta la rutina de su mes e invalida los reportes del periodo actual"""
+    StatsDispatcher.user(instance.user_id, instance.fecha_creacion, "rutinas_iniciadas", -1)
+    ModerationService.discard("routine", instance.id)
+    _invalidar_reportes(instance.user_id)
+
+
+@receiver(pre_save, sender=ProgressLog)
+def progress_pre_save(sender, instance, **kwargs):
+    """Recuerda la fecha anterior de un registro editado para invalidar su mes"""
+    if instance.pk:
+        instance._fecha_anterior = (
+            ProgressLog.objects.filter(pk=instance.pk).values_list("fecha", flat=True).first()
+        )
 
 
 @receiver(post_save, sender=ProgressLog)
 def progress_saved(sender, instance, created, **kwargs):
     """Actualiza estadísticas cuando se registra progreso"""
+    _invalidar_reportes(instance.user_id, instance.fecha)
+    fecha_anterior = getattr(instance, "_fecha_anterior", None)
+    if fecha_anterior and fecha_anterior != instance.fecha:
+        _invalidar_reportes(instance.user_id, fecha_anterior)
     if created:
-        update_user_stats(instance.user, instance.fecha.year, instance.fecha.month)
+        DailyActivityService.register_log(instance)
+        StatsDispatcher.user(instance.user_id, instance.fecha, "seguimientos_registrados", 1)
+        StreakService.register_log(instance)
+        ActivityFeedService.record(
+            instance.user_id, "progreso", instance.id, f"Registró progreso en {instance.routine.nombre}"
+        )
+        return
+    if fecha_anterior and (fecha_anterior.year, fecha_anterior.month) != (instance.fecha.year, instance.fecha.month):
+        # El registro cambió de mes: moverlo entre los contadores
+        StatsDispatcher.user(instance.user_id, fecha_anterior, "seguimientos_registrados", -1)
+        StatsDispatcher.user(instance.user_id, instance.fecha, "seguimientos_registrados", 1)
+    # Registro editado: recalcular el día (o los dos días si cambió la fecha)
+    DailyActivityService.refresh_day(instance.user_id, instance.fecha)
+    if fecha_anterior and fecha_anterior != instance.fecha:
+        DailyActivityService.refresh_day(instance.user_id, fecha_anterior)
+    if fecha_anterior != instance.fecha:
+        # Cambió la fecha: recalcular la racha desde cero
+        StreakService.recompute(instance.user)
+
+
+@receiver(post_delete, sender=ProgressLog)
+def progress_deleted(sender, instance, **kwargs):
+    """Actualiza la racha y los reportes cuando se elimina un registro de progreso"""
+    _invalidar_reportes(instance.user_id, instance.fecha)
+    StatsDispatcher.user(instance.user_id, instance.fecha, "seguimientos_registrados", -1)
+    DailyActivityService.refresh_day(instance.user_id, instance.fecha)
+    StreakService.unregister_log(instance)
+
+
+@receiver(post_save, sender=RoutineItem)
+@receiver(post_delete, sender=RoutineItem)
+def routine_item_changed(sender, instance, **kwargs):
+    """Recalcula la composición por tipo de la rutina cuando cambian sus ítems"""
+    RoutineCompositionService.rebuild(instance.routine_id)
+    user_id = Routine.objects.filter(pk=instance.routine_id).values_list("user_id", flat=True).first()
+    if user_id:
+        _invalidar_reportes(user_id)
+
+
+@receiver(post_save, sender=Exercise)
+def exercise_saved(sender, instance, created, **kwargs):
+    """Si se edita un ejercicio (p. ej. su tipo) se recalculan las rutinas que lo usan"""
+    if not created:
+        RoutineCompositionService.rebuild_for_exercise(instance.id)
+    if ConfigService.get("moderacion_contenido_activa") and is_reviewable("exercise", instance):
+        ModerationService.enqueue("exercise", instance.id)
+
+
+@receiver(post_delete, sender=Exercise)
+def exercise_deleted(sender, instance, **kwargs):
+    """Un ejercicio eliminado sale de la cola de moderación"""
+    ModerationService.discard("exercise", instance.id)
 
 
 @receiver(post_save, sender=TrainerAssignment)
 def assignment_saved(sender, instance, created, **kwargs):
     """Actualiza estadísticas cuando se asigna un entrenador"""
     if created:
-        hoy = date.today()
-        update_trainer_stats(instance.trainer, hoy.year, hoy.month)
+        StatsDispatcher.trainer(instance.trainer_id, instance.fecha_asignacion, "asignaciones_nuevas", 1)
+
+
+@receiver(post_delete, sender=TrainerAssignment)
+def assignment_deleted(sender, instance, **kwargs):
+    """Descuenta la asignación eliminada de su mes"""
+    StatsDispatcher.trainer(instance.trainer_id, instance.fecha_asignacion, "asignaciones_nuevas", -1)
 
 
 @receiver(post_save, sender=TrainerRecommendation)
 def recommendation_saved(sender, instance, created, **kwargs):
     """Actualiza estadísticas cuando un entrenador da una recomendación"""
     if created:
-        hoy = date.today()
-        update_trainer_stats(instance.trainer, hoy.year, hoy.month)
+        StatsDispatcher.trainer(instance.trainer_id, instance.fecha, "seguimientos_realizados", 1)
+
+
+@receiver(post_delete, sender=TrainerRecommendation)
+def recommendation_deleted(sender, instance, **kwargs):
+    """Descuenta la recomendación eliminada de su mes"""
+    StatsDispatcher.trainer(instance.trainer_id, instance.fecha, "seguimientos_realizados", -1)
+
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, created, **kwargs):
+    """Registra el mensaje en el feed de actividad (visible solo para su destinatario)"""
+    if created:
+        ActivityFeedService.record(
+            instance.remitente_id, "mensaje", instance.id,
+            f"Envió un mensaje: {instance.asunto}", destinatario_id=instance.destinatario_id,
+        )
+
+
+# Campos de User de los que depende su entrada de búsqueda (texto y rol)
+CAMPOS_BUSQUEDA = ("username", "first_name", "last_name", "is_staff", "is_superuser", "is_active")
+
+
+def _valores_busqueda(user):
+    return tuple(getattr(user, campo) for campo in CAMPOS_BUSQUEDA)
+
+
+@receiver(pre_save, sender=User)
+def user_pre_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Recuerda los campos indexados de un usuario existente para reindexar solo si cambian"""
+    if raw or not instance.pk or (update_fields and not set(update_fields) & set(CAMPOS_BUSQUEDA)):
+        instance._busqueda_anterior = None
+        return
+    instance._busqueda_anterior = User.objects.filter(pk=instance.pk).values_list(*CAMPOS_BUSQUEDA).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Mantiene al día la entrada de búsqueda del usuario cuando cambia algún campo indexado"""
+    if raw:
+        return
+    if not created:
+        anterior = getattr(instance, "_busqueda_anterior", None)
+        if anterior is None or anterior == _valores_busqueda(instance):
+            return
+    PeopleSearchService.index_users([instance])
+
 
+@receiver(post_save, sender=SystemConfig)
+@receiver(post_delete, sender=SystemConfig)
+def system_config_changed(sender, instance, **kwargs):
+    """Invalida el registro de configuración del proceso si cambia una clave declarada"""
+    if ConfigService.is_declared(instance.clave):
+        ConfigService.invalidate()
@@ -0,0 +1,329 @@
+"""
+Contadores mensuales de estadísticas (UserMonthlyStats / TrainerMonthlyStats).
+Cada alta suma 1 con un único INSERT ... ON CONFLICT DO UPDATE (PostgreSQL y SQLite) y cada
+baja resta 1 con un UPDATE, en lugar de recontar todas las filas del mes en cada escritura.
+
+Dentro de StatsDispatcher.coalesce() (operaciones de muchas filas) solo se marcan las claves
+(usuario|entrenador, año, mes) afectadas y se recalculan una vez cada una al confirmar la
+transacción (transaction.on_commit). Con STATS_DISPATCH_ASYNC=True el recálculo se hace en
+un hilo en segundo plano.
+
+StatsRecalculator reconstruye los contadores de todos los usuarios en un rango de meses con
+una consulta GROUP BY (dueño, mes) por contador y upserts masivos (comando recalc_stats).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Count, DateTimeField, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import ProgressLog, Routine, TrainerAssignment, TrainerMonthlyStats, TrainerRecommendation, UserMonthlyStats
+from .timeseries import shift_months
+
+logger = logging.getLogger(__name__)
+
+CONTADORES_USUARIO = ("rutinas_iniciadas", "seguimientos_registrados")
+CONTADORES_ENTRENADOR = ("asignaciones_nuevas", "seguimientos_realizados")
+
+
+def periodo(valor):
+    """(año, mes) de una fecha o fecha/hora (en la zona horaria local, como los filtros __year/__month)"""
+    if isinstance(valor, datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        valor = valor.date()
+    return valor.year, valor.month
+
+
+def _upsert_increment(model, owner_field, contadores, owner_id, valor, campo, delta):
+    """Suma `delta` al contador creando la fila del mes si no existe, en una sentencia"""
+    anio, mes = periodo(valor)
+    qn = connection.ops.quote_name
+    tabla = qn(model._meta.db_table)
+    owner_col = qn(model._meta.get_field(owner_field).column)
+    columnas = ", ".join(qn(c) for c in contadores)
+    valores = [delta if c == campo else 0 for c in contadores]
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO {tabla} ({owner_col}, {qn('anio')}, {qn('mes')}, {columnas})
+            VALUES (%s, %s, %s, {", ".join(["%s"] * len(contadores))})
+            ON CONFLICT ({owner_col}, {qn('anio')}, {qn('mes')})
+            DO UPDATE SET {qn(campo)} = {tabla}.{qn(campo)} + EXCLUDED.{qn(campo)}
+            """,
+            [owner_id, anio, mes, *valores],
+        )
+
+
+def _decrement(model, owner_field, owner_id, valor, campo):
+    """Resta 1 al contador sin bajar de 0 ni crear filas (seguro en borrados en cascada)"""
+    anio, mes = periodo(valor)
+    model.objects.filter(
+        **{f"{owner_field}_id": owner_id, "anio": anio, "mes": mes, f"{campo}__gt": 0}
+    ).update(**{campo: F(campo) - 1})
+
+
+class MonthlyStatsService:
+    """Servicio de contadores mensuales incrementales"""
+
+    @staticmethod
+    def increment_user(user_id, fecha, campo):
+        _upsert_increment(UserMonthlyStats, "user", CONTADORES_USUARIO, user_id, fecha, campo, 1)
+
+    @staticmethod
+    def decrement_user(user_id, fecha, campo):
+        _decrement(UserMonthlyStats, "user", user_id, fecha, campo)
+
+    @staticmethod
+    def increment_trainer(trainer_id, fecha, campo):
+        _upsert_increment(TrainerMonthlyStats, "trainer", CONTADORES_ENTRENADOR, trainer_id, fecha, campo, 1)
+
+    @staticmethod
+    def decrement_trainer(trainer_id, fecha, campo):
+        _decrement(TrainerMonthlyStats, "trainer", trainer_id, fecha, campo)
+
+    @staticmethod
+    def recount_user(user_id, anio, mes):
+        """Recalcula desde cero los contadores de un usuario en un mes"""
+        valores = {
+            "rutinas_iniciadas": Routine.objects.filter(
+                user_id=user_id, fecha_creacion__year=anio, fecha_creacion__month=mes
+            ).count(),
+            "seguimientos_registrados": ProgressLog.objects.filter(
+                user_id=user_id, fecha__year=anio, fecha__month=mes
+            ).count(),
+        }
+        _store(UserMonthlyStats, "user", user_id, anio, mes, valores)
+
+    @staticmethod
+    def recount_trainer(trainer_id, anio, mes):
+        """Recalcula desde cero los contadores de un entrenador en un mes"""
+        valores = {
+            "asignaciones_nuevas": TrainerAssignment.objects.filter(
+                trainer_id=trainer_id, fecha_asignacion__year=anio, fecha_asignacion__month=mes
+            ).count(),
+            "seguimientos_realizados": TrainerRecommendation.objects.filter(
+                trainer_id=trainer_id, fecha__year=anio, fecha__month=mes
+            ).count(),
+        }
+        _store(TrainerMonthlyStats, "trainer", trainer_id, anio, mes, valores)
+
+
+def _store(model, owner_field, owner_id, anio, mes, valores):
+    filtro = model.objects.filter(**{f"{owner_field}_id": owner_id, "anio": anio, "mes": mes})
+    if not any(valores.values()):
+        # Sin actividad: no crear filas (el dueño puede haberse eliminado en la misma transacción)
+        filtro.update(**valores)
+        return
+    model.objects.update_or_create(
+        **{f"{owner_field}_id": owner_id, "anio": anio, "mes": mes}, defaults=valores
+    )
+
+
+# ------------------------- Recálculo masivo -------------------------
+# (modelo de estadísticas, campo dueño, contadores, [(contador, modelo origen, campo dueño, campo fecha)])
+FUENTES = {
+    "user": (UserMonthlyStats, "user", CONTADORES_USUARIO, [
+        ("rutinas_iniciadas", Routine, "user", "fecha_creacion"),
+        ("seguimientos_registrados", ProgressLog, "user", "fecha"),
+    ]),
+    "trainer": (TrainerMonthlyStats, "trainer", CONTADORES_ENTRENADOR, [
+        ("asignaciones_nuevas", TrainerAssignment, "trainer", "fecha_asignacion"),
+        ("seguimientos_realizados", TrainerRecommendation, "trainer", "fecha"),
+    ]),
+}
+
+
+def _rango_filtro(model, campo, inicio, fin):
+    """Filtro por rango [inicio, fin) indexable (límites con zona horaria en campos fecha/hora)"""
+    if isinstance(model._meta.get_field(campo), DateTimeField):
+        inicio = timezone.make_aware(datetime.combine(inicio, time.min))
+        fin = timezone.make_aware(datetime.combine(fin, time.min))
+    return {f"{campo}__gte": inicio, f"{campo}__lt": fin}
+
+
+def _conteos(model, owner_field, campo_fecha, inicio, fin):
+    """Una consulta GROUP BY (dueño, mes): {(dueño, año, mes): n}"""
+    filas = (
+        model.objects.filter(**_rango_filtro(model, campo_fecha, inicio, fin))
+        .annotate(periodo_mes=TruncMonth(campo_fecha))
+        .order_by()
+        .values_list(f"{owner_field}_id", "periodo_mes")
+        .annotate(n=Count("id"))
+    )
+    return {(owner_id, *periodo(mes)): n for owner_id, mes, n in filas}
+
+
+def _actuales(model, owner_field, contadores, inicio, fin):
+    """Filas existentes del rango de meses: {(dueño, año, mes): {contador: valor}}"""
+    desde = inicio.year * 12 + inicio.month
+    hasta = fin.year * 12 + fin.month  # fin es exclusivo (primer día del mes siguiente)
+    filas = (
+        model.objects.annotate(periodo_num=F("anio") * 12 + F("mes"))
+        .filter(periodo_num__gte=desde, periodo_num__lt=hasta)
+        .values_list(f"{owner_field}_id", "anio", "mes", *contadores)
+    )
+    return {(fila[0], fila[1], fila[2]): dict(zip(contadores, fila[3:])) for fila in filas}
+
+
+class StatsRecalculator:
+    """Reconstrucción de UserMonthlyStats/TrainerMonthlyStats para todos los usuarios de un rango"""
+
+    @staticmethod
+    def diff(desde, hasta, tipos=("user", "trainer")):
+        """
+        Compara los contadores guardados con los recuentos reales de los meses entre `desde` y
+        `hasta` (inclusive). Un GROUP BY por contador más una lectura por tabla de estadísticas.
+        Devuelve {tipo: [(dueño, año, mes, antes, despues)]} solo con las filas distintas.
+        """
+        inicio = desde.replace(day=1)
+        fin = shift_months(hasta, 1)
+        cambios = {}
+        for tipo in tipos:
+            model, owner_field, contadores, fuentes = FUENTES[tipo]
+            reales = {}
+            for contador, origen, origen_owner, campo_fecha in fuentes:
+                for clave, n in _conteos(origen, origen_owner, campo_fecha, inicio, fin).items():
+                    reales.setdefault(clave, dict.fromkeys(contadores, 0))[contador] = n
+            actuales = _actuales(model, owner_field, contadores, inicio, fin)
+            cero = dict.fromkeys(contadores, 0)
+            cambios[tipo] = [
+                (*clave, actuales.get(clave), reales.get(clave, cero))
+                for clave in sorted(set(reales) | set(actuales))
+                if actuales.get(clave, cero) != reales.get(clave, cero)
+            ]
+        return cambios
+
+    @staticmethod
+    def apply(cambios, chunk_size=1000):
+        """Escribe las diferencias con upserts masivos por bloques. Devuelve el número de filas"""
+        total = 0
+        for tipo, filas in cambios.items():
+            model, owner_field, contadores, _ = FUENTES[tipo]
+            objetos = [
+                model(**{f"{owner_field}_id": owner_id, "anio": anio, "mes": mes}, **despues)
+                for owner_id, anio, mes, _, despues in filas
+            ]
+            for i in range(0, len(objetos), chunk_size):
+                with transaction.atomic():
+                    model.objects.bulk_create(
+                        objetos[i:i + chunk_size],
+                        update_conflicts=True,
+                        unique_fields=[owner_field, "anio", "mes"],
+                        update_fields=list(contadores),
+                    )
+            total += len(objetos)
+        return total
+
+    @staticmethod
+    def recalculate(desde, hasta, tipos=("user", "trainer"), dry_run=False, chunk_size=1000):
+        """Calcula y (salvo dry_run) aplica las diferencias. Devuelve el diff"""
+        cambios = StatsRecalculator.diff(desde, hasta, tipos)
+        if not dry_run:
+            StatsRecalculator.apply(cambios, chunk_size)
+        return cambios
+
+
+# ------------------------- Despacho por transacción -------------------------
+_ambito = threading.local()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pila():
+    if not hasattr(_ambito, "pila"):
+        _ambito.pila = []
+    return _ambito.pila
+
+
+def _recount(claves):
+    for tipo, owner_id, anio, mes in sorted(claves):
+        try:
+            if tipo == "user":
+                MonthlyStatsService.recount_user(owner_id, anio, mes)
+            else:
+                MonthlyStatsService.recount_trainer(owner_id, anio, mes)
+        except Exception as e:
+            logger.error(f"Error recalculando estadísticas {tipo} {owner_id} {anio}-{mes}: {e}")
+
+
+def _recount_background(claves):
+    try:
+        _recount(claves)
+    finally:
+        # Conexiones propias del hilo de fondo
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stats-dispatch")
+        return _executor
+
+
+class StatsDispatcher:
+    """Punto de entrada de las señales para actualizar estadísticas mensuales"""
+
+    @staticmethod
+    def user(user_id, fecha, campo, delta):
+        StatsDispatcher._record("user", user_id, fecha, campo, delta)
+
+    @staticmethod
+    def trainer(trainer_id, fecha, campo, delta):
+        StatsDispatcher._record("trainer", trainer_id, fecha, campo, delta)
+
+    @staticmethod
+    def _record(tipo, owner_id, fecha, campo, delta):
+        pila = _pila()
+        if pila:
+            # Dentro de coalesce(): solo se marca la clave
+            anio, mes = periodo(fecha)
+            pila[-1].add((tipo, owner_id, anio, mes))
+            return
+        # Escritura individual: una sola sentencia incremental
+        if tipo == "user":
+            accion = MonthlyStatsService.increment_user if delta > 0 else MonthlyStatsService.decrement_user
+        else:
+            accion = MonthlyStatsService.increment_trainer if delta > 0 else MonthlyStatsService.decrement_trainer
+        accion(owner_id, fecha, campo)
+
+    @staticmethod
+    @contextmanager
+    def coalesce():
+        """
+        Transacción en la que las estadísticas afectadas se acumulan como claves
+        (usuario|entrenador, año, mes) y se recalculan una vez cada una al confirmar.
+        Si la transacción se revierte, las claves se descartan.
+
+            with StatsDispatcher.coalesce():
+                for item in preset.items.all(): ...
+        """
+        pila = _pila()
+        claves = set()
+        pila.append(claves)
+        try:
+            with transaction.atomic():
+                yield
+        finally:
+            pila.pop()
+        # Solo se llega aquí si el bloque terminó sin excepción
+        if pila:
+            pila[-1].update(claves)
+        elif claves:
+            transaction.on_commit(lambda: StatsDispatcher.flush(claves))
+
+    @staticmethod
+    def flush(claves):
+        """Recalcula una vez cada clave, en este hilo o en el hilo de fondo"""
+        if getattr(settings, "STATS_DISPATCH_ASYNC", False):
+            _get_executor().submit(_recount_background, set(claves))
+        else:
+            _recount(claves)
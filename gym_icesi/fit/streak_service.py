@@ -0,0 +1,126 @@
+"""
+Motor de rachas de entrenamiento.
+Mantiene racha actual, racha máxima y último día activo por usuario en UserStreak,
+actualizándolos incrementalmente cuando se crea o elimina un ProgressLog.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+
+from .models import ProgressLog, UserStreak
+
+
+def compute_streaks(fechas):
+    """
+    Calcula (racha_actual, racha_maxima, ultima_fecha) a partir de fechas
+    distintas ordenadas ascendentemente. La racha actual es la que termina en ultima_fecha.
+    """
+    racha_actual = 0
+    racha_maxima = 0
+    ultima_fecha = None
+    for fecha in fechas:
+        if ultima_fecha is not None and fecha == ultima_fecha + timedelta(days=1):
+            racha_actual += 1
+        else:
+            racha_actual = 1
+        racha_maxima = max(racha_maxima, racha_actual)
+        ultima_fecha = fecha
+    return racha_actual, racha_maxima, ultima_fecha
+
+
+class StreakService:
+    """Servicio para consultar y mantener las rachas de los usuarios"""
+
+    @staticmethod
+    def _distinct_dates(user, hasta=None):
+        """Una sola consulta: fechas distintas con actividad, ordenadas"""
+        qs = ProgressLog.objects.filter(user_id=getattr(user, "pk", user))
+        if hasta is not None:
+            qs = qs.filter(fecha__lte=hasta)
+        return qs.order_by("fecha").values_list("fecha", flat=True).distinct()
+
+    @staticmethod
+    def recompute(user):
+        """Recalcula la racha desde cero con una consulta de fechas distintas"""
+        racha_actual, racha_maxima, ultima_fecha = compute_streaks(
+            StreakService._distinct_dates(user)
+        )
+        streak, _ = UserStreak.objects.update_or_create(
+            user=user,
+            defaults={
+                "racha_actual": racha_actual,
+                "racha_maxima": racha_maxima,
+                "ultima_fecha": ultima_fecha,
+            },
+        )
+        return streak
+
+    @staticmethod
+    def get(user):
+        """Obtiene la racha del usuario, calculándola la primera vez"""
+        streak = UserStreak.objects.filter(user=user).first()
+        if streak is None:
+            streak = StreakService.recompute(user)
+        return streak
+
+    @staticmethod
+    def current_streak(user, hoy, streak=None):
+        """
+        Días consecutivos entrenando contando desde `hoy` hacia atrás
+        (0 si no hay actividad en `hoy`). Acepta el UserStreak ya cargado.
+        """
+        if streak is None:
+            streak = StreakService.get(user)
+        if streak.ultima_fecha is None or streak.ultima_fecha < hoy:
+            return 0
+        if streak.ultima_fecha == hoy:
+            return streak.racha_actual
+        # Hay registros con fecha futura: calcular la racha que termina en hoy
+        racha_actual, _, ultima_fecha = compute_streaks(
+            StreakService._distinct_dates(user, hasta=hoy)
+        )
+        return racha_actual if ultima_fecha == hoy else 0
+
+    @staticmethod
+    def register_log(log):
+        """Actualiza la racha tras crear un ProgressLog"""
+        with transaction.atomic():
+            streak = UserStreak.objects.select_for_update().filter(user_id=log.user_id).first()
+            if streak is None:
+                return StreakService.recompute(log.user)
+
+            fecha = log.fecha
+            ultima = streak.ultima_fecha
+            if ultima is not None and fecha <= ultima:
+                if ProgressLog.objects.filter(user_id=log.user_id, fecha=fecha).exclude(pk=log.pk).exists():
+                    # El día ya estaba contado
+                    return streak
+                # Registro retroactivo: puede unir rachas, recalcular
+                return StreakService.recompute(log.user)
+
+            if ultima is not None and fecha == ultima + timedelta(days=1):
+                streak.racha_actual += 1
+            else:
+                streak.racha_actual = 1
+            streak.racha_maxima = max(streak.racha_maxima, streak.racha_actual)
+            streak.ultima_fecha = fecha
+            streak.save(update_fields=["racha_actual", "racha_maxima", "ultima_fecha", "fecha_actualizacion"])
+            return streak
+
+    @staticmethod
+    def unregister_log(log):
+        """Actualiza la racha tras eliminar un ProgressLog"""
+        if ProgressLog.objects.filter(user_id=log.user_id, fecha=log.fecha).exists():
+            # Aún quedan registros ese día, la racha no cambia
+            return None
+        racha_actual, racha_maxima, ultima_fecha = compute_streaks(
+            StreakService._distinct_dates(log.user_id)
+        )
+        # update() en lugar de update_or_create: si el usuario se está eliminando en
+        # cascada no se debe volver a crear su racha
+        UserStreak.objects.filter(user_id=log.user_id).update(
+            racha_actual=racha_actual,
+            racha_maxima=racha_maxima,
+            ultima_fecha=ultima_fecha,
+        )
+        return None
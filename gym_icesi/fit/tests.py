@@ -13,6 +13,14 @@ from fit.models import (
 from fit.institutional_models import InstitutionalUser
 
 
+def consultas_sin_cache(contexto):
+    """SQL capturado sin las consultas del cache compartido (DatabaseCache y sus savepoints)"""
+    return [
+        q['sql'] for q in contexto.captured_queries
+        if 'fit_cache' not in q['sql'] and 'SAVEPOINT' not in q['sql']
+    ]
+
+
 class AuthenticationTests(TestCase):
     """Tests de autenticación institucional"""
     
@@ -424,3 +432,1761 @@ class IntegrationTests(TestCase):
         self.assertTrue(Routine.objects.filter(nombre='Workflow Routine').exists())
         self.assertTrue(RoutineItem.objects.filter(routine=routine).exists())
         self.assertTrue(ProgressLog.objects.filter(user=self.user).exists())
+
+
+class StreakTests(TestCase):
+    """Tests del motor de rachas"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.routine = Routine.objects.create(nombre='Test Routine', user=self.user)
+        self.hoy = date.today()
+    
+    def _log(self, dias_atras):
+        return ProgressLog.objects.create(
+            user=self.user,
+            routine=self.routine,
+            fecha=self.hoy - timedelta(days=dias_atras),
+            esfuerzo=5
+        )
+    
+    def test_compute_streaks(self):
+        """Verifica el cálculo desde cero a partir de fechas ordenadas"""
+        from fit.streak_service import compute_streaks
+        d = self.hoy
+        fechas = [d - timedelta(days=9), d - timedelta(days=8), d - timedelta(days=7), d - timedelta(days=1), d]
+        self.assertEqual(compute_streaks(fechas), (2, 3, d))
+        self.assertEqual(compute_streaks([]), (0, 0, None))
+    
+    def test_incremental_matches_recompute(self):
+        """Verifica que la racha incremental coincide con el recálculo"""
+        from fit.streak_service import StreakService
+        for dias in [5, 4, 2, 1, 0, 0, 3]:
+            self._log(dias)
+        streak = StreakService.get(self.user)
+        self.assertEqual((streak.racha_actual, streak.racha_maxima), (6, 6))
+        self.assertEqual(StreakService.current_streak(self.user, self.hoy), 6)
+        recalculada = StreakService.recompute(self.user)
+        self.assertEqual((recalculada.racha_actual, recalculada.racha_maxima), (6, 6))
+    
+    def test_delete_breaks_streak(self):
+        """Verifica que eliminar el único registro de un día rompe la racha"""
+        from fit.streak_service import StreakService
+        for dias in [3, 2, 1, 0]:
+            self._log(dias)
+        ProgressLog.objects.filter(user=self.user, fecha=self.hoy - timedelta(days=1)).delete()
+        streak = StreakService.get(self.user)
+        self.assertEqual((streak.racha_actual, streak.racha_maxima), (1, 2))
+    
+    def test_no_activity_today(self):
+        """Sin actividad hoy la racha actual es 0"""
+        from fit.streak_service import StreakService
+        self._log(2)
+        self._log(1)
+        self.assertEqual(StreakService.current_streak(self.user, self.hoy), 0)
+    
+    def test_streak_report_queries_bounded(self):
+        """El reporte de logros no hace una consulta por día de racha"""
+        for dias in range(60):
+            self._log(dias)
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('report_achievements'))
+        self.assertEqual(len(consultas_sin_cache(consultas)), 8)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['dias_consecutivos'], 60)
+
+
+class RoutineCompositionTests(TestCase):
+    """Tests de la composición precalculada de rutinas por tipo"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.routine = Routine.objects.create(nombre='Mixta', user=self.user)
+        self.cardio = Exercise.objects.create(nombre='Trote', tipo='cardio', duracion_min=10)
+        self.fuerza = Exercise.objects.create(nombre='Sentadilla', tipo='fuerza', duracion_min=5)
+        RoutineItem.objects.create(routine=self.routine, exercise=self.cardio, orden=1)
+        RoutineItem.objects.create(routine=self.routine, exercise=self.fuerza, orden=2, tiempo_seg=120)
+        RoutineItem.objects.create(routine=self.routine, exercise=self.fuerza, orden=3, tiempo_seg=60)
+    
+    def test_composition_maintained(self):
+        """Verifica peso y duración por tipo tras agregar y eliminar ítems"""
+        from fit.models import RoutineComposition
+        comp = {c.tipo: c for c in RoutineComposition.objects.filter(routine=self.routine)}
+        self.assertEqual(comp['fuerza'].items, 2)
+        self.assertAlmostEqual(comp['fuerza'].peso, 2 / 3)
+        self.assertEqual(comp['fuerza'].duracion_seg, 180)
+        self.assertEqual(comp['cardio'].duracion_seg, 600)
+        
+        RoutineItem.objects.filter(exercise=self.cardio).delete()
+        comp = {c.tipo: c for c in RoutineComposition.objects.filter(routine=self.routine)}
+        self.assertEqual(list(comp), ['fuerza'])
+        self.assertAlmostEqual(comp['fuerza'].peso, 1.0)
+    
+    def test_type_distribution(self):
+        """Verifica la distribución por tipo en una sola consulta"""
+        from fit.composition_service import RoutineCompositionService
+        for _ in range(2):
+            ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=date.today(), tiempo_seg=300)
+        with self.assertNumQueries(1):
+            dist = RoutineCompositionService.type_distribution(ProgressLog.objects.filter(user=self.user))
+        self.assertEqual(dist['cardio']['sesiones'], 2)
+        self.assertEqual(dist['fuerza']['sesiones'], 2)
+        self.assertAlmostEqual(dist['cardio']['tiempo'] + dist['fuerza']['tiempo'], 600)
+
+    def test_load_balance_no_fan_out(self):
+        """El volumen se reparte por peso y no se multiplica por la cantidad de ítems"""
+        from fit.composition_service import RoutineCompositionService
+        for _ in range(3):
+            ProgressLog.objects.create(
+                user=self.user, routine=self.routine, fecha=date.today(), repeticiones=30, tiempo_seg=600
+            )
+        with self.assertNumQueries(1):
+            balance = RoutineCompositionService.load_balance(ProgressLog.objects.filter(user=self.user))
+        por_tipo = {row['tipo']: row for row in balance}
+        self.assertEqual(por_tipo['cardio']['total_reps'], 30)
+        self.assertEqual(por_tipo['fuerza']['total_reps'], 60)
+        self.assertEqual(sum(row['total_tiempo'] for row in balance), 1800)
+        self.assertEqual(sum(row['sesiones'] for row in balance), 3)
+
+
+class ReportCacheTests(TestCase):
+    """Tests del cache de reportes"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        from fit import report_cache
+        cache.clear()
+        report_cache._pendientes.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.routine = Routine.objects.create(nombre='Test Routine', user=self.user)
+        self.client.force_login(self.user)
+        hoy = date.today()
+        self.pasado = date(hoy.year - 1, hoy.month, 10)
+        ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=self.pasado, esfuerzo=6)
+    
+    def _url(self):
+        return reverse('report_progress') + f'?year={self.pasado.year}&month={self.pasado.month}'
+    
+    def test_closed_month_served_from_cache(self):
+        """Un mes cerrado se calcula una vez y luego se sirve desde cache"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from fit.report_cache import ReportCache
+        response = self.client.get(self._url())
+        self.assertEqual(response.context['total_sesiones'], 1)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self._url())
+        self.assertEqual(len(consultas_sin_cache(consultas)), 3)
+        self.assertEqual(response.context['total_sesiones'], 1)
+        self.assertEqual(ReportCache.stats(['progress'])['progress'], {'hits': 1, 'misses': 1, 'hit_rate': 50.0})
+    
+    def test_hit_does_not_write_stats(self):
+        """Un acierto no escribe en el cache compartido; los contadores se vuelcan por intervalos"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from fit.report_cache import ReportCache
+        self.client.get(self._url())
+        ReportCache.flush_stats()
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(self._url())
+        escrituras = [
+            q['sql'] for q in consultas.captured_queries
+            if 'fit_cache' in q['sql'] and q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertEqual(escrituras, [])
+        self.assertEqual(ReportCache.stats(['progress'])['progress']['hits'], 1)
+    
+    def test_log_invalidates_its_month(self):
+        """Registrar progreso en un mes invalida solo ese periodo"""
+        self.client.get(self._url())
+        ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=self.pasado, esfuerzo=8)
+        response = self.client.get(self._url())
+        self.assertEqual(response.context['total_sesiones'], 2)
+    
+    def test_closed_month_expires_in_shared_cache(self):
+        """Los meses cerrados tienen TTL finito y las versiones viven en el cache compartido"""
+        from unittest import mock
+        from django.conf import settings
+        from django.core.cache import cache
+        self.assertNotIn('locmem', settings.CACHES['default']['BACKEND'])
+        with mock.patch('fit.report_cache.cache.set', wraps=cache.set) as guardar:
+            self.client.get(self._url())
+        timeouts = [c.args[2] for c in guardar.call_args_list if ':progress:' in c.args[0]]
+        self.assertEqual(timeouts, [settings.REPORT_CACHE_CLOSED_TIMEOUT])
+
+
+class DailyActivityTests(TestCase):
+    """Tests del rollup diario de actividad"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.routine = Routine.objects.create(nombre='Test Routine', user=self.user)
+        self.dia = date(2024, 3, 5)
+    
+    def _log(self, fecha, esfuerzo, tiempo_seg=600, repeticiones=10, peso_usado=None):
+        return ProgressLog.objects.create(
+            user=self.user, routine=self.routine, fecha=fecha, esfuerzo=esfuerzo,
+            tiempo_seg=tiempo_seg, repeticiones=repeticiones, peso_usado=peso_usado
+        )
+    
+    def _fila(self, fecha):
+        from fit.models import DailyActivity
+        return DailyActivity.objects.filter(user=self.user, fecha=fecha).first()
+    
+    def test_incremental_insert(self):
+        """Cada registro nuevo se suma a la fila de su día"""
+        self._log(self.dia, 5, peso_usado=40)
+        self._log(self.dia, 8, tiempo_seg=300, peso_usado=60)
+        fila = self._fila(self.dia)
+        self.assertEqual(
+            (fila.sesiones, fila.tiempo_total, fila.esfuerzo_sum, fila.esfuerzo_max, fila.reps_total),
+            (2, 900, 13, 8, 20)
+        )
+        self.assertEqual(float(fila.peso_max), 60.0)
+    
+    def test_delete_and_move(self):
+        """Eliminar o cambiar de fecha un registro recalcula los días afectados"""
+        a = self._log(self.dia, 5)
+        b = self._log(self.dia, 9)
+        b.delete()
+        self.assertEqual((self._fila(self.dia).sesiones, self._fila(self.dia).esfuerzo_max), (1, 5))
+        otro_dia = self.dia + timedelta(days=1)
+        a.fecha = otro_dia
+        a.save()
+        self.assertIsNone(self._fila(self.dia))
+        self.assertEqual(self._fila(otro_dia).sesiones, 1)
+    
+    def test_rebuild_matches_incremental(self):
+        """La reconstrucción produce las mismas filas que el mantenimiento incremental"""
+        from fit.models import DailyActivity
+        from fit.rollup_service import DailyActivityService
+        for i in range(10):
+            self._log(self.dia + timedelta(days=i % 4), i, peso_usado=i * 5)
+        campos = ('fecha', 'sesiones', 'tiempo_total', 'esfuerzo_sum', 'esfuerzo_max', 'reps_total', 'peso_max')
+        antes = list(DailyActivity.objects.order_by('fecha').values_list(*campos))
+        self.assertEqual(DailyActivityService.rebuild(), 4)
+        self.assertEqual(list(DailyActivity.objects.order_by('fecha').values_list(*campos)), antes)
+    
+    def test_report_reads_rollup(self):
+        """El informe mensual usa el rollup para totales y semanas"""
+        for i in range(20):
+            self._log(self.dia + timedelta(days=i % 10), 6)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('report_progress') + '?year=2024&month=3')
+        self.assertEqual(response.context['total_sesiones'], 20)
+        self.assertEqual(response.context['dias_activos'], 10)
+        self.assertEqual(response.context['esfuerzo_promedio'], 6.0)
+        self.assertEqual(sum(response.context['sesiones_por_semana'].values()), 20)
+
+
+class TimeSeriesTests(TestCase):
+    """Tests de las series temporales agregadas"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.routine = Routine.objects.create(nombre='Test Routine', user=self.user)
+    
+    def test_bucket_starts_cross_year(self):
+        """Los meses hacia atrás cruzan correctamente el cambio de año"""
+        from fit.timeseries import bucket_starts
+        self.assertEqual(
+            bucket_starts('month', 4, date(2024, 2, 15)),
+            [date(2023, 11, 1), date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1)]
+        )
+        self.assertEqual(bucket_starts('week', 2, date(2024, 3, 6)), [date(2024, 2, 26), date(2024, 3, 4)])
+    
+    def test_monthly_series_single_query_gap_filled(self):
+        """Una sola consulta y los meses sin actividad quedan en cero"""
+        from django.db.models import Avg, Count
+        from fit.timeseries import time_series
+        for fecha, esfuerzo in [(date(2023, 12, 3), 4), (date(2023, 12, 20), 6), (date(2024, 2, 1), 9)]:
+            ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=fecha, esfuerzo=esfuerzo)
+        with self.assertNumQueries(1):
+            serie = time_series(
+                ProgressLog.objects.filter(user=self.user), 'month', 3, hasta=date(2024, 2, 10),
+                sesiones=Count('id'), esfuerzo=Avg('esfuerzo')
+            )
+        self.assertEqual([p['sesiones'] for p in serie], [2, 0, 1])
+        self.assertEqual([p['esfuerzo'] for p in serie], [5, 0, 9])
+        self.assertEqual(serie[0]['fin'], date(2023, 12, 31))
+
+
+class TrainingAnalyticsTests(TestCase):
+    """Tests de la analítica de entrenamiento vectorizada"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='u1', password='testpass')
+        self.otro = User.objects.create_user(username='u2', password='testpass')
+        self.routine = Routine.objects.create(nombre='R', user=self.user)
+        self.hoy = date(2024, 6, 30)
+    
+    def test_metrics_match_definitions(self):
+        """Medias móviles, ACWR y pendientes coinciden con sus definiciones"""
+        from fit.analytics_service import TrainingAnalyticsService
+        # 28 días de sesiones diarias de 30 min: esfuerzo y peso crecen 1 por semana
+        for d in range(28):
+            ProgressLog.objects.create(
+                user=self.user, routine=self.routine, fecha=self.hoy - timedelta(days=d),
+                esfuerzo=5, tiempo_seg=1800, peso_usado=50 - d / 7
+            )
+        metricas = TrainingAnalyticsService.for_user(self.user, hasta=self.hoy)
+        self.assertEqual(metricas['sesiones'], 28)
+        self.assertEqual(metricas['carga_aguda'], 150.0)
+        self.assertEqual(metricas['carga_cronica'], 150.0)
+        self.assertEqual(metricas['acwr'], 1.0)
+        self.assertEqual(metricas['zona_acwr'], 'optima')
+        self.assertEqual(metricas['pendiente_esfuerzo'], 0.0)
+        self.assertAlmostEqual(metricas['pendiente_peso'], 1.0, places=2)
+        self.assertEqual(len(metricas['serie_7d']), 28)
+    
+    def test_batch_single_query(self):
+        """Varios usuarios se calculan con una sola consulta; sin datos no hay ACWR"""
+        from fit.analytics_service import TrainingAnalyticsService
+        ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=self.hoy, esfuerzo=9, tiempo_seg=3600)
+        with self.assertNumQueries(1):
+            resultado = TrainingAnalyticsService.batch([self.user.id, self.otro.id], hasta=self.hoy)
+        self.assertEqual(resultado[self.user.id]['zona_acwr'], 'riesgo')
+        self.assertEqual(resultado[self.otro.id]['sesiones'], 0)
+        self.assertIsNone(resultado[self.otro.id]['acwr'])
+
+
+class ReportSnapshotTests(TestCase):
+    """Tests del precálculo de reportes en snapshots"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.otro = User.objects.create_user(username='otro', password='testpass')
+        self.routine = Routine.objects.create(nombre='Test Routine', user=self.user)
+        self.mes = date(2024, 3, 1)
+        for dia in (4, 5, 12):
+            ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=self.mes.replace(day=dia), esfuerzo=6)
+    
+    def _precompute(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('precompute_reports', '--year', '2024', '--month', '3', '--workers', '0', *args, stdout=out)
+        return out.getvalue()
+    
+    def test_command_stores_snapshots(self):
+        """El comando guarda un snapshot por usuario y reporte, y lo restaura con sus tipos"""
+        from fit.models import ReportSnapshot
+        from fit.report_snapshots import ReportSnapshotService
+        salida = self._precompute('--chunk-size', '1')
+        self.assertIn('[2/2] 100%', salida)
+        self.assertEqual(ReportSnapshot.objects.count(), 6)
+        contexto = ReportSnapshotService.get('progress', self.user.id, '2024-03')
+        self.assertEqual(contexto['total_sesiones'], 3)
+        self.assertEqual(contexto['sesiones_por_semana'], {1: 2, 2: 1})
+        self.assertEqual(contexto['inicio'], date(2024, 3, 1))
+    
+    def test_view_serves_snapshot_until_data_changes(self):
+        """La vista usa el snapshot y un registro nuevo del mes lo invalida"""
+        from fit.models import ReportSnapshot
+        self._precompute('--reportes', 'progress')
+        snapshot = ReportSnapshot.objects.get(user=self.user, reporte='progress')
+        snapshot.datos['contexto']['total_sesiones'] = 99
+        snapshot.save()
+        self.client.force_login(self.user)
+        url = reverse('report_progress') + '?year=2024&month=3'
+        self.assertEqual(self.client.get(url).context['total_sesiones'], 99)
+        ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=date(2024, 3, 20), esfuerzo=6)
+        self.assertFalse(ReportSnapshot.objects.filter(user=self.user, reporte='progress').exists())
+        self.assertEqual(self.client.get(url).context['total_sesiones'], 4)
+    
+    def test_resume_from_checkpoint(self):
+        """Con --resume solo se procesan los usuarios posteriores al checkpoint"""
+        from fit.models import ReportSnapshot, SystemConfig
+        SystemConfig.objects.create(clave='precompute_reports:2024-03', valor=str(self.user.id))
+        self._precompute('--resume')
+        self.assertEqual(set(ReportSnapshot.objects.values_list('user_id', flat=True)), {self.otro.id})
+        self.assertEqual(SystemConfig.objects.get(clave='precompute_reports:2024-03').valor, str(self.otro.id))
+    
+    def test_only_tagged_values_restored(self):
+        """Solo se reconstruyen los tipos etiquetados: textos con forma de fecha o número siguen siendo texto"""
+        from decimal import Decimal
+        from fit.report_snapshots import ReportSnapshotService
+        contexto = {
+            'nota': '2024-03-01',
+            'por_anio': {'2024': 1},
+            'por_semana': {1: 2},
+            'inicio': date(2024, 3, 1),
+            'periodo': (date(2024, 3, 1), date(2024, 3, 31)),
+            'esfuerzo': Decimal('6.5'),
+        }
+        ReportSnapshotService.store_many([('progress', self.user.id, '2024-03', contexto)])
+        self.assertEqual(ReportSnapshotService.get('progress', self.user.id, '2024-03'), contexto)
+    
+    def test_previous_format_recomputed(self):
+        """Un snapshot sin el formato actual no se sirve"""
+        from fit.models import ReportSnapshot
+        from fit.report_snapshots import ReportSnapshotService
+        ReportSnapshot.objects.create(user=self.user, reporte='progress', periodo='2024-03', datos={'total_sesiones': 3})
+        self.assertIsNone(ReportSnapshotService.get('progress', self.user.id, '2024-03'))
+    
+    def test_change_during_compute_not_overwritten(self):
+        """Un cambio de datos mientras se calcula el snapshot impide guardarlo"""
+        from unittest import mock
+        from fit import reports
+        from fit.models import ReportSnapshot
+        original = reports.progress_context
+        def progreso_con_cambio(user_id, year, month):
+            contexto = original(user_id, year, month)
+            if user_id == self.user.id:
+                # Otro proceso registra progreso después de leer los datos
+                ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=self.mes.replace(day=20), esfuerzo=6)
+            return contexto
+        with mock.patch.object(reports, 'progress_context', side_effect=progreso_con_cambio):
+            self._precompute('--reportes', 'progress')
+        self.assertEqual(list(ReportSnapshot.objects.values_list('user_id', flat=True)), [self.otro.id])
+    
+    def test_change_during_upsert_removes_snapshot(self):
+        """Si la invalidación llega mientras se guarda, el snapshot guardado se elimina"""
+        import time
+        from unittest import mock
+        from fit.models import ReportSnapshot
+        from fit.report_snapshots import ReportSnapshotService
+        inicio = time.time()
+        cambiados = iter([set(), {self.user.id}])
+        with mock.patch.object(ReportSnapshotService, 'changed_since', side_effect=lambda *a: next(cambiados)):
+            guardados = ReportSnapshotService.store_many(
+                [('progress', self.user.id, '2024-03', {}), ('progress', self.otro.id, '2024-03', {})],
+                calculado_desde=inicio,
+            )
+        self.assertEqual(guardados, 1)
+        self.assertEqual(list(ReportSnapshot.objects.values_list('user_id', flat=True)), [self.otro.id])
+    
+    def test_daily_snapshots_keep_only_latest_day(self):
+        """De load_balance solo queda el día más reciente, también para usuarios fuera de la ejecución"""
+        from fit.models import ReportSnapshot
+        from fit.report_snapshots import ReportSnapshotService
+        inactivo = User.objects.create_user(username='inactivo', password='testpass', is_active=False)
+        ReportSnapshotService.store_many([
+            ('load_balance', self.user.id, '2024-01-01', {}),
+            ('load_balance', inactivo.id, '2024-01-01', {}),
+        ])
+        ReportSnapshotService.store_many([('load_balance', self.user.id, '2024-01-02', {})])
+        self.assertEqual(
+            list(ReportSnapshot.objects.filter(user=self.user).values_list('periodo', flat=True)), ['2024-01-02']
+        )
+        self._precompute('--reportes', 'load_balance')
+        periodos = set(ReportSnapshot.objects.values_list('periodo', flat=True))
+        self.assertEqual(periodos, {date.today().isoformat()})
+
+
+class MonthlyStatsCounterTests(TestCase):
+    """Tests de los contadores mensuales incrementales"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.trainer = User.objects.create_user(username='trainer', password='testpass')
+        self.routine = Routine.objects.create(nombre='Test Routine', user=self.user)
+    
+    def _stats(self, anio, mes):
+        return UserMonthlyStats.objects.filter(user=self.user, anio=anio, mes=mes).first()
+    
+    def test_increment_single_statement(self):
+        """Cada alta es una sola sentencia y coincide con el recuento completo"""
+        from fit.stats_service import MonthlyStatsService
+        for dia in (1, 2):
+            ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=date(2024, 5, dia))
+        with self.assertNumQueries(1):
+            MonthlyStatsService.increment_user(self.user.id, date(2024, 5, 3), 'seguimientos_registrados')
+        self.assertEqual(self._stats(2024, 5).seguimientos_registrados, 3)
+        MonthlyStatsService.recount_user(self.user.id, 2024, 5)
+        self.assertEqual(self._stats(2024, 5).seguimientos_registrados, 2)
+    
+    def test_move_and_delete_decrement(self):
+        """Cambiar de mes o eliminar un registro descuenta del mes correspondiente"""
+        log = ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=date(2024, 5, 10))
+        ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=date(2024, 5, 11))
+        log.fecha = date(2024, 6, 1)
+        log.save()
+        self.assertEqual(self._stats(2024, 5).seguimientos_registrados, 1)
+        self.assertEqual(self._stats(2024, 6).seguimientos_registrados, 1)
+        log.delete()
+        self.assertEqual(self._stats(2024, 6).seguimientos_registrados, 0)
+        hoy = date.today()
+        self.routine.delete()
+        self.assertEqual(self._stats(hoy.year, hoy.month).rutinas_iniciadas, 0)
+        self.assertEqual(self._stats(2024, 5).seguimientos_registrados, 0)
+    
+    def test_trainer_counters(self):
+        """Asignaciones y recomendaciones suman y restan en las estadísticas del entrenador"""
+        assignment = TrainerAssignment.objects.create(user=self.user, trainer=self.trainer, activo=True)
+        TrainerRecommendation.objects.create(user=self.user, trainer=self.trainer, mensaje='Hidrátate')
+        hoy = date.today()
+        stats = TrainerMonthlyStats.objects.get(trainer=self.trainer, anio=hoy.year, mes=hoy.month)
+        self.assertEqual((stats.asignaciones_nuevas, stats.seguimientos_realizados), (1, 1))
+        assignment.delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.asignaciones_nuevas, 0)
+
+
+class StatsDispatcherTests(TestCase):
+    """Tests del despacho de estadísticas por transacción"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.routine = Routine.objects.create(nombre='Test Routine', user=self.user)
+    
+    def _seguimientos(self, anio, mes):
+        return UserMonthlyStats.objects.get(user=self.user, anio=anio, mes=mes).seguimientos_registrados
+    
+    def test_coalesce_one_recount_per_key(self):
+        """Muchos registros del mismo mes se recalculan una sola vez al confirmar"""
+        from unittest import mock
+        from fit.stats_service import MonthlyStatsService, StatsDispatcher
+        with mock.patch.object(MonthlyStatsService, 'recount_user', wraps=MonthlyStatsService.recount_user) as recount:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                with StatsDispatcher.coalesce():
+                    for dia in range(1, 6):
+                        ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=date(2024, 3, dia))
+                    ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=date(2024, 4, 1))
+                    # Sin confirmar todavía no se toca el contador
+                    self.assertFalse(UserMonthlyStats.objects.filter(user=self.user, anio=2024, mes=3).exists())
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(recount.call_count, 2)
+        self.assertEqual(self._seguimientos(2024, 3), 5)
+        self.assertEqual(self._seguimientos(2024, 4), 1)
+    
+    def test_rollback_discards_keys(self):
+        """Si el bloque falla no se programa ningún recálculo"""
+        from fit.stats_service import StatsDispatcher
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(ValueError):
+                with StatsDispatcher.coalesce():
+                    ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=date(2024, 3, 1))
+                    raise ValueError('fallo')
+        self.assertEqual(callbacks, [])
+        self.assertFalse(ProgressLog.objects.filter(user=self.user).exists())
+    
+    def test_routine_adopt_single_flush(self):
+        """Adoptar una rutina prediseñada programa un único recálculo"""
+        trainer = User.objects.create_user(username='trainer', password='testpass', is_staff=True)
+        exercise = Exercise.objects.create(nombre='Sentadilla', tipo='fuerza', dificultad=2)
+        preset = Routine.objects.create(nombre='Preset', user=trainer, es_predisenada=True, autor_trainer=trainer)
+        for orden in range(1, 4):
+            RoutineItem.objects.create(routine=preset, exercise=exercise, orden=orden, series=3, reps=10)
+        self.client.login(username='testuser', password='testpass')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.get(reverse('routine_adopt', args=[preset.pk]))
+        self.assertEqual(len(callbacks), 1)
+        hoy = date.today()
+        stats = UserMonthlyStats.objects.get(user=self.user, anio=hoy.year, mes=hoy.month)
+        self.assertEqual(stats.rutinas_iniciadas, 2)
+
+
+class StatsRecalculatorTests(TestCase):
+    """Tests del recálculo masivo de estadísticas mensuales"""
+    
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'user{i}', password='testpass') for i in range(3)]
+        self.trainer = User.objects.create_user(username='trainer', password='testpass')
+        for user in self.users:
+            routine = Routine.objects.create(nombre='Rutina', user=user)
+            for dia in (1, 2):
+                ProgressLog.objects.create(user=user, routine=routine, fecha=date(2024, 2, dia))
+            ProgressLog.objects.create(user=user, routine=routine, fecha=date(2024, 3, 5))
+        # Simular deriva de los contadores
+        UserMonthlyStats.objects.filter(anio=2024, mes=2).update(seguimientos_registrados=9)
+        UserMonthlyStats.objects.filter(user=self.users[0], anio=2024, mes=3).delete()
+        UserMonthlyStats.objects.create(user=self.users[1], anio=2024, mes=4, seguimientos_registrados=4)
+    
+    def test_dry_run_reports_diff_without_writing(self):
+        """El modo dry-run devuelve las diferencias con un número fijo de consultas"""
+        from fit.stats_service import StatsRecalculator
+        with self.assertNumQueries(6):
+            cambios = StatsRecalculator.recalculate(date(2024, 1, 15), date(2024, 4, 1), dry_run=True)
+        claves = {(owner_id, anio, mes) for owner_id, anio, mes, _, _ in cambios['user']}
+        self.assertEqual(len(claves), 5)
+        self.assertIn((self.users[0].id, 2024, 3), claves)
+        self.assertEqual(cambios['trainer'], [])
+        self.assertEqual(
+            UserMonthlyStats.objects.get(user=self.users[0], anio=2024, mes=2).seguimientos_registrados, 9
+        )
+    
+    def test_recalculate_fixes_drift(self):
+        """Tras recalcular, los contadores coinciden con los registros y no quedan diferencias"""
+        from django.core.management import call_command
+        from io import StringIO
+        call_command('recalc_stats', desde='2024-02-01', hasta='2024-04-30', stdout=StringIO())
+        for user in self.users:
+            self.assertEqual(UserMonthlyStats.objects.get(user=user, anio=2024, mes=2).seguimientos_registrados, 2)
+            self.assertEqual(UserMonthlyStats.objects.get(user=user, anio=2024, mes=3).seguimientos_registrados, 1)
+        self.assertEqual(
+            UserMonthlyStats.objects.get(user=self.users[1], anio=2024, mes=4).seguimientos_registrados, 0
+        )
+        salida = StringIO()
+        call_command('recalc_stats', desde='2024-02-01', hasta='2024-04-30', dry_run=True, stdout=salida)
+        self.assertIn('0 filas se actualizarían', salida.getvalue())
+
+
+class TrainerAssigneesQueryTests(TestCase):
+    """Tests del listado de asignados filtrado y paginado en SQL"""
+    
+    def setUp(self):
+        self.trainer = User.objects.create_user(username='trainer', password='testpass', is_staff=True)
+        hoy = date.today()
+        self.hoy = hoy
+        for i, sesiones in enumerate((12, 6, 1, 0)):
+            user = User.objects.create_user(username=f'asignado{i}', password='testpass')
+            TrainerAssignment.objects.create(user=user, trainer=self.trainer, activo=True)
+            routine = Routine.objects.create(nombre='Rutina', user=user)
+            for _ in range(sesiones):
+                ProgressLog.objects.create(user=user, routine=routine, fecha=hoy)
+    
+    def _get(self, **params):
+        from django.test import RequestFactory
+        from fit import views
+        request = RequestFactory().get(reverse('trainer_assignees'), params)
+        request.user = self.trainer
+        request._messages = []
+        # Sin BD institucional en los tests: saltar los decoradores de permisos
+        return views.trainer_assignees.__wrapped__.__wrapped__(request)
+    
+    def test_annotations_and_activity_filter(self):
+        """Nivel de actividad y métricas salen de la consulta anotada"""
+        from fit.trainer_service import TrainerAssigneeService
+        qs = TrainerAssigneeService.annotated(self.trainer, hoy=self.hoy)
+        niveles = {a.user.username: (a.nivel_actividad, a.sesiones_mes, a.rutinas_activas) for a in qs}
+        self.assertEqual(niveles['asignado0'], ('Alto', 12, 1))
+        self.assertEqual(niveles['asignado1'], ('Medio', 6, 1))
+        self.assertEqual(niveles['asignado3'], ('Sin actividad', 0, 1))
+        bajos = TrainerAssigneeService.filter_actividad(qs, 'bajo')
+        self.assertEqual(sorted(a.user.username for a in bajos), ['asignado2', 'asignado3'])
+        primero = TrainerAssigneeService.order(qs, 'actividad').first()
+        self.assertEqual(primero.user.username, 'asignado0')
+    
+    def test_query_count_independent_of_assignees(self):
+        """El número de consultas por página no crece con el número de asignados"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as pocos:
+            response = self._get(orden='ultima_sesion')
+        self.assertEqual(response.status_code, 200)
+        for i in range(4, 12):
+            user = User.objects.create_user(username=f'asignado{i}', password='testpass')
+            TrainerAssignment.objects.create(user=user, trainer=self.trainer, activo=True)
+        with CaptureQueriesContext(connection) as muchos:
+            response = self._get(orden='ultima_sesion')
+        self.assertEqual(len(muchos), len(pocos))
+        self.assertContains(response, 'asignado11')
+
+
+class TrainerCohortTests(TestCase):
+    """Tests de la comparación de cohorte del entrenador"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.trainer = User.objects.create_user(username='trainer', password='testpass', is_staff=True)
+        self.hoy = date(2024, 6, 28)
+        self.users = []
+        for i, sesiones in enumerate((8, 4, 0)):
+            user = User.objects.create_user(username=f'cohorte{i}', password='testpass')
+            TrainerAssignment.objects.create(user=user, trainer=self.trainer, activo=True)
+            routine = Routine.objects.create(nombre='Rutina', user=user)
+            for d in range(sesiones):
+                ProgressLog.objects.create(
+                    user=user, routine=routine, fecha=self.hoy - timedelta(days=d * 3),
+                    esfuerzo=5 + i, tiempo_seg=600 * (d + 1),
+                )
+            self.users.append(user)
+    
+    def test_percentiles_with_ties_and_missing(self):
+        """Percentil de rango medio; los valores ausentes no se comparan"""
+        import numpy as np
+        from fit.cohort_service import percentiles
+        resultado = percentiles([10, 20, 20, np.nan])
+        self.assertEqual(np.round(resultado[:3], 1).tolist(), [16.7, 66.7, 66.7])
+        self.assertTrue(np.isnan(resultado[3]))
+    
+    def test_metrics_in_two_queries_and_cached(self):
+        """Métricas de toda la cohorte en dos consultas; la segunda lectura sale de cache"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from fit.cohort_service import TrainerCohortService
+        with CaptureQueriesContext(connection) as consultas:
+            datos = TrainerCohortService.get(self.trainer.id, hoy=self.hoy)
+        self.assertEqual(len(consultas_sin_cache(consultas)), 2)
+        with CaptureQueriesContext(connection) as consultas:
+            TrainerCohortService.get(self.trainer.id, hoy=self.hoy)
+        self.assertEqual(consultas_sin_cache(consultas), [])
+        filas = {f['username']: f for f in datos['asignados']}
+        self.assertEqual(filas['cohorte0']['sesiones'], 8)
+        self.assertEqual(filas['cohorte0']['sesiones_semana'], 2.0)
+        self.assertEqual(filas['cohorte0']['percentiles']['sesiones_semana'], 83)
+        self.assertEqual(filas['cohorte2']['percentiles']['sesiones_semana'], 17)
+        self.assertIsNone(filas['cohorte2']['esfuerzo_promedio'])
+        self.assertIsNone(filas['cohorte2']['percentiles']['esfuerzo_promedio'])
+        # Más minutos en las sesiones antiguas: tendencia de volumen negativa
+        self.assertLess(filas['cohorte0']['tendencia_volumen'], 0)
+
+
+class ActivityFeedTests(TestCase):
+    """Tests del feed de actividad de los asignados del entrenador"""
+    
+    def setUp(self):
+        self.trainer = User.objects.create_user(username='trainer', password='testpass', is_staff=True)
+        self.otro_trainer = User.objects.create_user(username='otro', password='testpass', is_staff=True)
+        self.user = User.objects.create_user(username='asignado', password='testpass')
+        self.ajeno = User.objects.create_user(username='ajeno', password='testpass')
+        TrainerAssignment.objects.create(user=self.user, trainer=self.trainer, activo=True)
+        self.routine = Routine.objects.create(nombre='Fuerza', user=self.user)
+        Routine.objects.create(nombre='Ajena', user=self.ajeno)
+    
+    def _feed(self, **kwargs):
+        from fit.activity_feed import ActivityFeedService
+        return ActivityFeedService.feed(self.trainer, **kwargs)
+    
+    def test_feed_merges_assignee_events(self):
+        """Solo eventos de asignados; los mensajes a terceros no se muestran"""
+        from fit.models import Message
+        ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=date.today())
+        Message.objects.create(remitente=self.user, destinatario=self.trainer, asunto='Duda', mensaje='...')
+        Message.objects.create(remitente=self.user, destinatario=self.otro_trainer, asunto='Privado', mensaje='...')
+        with self.assertNumQueries(1):
+            eventos, siguiente = self._feed()
+        self.assertEqual([e.tipo for e in eventos], ['mensaje', 'progreso', 'rutina'])
+        self.assertEqual(eventos[0].resumen, 'Envió un mensaje: Duda')
+        self.assertIsNone(siguiente)
+    
+    def test_cursor_pagination_and_since(self):
+        """El cursor recorre todos los eventos sin repetir y since filtra los nuevos"""
+        for dia in range(1, 8):
+            ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=date(2024, 1, dia))
+        vistos = []
+        cursor = None
+        while True:
+            eventos, cursor = self._feed(cursor=cursor, limit=3)
+            vistos.extend(e.id for e in eventos)
+            if not cursor:
+                break
+        self.assertEqual(len(vistos), 8)
+        self.assertEqual(len(set(vistos)), 8)
+        ultimo = self._feed(limit=1)[0][0]
+        ProgressLog.objects.create(user=self.user, routine=self.routine, fecha=date(2024, 1, 9))
+        nuevos, _ = self._feed(since=ultimo.fecha)
+        self.assertEqual(len(nuevos), 1)
+        with self.assertRaises(ValueError):
+            self._feed(cursor='no-es-un-cursor')
+    
+    def test_adoption_and_recommendation_read_events(self):
+        """Adoptar una rutina prediseñada y leer recomendaciones genera sus eventos"""
+        preset = Routine.objects.create(nombre='Preset', user=self.trainer, es_predisenada=True, autor_trainer=self.trainer)
+        TrainerRecommendation.objects.create(user=self.user, trainer=self.trainer, mensaje='Hidrátate')
+        TrainerRecommendation.objects.create(user=self.user, trainer=self.otro_trainer, mensaje='Descansa')
+        self.client.login(username='asignado', password='testpass')
+        self.client.get(reverse('routine_adopt', args=[preset.pk]))
+        self.client.get(reverse('recommendations_list'))
+        tipos = [e.tipo for e in self._feed()[0]]
+        self.assertEqual(tipos.count('preset_adoptado'), 1)
+        self.assertEqual(tipos.count('recomendacion_leida'), 1)
+        self.assertFalse(TrainerRecommendation.objects.filter(user=self.user, leido=False).exists())
+
+
+class AdminUsersManagementTests(TestCase):
+    """Tests del listado paginado de usuarios del administrador"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass')
+        hoy = date.today()
+        for i, sesiones in enumerate((11, 6, 2, 0)):
+            user = User.objects.create_user(username=f'socio{i}', password='pass')
+            routine = Routine.objects.create(nombre='Rutina', user=user)
+            for _ in range(sesiones):
+                ProgressLog.objects.create(user=user, routine=routine, fecha=hoy)
+        User.objects.create_user(username='testeo', password='pass')
+        self.client.login(username='admin', password='adminpass')
+    
+    def test_activity_filter_and_annotations(self):
+        """El nivel de actividad y las estadísticas por fila salen de la consulta"""
+        from fit.admin_user_service import AdminUserService
+        usuarios = {u.username: u for u in AdminUserService.queryset(activity='medium')}
+        self.assertEqual(list(usuarios), ['socio1'])
+        self.assertEqual((usuarios['socio1'].total_sesiones, usuarios['socio1'].rutinas_count), (6, 1))
+        inactivos = [u.username for u in AdminUserService.queryset(activity='inactive')]
+        self.assertEqual(inactivos, ['socio3'])
+        primero = AdminUserService.queryset(orden='actividad').first()
+        self.assertEqual(primero.username, 'socio0')
+    
+    def test_test_accounts_flagged_once(self):
+        """Las cuentas de prueba se marcan al indexar y el listado filtra por la marca, no por LIKE"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from fit.admin_user_service import AdminUserService
+        from fit.assignment_service import TrainerAutoAssignService
+        from fit.models import TestAccount
+        otro = User.objects.create_user(username='MiTEST2', password='pass')
+        self.assertEqual(
+            set(TestAccount.objects.values_list('user__username', flat=True)), {'testeo', 'MiTEST2'}
+        )
+        with CaptureQueriesContext(connection) as contexto:
+            usernames = [u.username for u in AdminUserService.queryset()]
+        self.assertNotIn('testeo', usernames)
+        self.assertNotIn('MiTEST2', usernames)
+        self.assertFalse(any("LIKE '%test%'" in q['sql'].replace('%%', '%') for q in contexto.captured_queries))
+        self.assertNotIn('testeo', [u.username for u in TrainerAutoAssignService.unassigned()])
+        otro.username = 'socio99'
+        otro.save()
+        self.assertFalse(TestAccount.objects.filter(user=otro).exists())
+        self.assertIn('socio99', [u.username for u in AdminUserService.queryset()])
+    
+    def test_page_cost_bounded(self):
+        """El número de consultas de la página no depende del número de usuarios"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        # Primera visita: comprobaciones por proceso e indexación periódica (throttled)
+        self.client.get(reverse('admin_users_management'), {'q': 'socio'})
+        with CaptureQueriesContext(connection) as pocos:
+            response = self.client.get(reverse('admin_users_management'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'testeo')
+        for i in range(4, 20):
+            User.objects.create_user(username=f'socio{i}', password='pass')
+        with CaptureQueriesContext(connection) as muchos:
+            response = self.client.get(reverse('admin_users_management'), {'q': 'socio1'})
+        self.assertEqual(len(muchos), len(pocos))
+        self.assertEqual(response.context['page_obj'].paginator.count, 11)
+    
+    def test_search_uses_trigram_index(self):
+        """La búsqueda por username o nombre filtra con el índice de búsqueda, no con LIKE sobre auth_user"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from fit.admin_user_service import AdminUserService
+        User.objects.filter(username='socio2').update(first_name='María', last_name='Gómez')
+        from fit.search_service import PeopleSearchService
+        PeopleSearchService.index_users(User.objects.filter(username='socio2'))
+        with CaptureQueriesContext(connection) as consultas:
+            encontrados = [u.username for u in AdminUserService.queryset(search='gomez')]
+        self.assertEqual(encontrados, ['socio2'])
+        self.assertEqual([u.username for u in AdminUserService.queryset(search='cio3')], ['socio3'])
+        self.assertIn('fit_usersearchindex', consultas[0]['sql'])
+        self.assertNotIn('%gomez%', consultas[0]['sql'])
+
+
+class AnalyticsSummaryTests(TestCase):
+    """Tests de los resúmenes precalculados de admin_analytics"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass')
+        self.trainer = User.objects.create_user(username='coach', password='pass', is_staff=True)
+        exercise = Exercise.objects.create(nombre='Sentadilla', tipo='fuerza', dificultad=2)
+        for i in range(2):
+            user = User.objects.create_user(username=f'socio{i}', password='pass')
+            TrainerAssignment.objects.create(user=user, trainer=self.trainer, activo=True)
+            routine = Routine.objects.create(nombre='Full body', user=user)
+            RoutineItem.objects.create(routine=routine, exercise=exercise, orden=1, series=3, reps=10)
+            for dia in range(1, 4):
+                ProgressLog.objects.create(user=user, routine=routine, fecha=date(2024, 1, dia))
+        TrainerRecommendation.objects.create(user=user, trainer=self.trainer, mensaje='Bien')
+    
+    def test_refresh_and_read_in_four_queries(self):
+        """El comando llena los resúmenes y la vista los lee con una consulta cada uno"""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        call_command('refresh_analytics', stdout=StringIO())
+        self.client.login(username='admin', password='adminpass')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('admin_analytics'))
+        self.assertEqual(response.status_code, 200)
+        resumenes = [q['sql'] for q in consultas.captured_queries if 'fit_mv_' in q['sql']]
+        self.assertEqual(len(resumenes), 4)
+        trainer = response.context['efectividad_entrenadores'][0]
+        self.assertEqual(
+            (trainer.username, trainer.asignados, trainer.sesiones_totales, trainer.recomendaciones),
+            ('coach', 2, 6, 1),
+        )
+        self.assertEqual(trainer.promedio_sesiones_por_usuario, 3.0)
+        self.assertEqual(response.context['popularidad_ejercicios'][0].veces_usado, 2)
+        self.assertEqual(response.context['popularidad_rutinas'][0].veces_usada, 6)
+    
+    def test_view_without_summaries(self):
+        """Si el comando no se ha ejecutado la vista responde con los resúmenes vacíos"""
+        self.client.login(username='admin', password='adminpass')
+        response = self.client.get(reverse('admin_analytics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['efectividad_entrenadores'], [])
+    
+    def test_missing_summary_does_not_hide_others(self):
+        """Un resumen no disponible (aquí el de facultades) no impide leer los demás"""
+        from io import StringIO
+        from django.core.management import call_command
+        call_command(
+            'refresh_analytics', '--only', 'trainer_effectiveness', 'exercise_popularity', 'routine_popularity',
+            stdout=StringIO(),
+        )
+        self.client.login(username='admin', password='adminpass')
+        response = self.client.get(reverse('admin_analytics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['actividad_por_facultad'], {})
+        self.assertEqual(response.context['efectividad_entrenadores'][0].username, 'coach')
+        self.assertEqual(response.context['popularidad_rutinas'][0].veces_usada, 6)
+
+
+class TrainerAutoAssignTests(TestCase):
+    """Tests de la asignación automática de entrenadores"""
+    
+    def setUp(self):
+        from fit.models import SystemConfig
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass')
+        self.coach_a = User.objects.create_user(username='coach_a', password='pass', is_staff=True)
+        self.coach_b = User.objects.create_user(username='coach_b', password='pass', is_staff=True)
+        self.socios = [User.objects.create_user(username=f'socio{i}', password='pass') for i in range(5)]
+        # coach_a ya tiene un asignado y capacidad propia de 2
+        TrainerAssignment.objects.create(user=self.socios[0], trainer=self.coach_a, activo=True)
+        SystemConfig.objects.create(clave='capacidad_entrenador', valor='3')
+        SystemConfig.objects.create(clave='capacidad_entrenador:coach_a', valor='2')
+        # El rollback del test no emite señales: se descartan los valores cacheados del proceso
+        from fit.config_service import ConfigService
+        self.addCleanup(ConfigService.invalidate)
+    
+    def test_plan_respects_capacity_and_load(self):
+        """Se llena primero el de menor carga y ninguno supera su capacidad"""
+        from fit.assignment_service import TrainerAutoAssignService
+        plan = TrainerAutoAssignService.plan()
+        asignados = [(u.username, t.username) for u, t, _ in plan['asignaciones']]
+        self.assertEqual(asignados, [
+            ('socio1', 'coach_b'), ('socio2', 'coach_a'), ('socio3', 'coach_b'), ('socio4', 'coach_b'),
+        ])
+        self.assertEqual(plan['sin_cupo'], [])
+        cargas = {t.username: (capacidad, antes, despues) for t, capacidad, antes, despues in plan['entrenadores']}
+        self.assertEqual(cargas, {'coach_a': (2, 1, 2), 'coach_b': (3, 0, 3)})
+        # La vista previa no escribe nada
+        self.assertEqual(TrainerAssignment.objects.count(), 1)
+    
+    def test_affinity_preferred(self):
+        """Un usuario va con un instructor de su facultad aunque tenga más carga"""
+        from unittest import mock
+        from fit.assignment_service import TrainerAutoAssignService
+        from fit.institutional_service import InstitutionalService
+        info = {'coach_a': {'faculty': 'Ingeniería'}, 'socio4': {'faculty': 'Ingeniería'}}
+        with mock.patch.object(InstitutionalService, 'info_many', return_value=info):
+            plan = TrainerAutoAssignService.plan()
+        asignados = {u.username: (t.username, motivo) for u, t, motivo in plan['asignaciones']}
+        self.assertEqual(asignados['socio4'], ('coach_a', 'faculty'))
+        self.assertEqual(asignados['socio1'], ('coach_b', None))
+    
+    def test_campus_affinity_with_institutional_data(self):
+        """Los empleados traen su sede: un estudiante va con un instructor de su misma sede"""
+        from django.db import connection
+        from fit import institutional_service
+        from fit.assignment_service import TrainerAutoAssignService
+        from fit.institutional_service import InstitutionalService
+        with connection.cursor() as cur:
+            for ddl in (
+                "CREATE TABLE campuses (code INTEGER, name VARCHAR(20))",
+                "CREATE TABLE faculties (code INTEGER, name VARCHAR(40))",
+                "CREATE TABLE students (id VARCHAR(15), first_name VARCHAR(30), last_name VARCHAR(30), "
+                "email VARCHAR(50), campus_code INTEGER)",
+                "CREATE TABLE employees (id VARCHAR(15), first_name VARCHAR(30), last_name VARCHAR(30), "
+                "email VARCHAR(30), employee_type VARCHAR(30), faculty_code INTEGER, campus_code INTEGER)",
+                "CREATE TABLE users (username VARCHAR(30), role VARCHAR(20), student_id VARCHAR(15), "
+                "employee_id VARCHAR(15), is_active BOOLEAN)",
+            ):
+                cur.execute(ddl)
+            cur.executemany("INSERT INTO campuses VALUES (%s, %s)", [(1, 'Pance'), (2, 'Centro')])
+            cur.execute("INSERT INTO faculties VALUES (1, 'Ingeniería')")
+            cur.executemany("INSERT INTO employees VALUES (%s, 'N', 'A', 'e', 'Instructor', 1, %s)", [('E1', 2), ('E2', 1)])
+            cur.executemany(
+                "INSERT INTO users VALUES (%s, 'EMPLOYEE', NULL, %s, TRUE)", [('coach_a', 'E1'), ('coach_b', 'E2')]
+            )
+            for i, socio in enumerate(self.socios[1:], start=1):
+                cur.execute("INSERT INTO students VALUES (%s, 'S', 'B', 's', %s)", [f'S{i}', 2 if i == 3 else 1])
+                cur.execute("INSERT INTO users VALUES (%s, 'STUDENT', %s, NULL, TRUE)", [socio.username, f'S{i}'])
+        disponible = institutional_service._disponible
+        institutional_service._disponible = True
+        self.addCleanup(setattr, institutional_service, '_disponible', disponible)
+        self.assertEqual(InstitutionalService.info_many(['coach_a'])['coach_a']['campus'], 'Centro')
+        plan = TrainerAutoAssignService.plan()
+        asignados = {u.username: (t.username, motivo) for u, t, motivo in plan['asignaciones']}
+        # coach_a tiene más carga, pero es el único de la sede Centro
+        self.assertEqual(asignados['socio3'], ('coach_a', 'campus'))
+        self.assertEqual(asignados['socio1'], ('coach_b', 'campus'))
+    
+    def test_apply_locks_users_before_checking(self):
+        """Las filas de los usuarios se bloquean antes de comprobar sus asignaciones activas"""
+        from unittest import mock
+        from fit.assignment_service import TrainerAutoAssignService
+        plan = TrainerAutoAssignService.plan()
+        # Otra ejecución asigna entrenador a socio1 después de calcular el plan
+        TrainerAssignment.objects.create(user=self.socios[1], trainer=self.coach_a, activo=True)
+        bloqueo = User.objects.select_for_update
+        with mock.patch.object(User.objects, 'select_for_update', side_effect=bloqueo) as select_for_update:
+            nuevas = TrainerAutoAssignService.apply(plan, administrador=self.admin)
+        select_for_update.assert_called_once_with()
+        self.assertNotIn(self.socios[1].id, [a.user_id for a in nuevas])
+        self.assertEqual(TrainerAssignment.objects.filter(user=self.socios[1], activo=True).count(), 1)
+    
+    def test_apply_bulk_writes_history_and_stats(self):
+        """Asignaciones e historial se guardan en bloque y las estadísticas se recalculan"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from fit.assignment_service import TrainerAutoAssignService
+        from fit.models import AssignmentHistory
+        plan = TrainerAutoAssignService.plan()
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as consultas:
+                nuevas = TrainerAutoAssignService.apply(plan, administrador=self.admin)
+        self.assertEqual(len(nuevas), 4)
+        inserts = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len([sql for sql in inserts if 'fit_trainerassignment' in sql]), 1)
+        self.assertEqual(len([sql for sql in inserts if 'fit_assignmenthistory' in sql]), 1)
+        self.assertEqual(AssignmentHistory.objects.filter(administrador=self.admin, accion='creada').count(), 4)
+        hoy = date.today()
+        stats = TrainerMonthlyStats.objects.get(trainer=self.coach_b, anio=hoy.year, mes=hoy.month)
+        self.assertEqual(stats.asignaciones_nuevas, 3)
+    
+    def test_view_preview_and_apply(self):
+        """GET muestra la vista previa sin escribir y POST crea las asignaciones"""
+        self.client.login(username='admin', password='adminpass')
+        response = self.client.get(reverse('admin_auto_assign'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['asignaciones']), 4)
+        self.assertEqual(TrainerAssignment.objects.count(), 1)
+        response = self.client.post(reverse('admin_auto_assign'))
+        self.assertRedirects(response, reverse('admin_assign_trainer_advanced'), fetch_redirect_response=False)
+        self.assertEqual(TrainerAssignment.objects.filter(activo=True).count(), 5)
+    
+    def test_command_dry_run(self):
+        """--dry-run muestra el plan sin crear asignaciones"""
+        from io import StringIO
+        from django.core.management import call_command
+        salida = StringIO()
+        call_command('auto_assign_trainers', '--dry-run', stdout=salida)
+        self.assertIn('[DRY-RUN] Se crearían 4 asignaciones', salida.getvalue())
+        self.assertEqual(TrainerAssignment.objects.count(), 1)
+
+
+class AssignmentImportTests(TestCase):
+    """Tests de la importación de asignaciones desde CSV"""
+    
+    CSV = (
+        "usuario,entrenador\n"
+        "socio0,coach_b\n"
+        "socio1,coach_a\n"
+        "socio2,coach_a\n"
+        "socio3,coach_a\n"
+        "fantasma,coach_a\n"
+        "socio1,nadie\n"
+        "solo_una_columna\n"
+    )
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass')
+        self.coach_a = User.objects.create_user(username='coach_a', password='pass', is_staff=True)
+        self.coach_b = User.objects.create_user(username='coach_b', password='pass', is_staff=True)
+        self.socios = [User.objects.create_user(username=f'socio{i}', password='pass') for i in range(4)]
+        TrainerAssignment.objects.create(user=self.socios[0], trainer=self.coach_a, activo=True)
+        TrainerAssignment.objects.create(user=self.socios[2], trainer=self.coach_a, activo=False)
+        TrainerAssignment.objects.create(user=self.socios[3], trainer=self.coach_a, activo=True)
+    
+    def _activos(self):
+        return set(TrainerAssignment.objects.filter(activo=True).values_list('user__username', 'trainer__username'))
+    
+    def test_import_applies_only_differences_in_bulk(self):
+        """Se desactiva, reactiva y crea lo necesario con escrituras en bloque"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from fit.assignment_import import AssignmentImportService
+        from fit.models import AssignmentHistory
+        with CaptureQueriesContext(connection) as consultas:
+            resumen = AssignmentImportService.import_csv(self.CSV.splitlines(), administrador=self.admin)
+        self.assertEqual(
+            (resumen['creadas'], resumen['reactivadas'], resumen['desactivadas'], resumen['sin_cambios']),
+            (2, 1, 1, 1),
+        )
+        self.assertEqual([numero for numero, _ in resumen['errores']], [6, 7, 8])
+        self.assertEqual(self._activos(), {
+            ('socio0', 'coach_b'), ('socio1', 'coach_a'), ('socio2', 'coach_a'), ('socio3', 'coach_a'),
+        })
+        acciones = sorted(AssignmentHistory.objects.filter(administrador=self.admin).values_list('accion', flat=True))
+        self.assertEqual(acciones, ['creada', 'creada', 'desactivada', 'reactivada'])
+        # Dos consultas para resolver usernames y un INSERT por tabla
+        sql = [q['sql'] for q in consultas.captured_queries]
+        self.assertEqual(len([s for s in sql if s.startswith('SELECT') and 'FROM "auth_user"' in s.split('WHERE')[0]]), 2)
+        self.assertEqual(len([s for s in sql if s.startswith('INSERT INTO "fit_trainerassignment"')]), 1)
+        self.assertEqual(len([s for s in sql if s.startswith('INSERT INTO "fit_assignmenthistory"')]), 1)
+    
+    def test_dry_run_and_small_batches(self):
+        """La simulación no escribe; con lotes pequeños el resultado es el mismo"""
+        from fit.assignment_import import AssignmentImportService
+        resumen = AssignmentImportService.import_csv(self.CSV.splitlines(), dry_run=True)
+        self.assertEqual(resumen['creadas'], 2)
+        self.assertEqual(self._activos(), {('socio0', 'coach_a'), ('socio3', 'coach_a')})
+        resumen = AssignmentImportService.import_csv(self.CSV.splitlines(), batch_size=2)
+        self.assertEqual((resumen['creadas'], resumen['reactivadas'], resumen['desactivadas']), (2, 1, 1))
+        self.assertIn(('socio0', 'coach_b'), self._activos())
+    
+    def test_upload_view(self):
+        """El administrador sube el CSV y ve el resumen"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.client.login(username='admin', password='adminpass')
+        archivo = SimpleUploadedFile('asignaciones.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        response = self.client.post(reverse('admin_import_assignments'), {'archivo': archivo})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['resumen']['creadas'], 2)
+        self.assertIn(('socio1', 'coach_a'), self._activos())
+    
+    def test_command(self):
+        """El comando lee el archivo y respeta --dry-run"""
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as archivo:
+            archivo.write(self.CSV)
+        self.addCleanup(os.remove, archivo.name)
+        salida = StringIO()
+        call_command('import_assignments', archivo.name, '--dry-run', stdout=salida)
+        self.assertIn('[DRY-RUN] 2 creadas, 1 reactivadas, 1 desactivadas, 1 sin cambios, 3 errores', salida.getvalue())
+        call_command('import_assignments', archivo.name, '--admin', 'admin', stdout=StringIO())
+        self.assertIn(('socio0', 'coach_b'), self._activos())
+
+
+class PeopleAutocompleteTests(TestCase):
+    """Tests del autocompletado de usuarios y entrenadores"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass')
+        self.coach = User.objects.create_user(
+            username='coach_ana', password='pass', is_staff=True, first_name='Ana', last_name='Gómez'
+        )
+        User.objects.create_user(username='coach_bruno', password='pass', is_staff=True)
+        self.maria = User.objects.create_user(username='mperez', password='pass', first_name='María', last_name='Pérez')
+        User.objects.create_user(username='perezj', password='pass', first_name='Juan', last_name='Pérez')
+        User.objects.create_user(username='lsanchez', password='pass', first_name='Luis', last_name='Sánchez')
+        TrainerAssignment.objects.create(user=self.maria, trainer=self.coach, activo=True)
+    
+    def test_index_kept_by_signal(self):
+        """Los usuarios se indexan al guardarse con su rol; los administradores no"""
+        from fit.models import UserSearchIndex
+        roles = dict(UserSearchIndex.objects.values_list('username', 'rol'))
+        self.assertEqual(roles['coach_ana'], 'entrenador')
+        self.assertEqual(roles['mperez'], 'usuario')
+        self.assertNotIn('admin', roles)
+        self.assertEqual(UserSearchIndex.objects.get(username='mperez').texto, 'mperez maria perez')
+    
+    def test_search_substring_accents_and_ranking(self):
+        """Coincidencia por subcadena sin tildes; primero los que empiezan por el término"""
+        from fit.search_service import PeopleSearchService
+        resultados = PeopleSearchService.search('Pérez', 'usuario')
+        self.assertEqual([e.username for e in resultados], ['perezj', 'mperez'])
+        self.assertEqual(resultados[1].entrenador_actual, 'coach_ana')
+        self.assertEqual([e.username for e in PeopleSearchService.search('anch', 'usuario')], ['lsanchez'])
+        # Términos cortos: prefijo de palabra
+        self.assertEqual([e.username for e in PeopleSearchService.search('ls', 'usuario')], ['lsanchez'])
+        self.assertEqual(PeopleSearchService.search('ez', 'usuario'), [])
+    
+    def test_autocomplete_endpoints(self):
+        """Los endpoints devuelven como máximo `limit` resultados en JSON"""
+        self.client.login(username='admin', password='adminpass')
+        response = self.client.get(reverse('admin_autocomplete_trainers'), {'q': 'coach'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0], {
+            'id': self.coach.id, 'username': 'coach_ana', 'nombre': 'Ana Gómez', 'asignados': 1,
+        })
+        response = self.client.get(reverse('admin_autocomplete_users'), {'q': 'perez', 'limit': 1})
+        self.assertEqual(len(response.json()['results']), 1)
+        response = self.client.get(reverse('admin_autocomplete_users'), {'q': 'perez', 'limit': 'x'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_assign_screen_does_not_render_full_lists(self):
+        """La pantalla de asignación solo lista los resultados de la búsqueda"""
+        self.client.login(username='admin', password='adminpass')
+        response = self.client.get(reverse('admin_assign_trainer'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['user'].username for item in response.context['users']], ['mperez'])
+        self.assertNotIn('trainers', response.context)
+        response = self.client.get(reverse('admin_assign_trainer'), {'search_user': 'sanchez'})
+        self.assertEqual([item['user'].username for item in response.context['users']], ['lsanchez'])
+        # Se conserva el orden de relevancia de la búsqueda
+        response = self.client.get(reverse('admin_assign_trainer'), {'search_user': 'perez'})
+        self.assertEqual([item['user'].username for item in response.context['users']], ['perezj', 'mperez'])
+    
+    def test_reindex_only_when_indexed_fields_change(self):
+        """Guardar el usuario sin cambiar sus campos indexados (p. ej. al iniciar sesión) no reindexa"""
+        from unittest import mock
+        from django.utils import timezone
+        from fit.search_service import PeopleSearchService
+        with mock.patch.object(PeopleSearchService, 'index_users') as index_users:
+            self.maria.last_login = timezone.now()
+            self.maria.email = 'maria@example.com'
+            self.maria.save()
+            self.maria.save(update_fields=['last_login'])
+            index_users.assert_not_called()
+            self.maria.last_name = 'Pérez Ruiz'
+            self.maria.save()
+            index_users.assert_called_once_with([self.maria])
+    
+    def test_refresh_skips_already_reviewed_users(self):
+        """refresh indexa los usuarios creados sin señal y no vuelve a revisar a los excluidos"""
+        from unittest import mock
+        from fit.models import UserSearchIndex
+        from fit.search_service import PeopleSearchService
+        PeopleSearchService.refresh(force=True)
+        User.objects.bulk_create([User(username='nuevo', first_name='Nora')])
+        self.assertFalse(UserSearchIndex.objects.filter(username='nuevo').exists())
+        self.assertEqual(PeopleSearchService.refresh(force=True), 1)
+        self.assertEqual(UserSearchIndex.objects.get(username='nuevo').rol, 'usuario')
+        with mock.patch.object(PeopleSearchService, 'index_users') as index_users:
+            PeopleSearchService.refresh(force=True)
+        index_users.assert_not_called()
+
+
+class ModerationQueueTests(TestCase):
+    """Tests de la cola de moderación"""
+    
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass')
+        self.coach = User.objects.create_user(username='coach', password='pass', is_staff=True)
+        self.base = Exercise.objects.create(nombre='Sentadilla', tipo='fuerza')
+        self.ejercicios = [
+            Exercise.objects.create(nombre=f'Propio {i}', tipo='cardio', es_personalizado=True, creado_por=self.coach)
+            for i in range(3)
+        ]
+        self.rutina = Routine.objects.create(nombre='Preset', user=self.coach, es_predisenada=True)
+        Routine.objects.create(nombre='Personal', user=self.coach)
+    
+    def test_migration_backfill_keeps_existing_queue_dates(self):
+        """El relleno de la migración solo fecha los registros que crea; los ya encolados no cambian"""
+        from datetime import datetime, timezone as dt_timezone
+        from importlib import import_module
+        from django.apps import apps
+        from fit.models import ContentModeration
+        migracion = import_module('fit.migrations.0015_moderation_queue')
+        llegada = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        ContentModeration.objects.filter(contenido_id=self.ejercicios[0].id).update(fecha_creacion=llegada)
+        ContentModeration.objects.filter(tipo_contenido='exercise', contenido_id=self.ejercicios[1].id).delete()
+        migracion.enqueue_pending_content(apps, None)
+        fechas = dict(
+            ContentModeration.objects.filter(tipo_contenido='exercise').values_list('contenido_id', 'fecha_creacion')
+        )
+        self.assertEqual(fechas[self.ejercicios[0].id], llegada)
+        self.assertEqual(fechas[self.ejercicios[1].id], Exercise.objects.get(pk=self.ejercicios[1].pk).fecha_creacion)
+    
+    def test_content_enqueued_once_in_arrival_order(self):
+        """Solo el contenido revisable entra en la cola, una vez y por orden de llegada"""
+        from fit.models import ContentModeration
+        from fit.moderation_service import ModerationService
+        self.ejercicios[0].save()
+        cola = list(ModerationService.queue().values_list('tipo_contenido', 'contenido_id'))
+        self.assertEqual(cola, [('exercise', e.id) for e in self.ejercicios] + [('routine', self.rutina.id)])
+        self.assertEqual(ContentModeration.objects.count(), 4)
+        self.assertEqual(ModerationService.queue('routine').count(), 1)
+    
+    def test_bulk_review_in_one_transaction(self):
+        """Aprobar y rechazar en bloque; el rechazo elimina el contenido no usado"""
+        from fit.models import ContentModeration
+        from fit.moderation_service import ModerationService
+        RoutineItem.objects.create(routine=self.rutina, exercise=self.ejercicios[2], orden=1)
+        ids = dict(ModerationService.queue().values_list('contenido_id', 'id').filter(tipo_contenido='exercise'))
+        revisados, _ = ModerationService.review([ids[self.ejercicios[0].id]], 'aprobar', self.admin)
+        self.assertEqual(revisados, 1)
+        rechazar = [ids[self.ejercicios[1].id], ids[self.ejercicios[2].id]]
+        revisados, eliminados = ModerationService.review(rechazar, 'rechazar', self.admin, 'Duplicado')
+        self.assertEqual((revisados, eliminados), (2, 1))
+        self.assertFalse(Exercise.objects.filter(id=self.ejercicios[1].id).exists())
+        # En uso por una rutina: se conserva, rechazado
+        self.assertTrue(Exercise.objects.filter(id=self.ejercicios[2].id).exists())
+        estados = dict(ContentModeration.objects.filter(tipo_contenido='exercise').values_list('contenido_id', 'estado'))
+        self.assertEqual(
+            estados,
+            {self.ejercicios[0].id: 'aprobado', self.ejercicios[1].id: 'rechazado', self.ejercicios[2].id: 'rechazado'},
+        )
+        self.assertEqual(list(ModerationService.queue().values_list('contenido_id', flat=True)), [self.rutina.id])
+    
+    def test_panel_paginated_and_bulk_view(self):
+        """El panel lee una página de la cola y la vista en bloque aplica la acción"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from fit.models import ContentModeration
+        self.client.login(username='admin', password='adminpass')
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('admin_content_moderation'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m.contenido.nombre for m in response.context['cola']], ['Propio 0', 'Propio 1', 'Propio 2', 'Preset'])
+        self.assertFalse(any('NOT' in q['sql'] and 'fit_exercise' in q['sql'] for q in consultas.captured_queries))
+        ids = list(ContentModeration.objects.filter(tipo_contenido='exercise').values_list('id', flat=True))
+        response = self.client.post(reverse('admin_moderation_bulk'), {'accion': 'aprobar', 'moderacion_ids': ids})
+        self.assertRedirects(response, reverse('admin_content_moderation'), fetch_redirect_response=False)
+        self.assertEqual(ContentModeration.objects.filter(estado='aprobado').count(), 3)
+    
+    def test_single_review_and_deleted_content(self):
+        """La revisión individual usa el mismo registro; borrar contenido lo saca de la cola"""
+        from fit.models import ContentModeration
+        self.client.login(username='admin', password='adminpass')
+        self.client.post(reverse('admin_moderate_content', args=['routine', self.rutina.id]), {'accion': 'rechazar'})
+        self.assertFalse(Routine.objects.filter(id=self.rutina.id).exists())
+        self.assertEqual(ContentModeration.objects.get(tipo_contenido='routine').estado, 'rechazado')
+        ejercicio_id = self.ejercicios[0].id
+        self.ejercicios[0].delete()
+        self.assertFalse(ContentModeration.objects.filter(tipo_contenido='exercise', contenido_id=ejercicio_id).exists())
+
+
+class ConfigRegistryTests(TestCase):
+    """Tests del registro tipado y cacheado de configuración"""
+    
+    def setUp(self):
+        from fit.config_service import ConfigService
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass')
+        ConfigService.invalidate()
+        self.addCleanup(ConfigService.invalidate)
+    
+    def test_defaults_types_and_cached_reads(self):
+        """Sin filas se usan los defectos; tras cargar, leer no consulta la BD"""
+        from fit.config_service import ConfigService
+        from fit.models import SystemConfig
+        self.assertEqual(ConfigService.get('capacidad_entrenador'), 30)
+        SystemConfig.objects.create(clave='capacidad_entrenador', valor='12')
+        SystemConfig.objects.create(clave='capacidad_entrenador:coach', valor='4')
+        SystemConfig.objects.create(clave='moderacion_contenido_activa', valor='false')
+        self.assertEqual(ConfigService.get('capacidad_entrenador'), 12)
+        with self.assertNumQueries(0):
+            self.assertEqual(ConfigService.get('capacidad_entrenador', 'coach'), 4)
+            self.assertEqual(ConfigService.get('capacidad_entrenador', 'otro'), 12)
+            self.assertEqual(
+                ConfigService.get_many(['capacidad_entrenador', 'moderacion_contenido_activa']),
+                {'capacidad_entrenador': 12, 'moderacion_contenido_activa': False},
+            )
+    
+    def test_db_version_reloads_other_processes(self):
+        """Un cambio hecho por otro proceso se detecta por la versión de la BD en la siguiente comprobación"""
+        from fit import config_service
+        from fit.config_service import ConfigService
+        from fit.models import SystemConfig
+        self.assertEqual(ConfigService.get('capacidad_entrenador'), 30)
+        version = ConfigService._global_version()
+        # bulk_create no emite señales: simula la escritura de otro proceso
+        SystemConfig.objects.bulk_create([SystemConfig(clave='capacidad_entrenador', valor='7')])
+        with self.assertNumQueries(0):
+            self.assertEqual(ConfigService.get('capacidad_entrenador'), 30)
+        config_service._comprobado = 0.0
+        self.assertEqual(ConfigService.get('capacidad_entrenador'), 7)
+        self.assertNotEqual(ConfigService._global_version(), version)
+        # Los borrados (aquí sin señales) también cambian la versión
+        version = ConfigService._global_version()
+        SystemConfig.objects.filter(clave='capacidad_entrenador')._raw_delete(SystemConfig.objects.db)
+        self.assertNotEqual(ConfigService._global_version(), version)
+        config_service._comprobado = 0.0
+        self.assertEqual(ConfigService.get('capacidad_entrenador'), 30)
+        # Las claves libres (checkpoints) no cambian la versión
+        version = ConfigService._global_version()
+        SystemConfig.objects.create(clave='precompute_reports:2025-01', valor='10')
+        self.assertEqual(ConfigService._global_version(), version)
+    
+    def test_validation_in_admin_view(self):
+        """La pantalla de configuración rechaza valores que no cumplen el tipo declarado"""
+        from fit.config_service import ConfigService
+        from fit.models import SystemConfig
+        self.client.login(username='admin', password='adminpass')
+        url = reverse('admin_system_config')
+        response = self.client.post(url, {'accion': 'crear', 'clave': 'capacidad_entrenador', 'valor': 'muchos'}, follow=True)
+        self.assertFalse(SystemConfig.objects.filter(clave='capacidad_entrenador').exists())
+        self.assertIn('entero', [str(m) for m in response.context['messages']][0])
+        self.client.post(url, {'accion': 'crear', 'clave': 'capacidad_entrenador:coach', 'valor': '-1'})
+        self.assertFalse(SystemConfig.objects.exists())
+        self.client.post(url, {'accion': 'crear', 'clave': 'moderacion_contenido_activa', 'valor': 'NO'})
+        config = SystemConfig.objects.get(clave='moderacion_contenido_activa')
+        self.assertEqual((config.valor, bool(config.descripcion)), ('false', True))
+        self.assertFalse(ConfigService.get('moderacion_contenido_activa'))
+        # Claves libres se guardan tal cual
+        self.client.post(url, {'accion': 'crear', 'clave': 'mensaje_bienvenida', 'valor': 'Hola'})
+        self.assertEqual(SystemConfig.objects.get(clave='mensaje_bienvenida').valor, 'Hola')
+        response = self.client.get(url)
+        declaradas = {d['setting'].clave: d['valor'] for d in response.context['declaradas']}
+        self.assertEqual(declaradas, {'capacidad_entrenador': 30, 'moderacion_contenido_activa': False})
+
+
+class AssignmentHistoryBrowsingTests(TestCase):
+    """Tests del historial de asignaciones: filtros indexados, cursor y exportación CSV"""
+    
+    def setUp(self):
+        from datetime import datetime
+        from django.utils import timezone
+        from fit.models import AssignmentHistory
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass')
+        self.coach = User.objects.create_user(username='coach', password='pass', is_staff=True)
+        self.socios = [User.objects.create_user(username=f'socio{i}', password='pass') for i in range(3)]
+        self.registros = []
+        for i, socio in enumerate(self.socios):
+            asignacion = TrainerAssignment.objects.create(user=socio, trainer=self.coach, activo=True)
+            for dia, accion in ((1, 'creada'), (10, 'desactivada')):
+                registro = AssignmentHistory.objects.create(
+                    assignment=asignacion, accion=accion, administrador=self.admin if accion == 'creada' else None,
+                )
+                self.registros.append(registro)
+                fecha = timezone.make_aware(datetime(2025, 3, dia + i, 12, 0))
+                AssignmentHistory.objects.filter(id=registro.id).update(fecha=fecha)
+    
+    def test_filters_and_date_range(self):
+        """Usuario y entrenador por coincidencia parcial, administrador y acción por igualdad"""
+        from fit.history_service import AssignmentHistoryService
+        def acciones(**filtros):
+            return sorted(
+                (h.assignment.user.username, h.accion) for h in AssignmentHistoryService.filtered(filtros)
+            )
+        self.assertEqual(acciones(user='socio1'), [('socio1', 'creada'), ('socio1', 'desactivada')])
+        self.assertEqual(len(acciones(trainer='coach', accion='desactivada')), 3)
+        self.assertEqual(acciones(admin='admin', desde='2025-03-02', hasta='2025-03-03'), [('socio1', 'creada'), ('socio2', 'creada')])
+        # Usuario y entrenador admiten parte del username o del nombre
+        self.assertEqual(len(acciones(user='socio')), 6)
+        self.assertEqual(len(acciones(trainer='coa', accion='creada')), 3)
+        User.objects.filter(pk=self.socios[2].pk).update(first_name='Lucía', last_name='Rojas')
+        from fit.search_service import PeopleSearchService
+        PeopleSearchService.index_users([User.objects.get(pk=self.socios[2].pk)])
+        self.assertEqual(acciones(user='rojas'), [('socio2', 'creada'), ('socio2', 'desactivada')])
+        self.assertEqual(acciones(user='nadie'), [])
+        # Admin inexistente: sin los registros del sistema
+        self.assertEqual(acciones(admin='nadie'), [])
+        with self.assertRaises(ValueError):
+            AssignmentHistoryService.filtered({'desde': '03/02/2025'})
+    
+    def test_keyset_pages(self):
+        """Las páginas recorren (-fecha, -id) sin repetir ni saltar registros"""
+        from fit.history_service import AssignmentHistoryService
+        historial = AssignmentHistoryService.filtered({})
+        vistos, cursor = [], None
+        while True:
+            pagina, cursor = AssignmentHistoryService.page(historial, cursor=cursor, limit=4)
+            vistos.extend(pagina)
+            if cursor is None:
+                break
+        self.assertEqual([h.id for h in vistos], list(historial.values_list('id', flat=True)))
+        self.assertEqual(len(vistos), 6)
+        fechas = [h.fecha for h in vistos]
+        self.assertEqual(fechas, sorted(fechas, reverse=True))
+    
+    def test_views_page_and_stream_csv(self):
+        """La pantalla pagina con cursor y la exportación CSV se genera en streaming con los filtros"""
+        from fit.activity_feed import encode_cursor
+        self.client.login(username='admin', password='adminpass')
+        url = reverse('admin_assignment_history')
+        response = self.client.get(url, {'accion': 'creada'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([h.assignment.user.username for h in response.context['historial']], ['socio2', 'socio1', 'socio0'])
+        self.assertIsNone(response.context['siguiente'])
+        cursor = encode_cursor(response.context['historial'][0])
+        response = self.client.get(url, {'accion': 'creada', 'cursor': cursor})
+        self.assertEqual([h.assignment.user.username for h in response.context['historial']], ['socio1', 'socio0'])
+        self.assertFalse(response.context['primera_pagina'])
+        response = self.client.get(url, {'desde': 'ayer'})
+        self.assertEqual(len(response.context['historial']), 6)
+        response = self.client.get(reverse('admin_assignment_history_export'), {'user': 'socio2'})
+        self.assertTrue(response.streaming)
+        lineas = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lineas[0], 'fecha,usuario,entrenador,accion,administrador,notas')
+        self.assertEqual(lineas[1:], [
+            '2025-03-12 12:00:00,socio2,coach,desactivada,,',
+            '2025-03-03 12:00:00,socio2,coach,creada,admin,',
+        ])
+
+
+class MongoCircuitBreakerTests(TestCase):
+    """Tests del circuito de disponibilidad de MongoDB"""
+    
+    def setUp(self):
+        from unittest import mock
+        from fit.mongodb_service import MongoCircuitBreaker, MongoDBService
+        self.cliente = mock.MagicMock()
+        self.db = mock.MagicMock()
+        self.db.__getitem__.side_effect = lambda nombre: getattr(self.db, nombre)
+        self.reloj = [1000.0]
+        for parche in (
+            mock.patch.object(MongoDBService, '_client', self.cliente),
+            mock.patch.object(MongoDBService, '_db', self.db),
+            mock.patch.object(MongoDBService, '_indices_aplicados', set()),
+            mock.patch('fit.mongodb_service.time.monotonic', lambda: self.reloj[0]),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+        configuracion = self.settings(MONGODB_ENABLED=True, MONGODB_PROBE_INTERVAL=5, MONGODB_PROBE_MAX_INTERVAL=20)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        MongoCircuitBreaker.reset()
+        self.addCleanup(MongoCircuitBreaker.reset)
+    
+    def test_healthy_path_pings_once(self):
+        """Tras el primer sondeo las llamadas no hacen ping"""
+        from fit.mongodb_service import MongoDBService, TrainerAssignmentService
+        self.db.trainer_assignments.find.return_value.sort.return_value = [{'user_id': 'socio'}]
+        for _ in range(5):
+            self.assertTrue(MongoDBService.is_available())
+        self.assertEqual(TrainerAssignmentService.get_trainer_assignees('coach'), [{'user_id': 'socio'}])
+        self.assertEqual(self.cliente.admin.command.call_count, 1)
+    
+    def test_outage_opens_circuit_with_backoff(self):
+        """Un fallo abre el circuito: sin red hasta el sondeo, con espera creciente y acotada"""
+        from pymongo.errors import ServerSelectionTimeoutError
+        from fit.mongodb_service import MongoCircuitBreaker, MongoDBService, TrainerAssignmentService
+        self.assertTrue(MongoDBService.is_available())
+        self.db.trainer_assignments.find.side_effect = ServerSelectionTimeoutError('caído')
+        self.assertEqual(TrainerAssignmentService.get_trainer_assignees('coach'), [])
+        self.assertEqual(MongoCircuitBreaker.status()['estado'], 'abierto')
+        
+        self.cliente.admin.command.reset_mock()
+        self.cliente.admin.command.side_effect = ServerSelectionTimeoutError('caído')
+        self.assertFalse(MongoDBService.is_available())
+        self.assertIsNone(TrainerAssignmentService.save_assignment(1, 'socio', 'coach'))
+        self.assertEqual(self.cliente.admin.command.call_count, 0)
+        # Sondeos a los 5s, luego 10s y 20s (máximo)
+        esperas = []
+        for _ in range(3):
+            esperas.append(MongoCircuitBreaker.status()['proximo_sondeo_seg'])
+            self.reloj[0] += esperas[-1]
+            self.assertFalse(MongoDBService.is_available())
+        self.assertEqual(esperas, [5, 10, 20])
+        self.assertEqual(MongoCircuitBreaker.status()['proximo_sondeo_seg'], 20)
+        self.assertEqual(self.cliente.admin.command.call_count, 3)
+        
+        # Recuperación: el siguiente sondeo cierra el circuito
+        self.cliente.admin.command.side_effect = None
+        self.reloj[0] += 20
+        self.assertTrue(MongoDBService.is_available())
+        self.assertEqual(MongoCircuitBreaker.status(), {'estado': 'cerrado', 'fallos': 0, 'ultimo_error': None, 'proximo_sondeo_seg': 0})
+    
+    def test_single_probe_in_half_open(self):
+        """En semiabierto solo una llamada sondea"""
+        from fit.mongodb_service import MongoCircuitBreaker
+        self.assertTrue(MongoCircuitBreaker.start_probe())
+        self.assertFalse(MongoCircuitBreaker.start_probe())
+        MongoCircuitBreaker.record_success()
+        self.assertFalse(MongoCircuitBreaker.start_probe())
+
+
+class MongoIndexRegistryTests(TestCase):
+    """Tests del registro declarativo de índices de MongoDB"""
+    
+    def _coleccion(self, indices):
+        from unittest import mock
+        coleccion = mock.MagicMock()
+        coleccion.index_information.return_value = {'_id_': {'key': [('_id', 1)]}, **indices}
+        return coleccion
+    
+    def test_ensure_creates_missing_and_reports_drift(self):
+        """Crea lo que falta, no toca los divergentes y lista los no declarados"""
+        from unittest import mock
+        from fit.mongo_indexes import MongoIndexRegistry
+        coleccion = self._coleccion({
+            'assignment_id_1': {'key': [('assignment_id', 1.0)]},  # falta unique
+            'user_id_1_activo_1': {'key': [('user_id', 1), ('activo', 1)]},
+            'notas_1': {'key': [('notas', 1)]},
+        })
+        db = mock.MagicMock()
+        db.__getitem__.return_value = coleccion
+        informe = MongoIndexRegistry.ensure(db, 'trainer_assignments', dry_run=True)
+        coleccion.create_index.assert_not_called()
+        self.assertEqual(informe, {
+            'faltantes': ['trainer_id_1_activo_1'],
+            'correctos': ['user_id_1_activo_1'],
+            'divergentes': [('assignment_id_1', 'unique=False (se esperaba True)')],
+            'no_declarados': ['notas_1'],
+        })
+        MongoIndexRegistry.ensure(db, 'trainer_assignments')
+        coleccion.create_index.assert_called_once_with([('trainer_id', 1), ('activo', 1)])
+    
+    def test_lazy_once_per_process_and_no_create_index_on_write(self):
+        """Los índices se verifican la primera vez que se usa la colección, no en cada escritura"""
+        from unittest import mock
+        from fit.mongodb_service import MongoCircuitBreaker, MongoDBService, TrainerAssignmentService
+        coleccion = self._coleccion({})
+        db = mock.MagicMock()
+        db.__getitem__.return_value = coleccion
+        with mock.patch.object(MongoDBService, '_db', db), \
+                mock.patch.object(MongoDBService, '_indices_aplicados', set()), \
+                mock.patch.object(MongoCircuitBreaker, 'estado', 'cerrado'), \
+                self.settings(MONGODB_ENABLED=True):
+            for i in range(3):
+                TrainerAssignmentService.save_assignment(i, 'socio', 'coach')
+        self.assertEqual(coleccion.index_information.call_count, 1)
+        self.assertEqual(coleccion.create_index.call_count, 3)
+        self.assertEqual(coleccion.update_one.call_count, 3)
+    
+    def test_command_reports(self):
+        """El comando recorre las colecciones declaradas y falla con --strict si hay divergencias"""
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import CommandError, call_command
+        from fit.mongodb_service import MongoDBService
+        coleccion = self._coleccion({'routine_id_1': {'key': [('routine_id', 1)], 'unique': False}})
+        db = mock.MagicMock()
+        db.__getitem__.return_value = coleccion
+        with mock.patch.object(MongoDBService, 'is_available', return_value=True), \
+                mock.patch.object(MongoDBService, 'get_db', return_value=db):
+            salida = StringIO()
+            call_command('ensure_mongo_indexes', '--collection', 'user_routines', '--dry-run', stdout=salida)
+            self.assertIn('Divergente: routine_id_1 (unique=False (se esperaba True))', salida.getvalue())
+            self.assertIn('[DRY-RUN] Se crearían 2 índices', salida.getvalue())
+            with self.assertRaises(CommandError):
+                call_command('ensure_mongo_indexes', '--collection', 'user_routines', '--strict', stdout=StringIO())
+        with mock.patch.object(MongoDBService, 'is_available', return_value=False):
+            with self.assertRaises(CommandError):
+                call_command('ensure_mongo_indexes', stdout=StringIO())
+
+
+class ActivityLogBufferTests(TestCase):
+    """Tests del buffer de escritura en lote de los logs de actividad"""
+    
+    def setUp(self):
+        from unittest import mock
+        from fit.mongodb_service import MongoDBService
+        self.coleccion = mock.MagicMock()
+        self.coleccion.insert_many.side_effect = lambda docs, ordered: mock.Mock(inserted_ids=[d['n'] for d in docs])
+        for parche in (
+            mock.patch.object(MongoDBService, 'is_available', return_value=True),
+            mock.patch.object(MongoDBService, 'collection', return_value=self.coleccion),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+    
+    def _buffer(self, **opciones):
+        from unittest import mock
+        from fit.mongodb_service import ActivityLogBuffer
+        buffer = ActivityLogBuffer(**opciones)
+        # Sin hilo: los lotes se escriben a mano
+        parche = mock.patch.object(buffer, '_iniciar')
+        parche.start()
+        self.addCleanup(parche.stop)
+        return buffer
+    
+    def test_batches_and_drop_policies(self):
+        """Lotes con insert_many(ordered=False) y cola acotada con descarte"""
+        buffer = self._buffer(max_size=3, batch_size=2, politica='descartar_nuevo')
+        resultados = [buffer.add({'n': i}) for i in range(5)]
+        self.assertEqual(resultados, [True, True, True, False, False])
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual([c.args[0] for c in self.coleccion.insert_many.call_args_list], [[{'n': 0}, {'n': 1}], [{'n': 2}]])
+        self.assertTrue(all(c.kwargs == {'ordered': False} for c in self.coleccion.insert_many.call_args_list))
+        self.assertEqual(buffer.stats(), {'pendientes': 0, 'escritos': 3, 'descartados': 2, 'fallidos': 0})
+        
+        buffer = self._buffer(max_size=3, batch_size=10, politica='descartar_antiguo')
+        for i in range(5):
+            buffer.add({'n': i})
+        self.assertEqual(list(buffer._cola), [{'n': 2}, {'n': 3}, {'n': 4}])
+        
+        # Contrapresión: con la cola llena quien registra escribe un lote
+        buffer = self._buffer(max_size=2, batch_size=2, politica='escribir')
+        self.assertTrue(all(buffer.add({'n': i}) for i in range(3)))
+        self.assertEqual(buffer.stats(), {'pendientes': 1, 'escritos': 2, 'descartados': 0, 'fallidos': 0})
+    
+    def test_failures_counted_and_outage_keeps_queue(self):
+        """Errores parciales cuentan como fallidos; sin MongoDB los documentos esperan"""
+        from unittest import mock
+        from pymongo.errors import AutoReconnect, BulkWriteError
+        from fit.mongodb_service import MongoCircuitBreaker, MongoDBService
+        self.addCleanup(MongoCircuitBreaker.reset)
+        buffer = self._buffer(batch_size=3)
+        for i in range(6):
+            buffer.add({'n': i})
+        self.coleccion.insert_many.side_effect = BulkWriteError({'nInserted': 2, 'writeErrors': [{}]})
+        self.assertEqual(buffer.flush_batch(), 2)
+        self.coleccion.insert_many.side_effect = AutoReconnect('caído')
+        self.assertEqual(buffer.flush_batch(), 0)
+        self.assertEqual(MongoCircuitBreaker.status()['estado'], 'abierto')
+        # El lote que falló por conexión vuelve a la cola en orden
+        self.assertEqual(buffer.stats(), {'pendientes': 3, 'escritos': 2, 'descartados': 0, 'fallidos': 1})
+        self.assertEqual([d['n'] for d in buffer._cola], [3, 4, 5])
+        buffer.add({'n': 6})
+        with mock.patch.object(MongoDBService, 'is_available', return_value=False):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.stats()['pendientes'], 4)
+    
+    def test_retry_counts_duplicates_as_written(self):
+        """Los documentos escritos antes de una caída no cuentan como fallidos al reintentar el lote"""
+        from pymongo.errors import AutoReconnect, BulkWriteError
+        from fit.mongodb_service import MongoCircuitBreaker
+        self.addCleanup(MongoCircuitBreaker.reset)
+        buffer = self._buffer(batch_size=3)
+        for i in range(3):
+            buffer.add({'n': i})
+        def caida(docs, ordered):
+            # Como pymongo: asigna los _id y escribe el primer documento antes de perder la conexión
+            for doc in docs:
+                doc['_id'] = doc['n']
+            raise AutoReconnect('caído')
+        self.coleccion.insert_many.side_effect = caida
+        self.assertEqual(buffer.flush_batch(), 0)
+        MongoCircuitBreaker.reset()
+        self.coleccion.insert_many.side_effect = BulkWriteError({
+            'nInserted': 1,
+            'writeErrors': [{'index': 0, 'code': 11000}, {'index': 2, 'code': 121}],
+        })
+        self.assertEqual(buffer.flush_batch(), 2)
+        self.assertEqual(buffer.stats(), {'pendientes': 0, 'escritos': 2, 'descartados': 0, 'fallidos': 1})
+    
+    def test_requeue_respects_max_size(self):
+        """Si el lote no cabe al volver a la cola se descartan sus documentos más antiguos"""
+        from pymongo.errors import AutoReconnect
+        from fit.mongodb_service import MongoCircuitBreaker
+        self.addCleanup(MongoCircuitBreaker.reset)
+        buffer = self._buffer(batch_size=3, max_size=4)
+        for i in range(4):
+            buffer.add({'n': i})
+        def caida(docs, ordered):
+            # Llegan documentos nuevos mientras se escribe el lote
+            buffer.add({'n': 4})
+            buffer.add({'n': 5})
+            raise AutoReconnect('caído')
+        self.coleccion.insert_many.side_effect = caida
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual([d['n'] for d in buffer._cola], [2, 3, 4, 5])
+        self.assertEqual(buffer.stats()['descartados'], 2)
+        self.assertEqual(buffer.stats()['fallidos'], 0)
+    
+    def test_background_thread_flushes_on_size_and_interval(self):
+        """El hilo escribe al juntar un lote y, con un lote incompleto, al vencer el intervalo"""
+        import time
+        from fit.mongodb_service import ActivityLogBuffer
+        def esperar(buffer, escritos):
+            limite = time.monotonic() + 5
+            while buffer.stats()['escritos'] < escritos and time.monotonic() < limite:
+                time.sleep(0.01)
+            return buffer.stats()['escritos']
+        
+        buffer = ActivityLogBuffer(batch_size=2, flush_interval=60)
+        self.addCleanup(buffer.close)
+        buffer.add({'n': 0})
+        buffer.add({'n': 1})
+        self.assertEqual(esperar(buffer, 2), 2)
+        
+        buffer = ActivityLogBuffer(batch_size=100, flush_interval=0.05)
+        self.addCleanup(buffer.close)
+        buffer.add({'n': 0})
+        self.assertEqual(esperar(buffer, 1), 1)
+    
+    def test_log_activity_enqueues(self):
+        """log_activity encola el documento con su id y no escribe en la petición"""
+        from unittest import mock
+        from bson import ObjectId
+        from fit.mongodb_service import ActivityLogService
+        buffer = self._buffer()
+        with mock.patch.object(ActivityLogService, '_buffer', buffer), self.settings(MONGODB_ENABLED=True):
+            log_id = ActivityLogService.log_activity('socio', 'create_routine', 'routine', 1)
+        self.assertIsInstance(log_id, ObjectId)
+        self.assertEqual(buffer._cola[0]['_id'], log_id)
+        self.coleccion.insert_many.assert_not_called()
+
+
+class InstitutionalServiceTests(TestCase):
+    """Tests de las consultas por lotes a la BD institucional"""
+    
+    def test_missing_tables_roll_back_only_the_statement(self):
+        """Sin tablas institucionales cada consulta falla en su savepoint y la transacción sigue usable"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from fit.institutional_service import InstitutionalService
+        User.objects.create_user(username='socio', password='pass')
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(InstitutionalService.info_many(['socio']), {})
+            self.assertEqual(InstitutionalService.campuses(), [])
+            self.assertEqual(InstitutionalService.search_usernames('ana', User.objects.values_list('username')), [])
+        self.assertEqual(len([q for q in consultas.captured_queries if 'ROLLBACK TO SAVEPOINT' in q['sql']]), 3)
+        self.assertTrue(User.objects.filter(username='socio').exists())
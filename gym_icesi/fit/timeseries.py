@@ -0,0 +1,87 @@
+"""
+Series temporales agregadas.
+Construye series por día, semana o mes con una sola consulta GROUP BY (TruncDay/TruncWeek/
+TruncMonth) y rellena con ceros los periodos sin datos.
+"""
+from datetime import date, timedelta
+
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+TRUNCADORES = {
+    "day": TruncDay,
+    "week": TruncWeek,
+    "month": TruncMonth,
+}
+
+
+def shift_months(fecha, meses):
+    """Primer día del mes desplazado `meses` meses (negativo hacia atrás) desde `fecha`"""
+    total = fecha.year * 12 + (fecha.month - 1) + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def bucket_start(fecha, granularity):
+    """Inicio del periodo que contiene `fecha` (las semanas empiezan el lunes)"""
+    if granularity == "day":
+        return fecha
+    if granularity == "week":
+        return fecha - timedelta(days=fecha.weekday())
+    if granularity == "month":
+        return fecha.replace(day=1)
+    raise ValueError(f"Granularidad no soportada: {granularity}")
+
+
+def next_bucket(inicio, granularity):
+    """Inicio del periodo siguiente"""
+    if granularity == "day":
+        return inicio + timedelta(days=1)
+    if granularity == "week":
+        return inicio + timedelta(weeks=1)
+    return shift_months(inicio, 1)
+
+
+def bucket_starts(granularity, periodos, hasta):
+    """Inicios de los últimos `periodos` periodos hasta `hasta`, del más antiguo al actual"""
+    inicio = bucket_start(hasta, granularity)
+    inicios = [inicio]
+    for _ in range(periodos - 1):
+        if granularity == "month":
+            inicio = shift_months(inicio, -1)
+        else:
+            inicio = inicio - timedelta(days=1 if granularity == "day" else 7)
+        inicios.append(inicio)
+    return list(reversed(inicios))
+
+
+def time_series(queryset, granularity, periodos, hasta=None, field="fecha", **aggregates):
+    """
+    Serie de `periodos` periodos terminando en el que contiene `hasta` (por defecto hoy).
+    Ejecuta una sola consulta agrupada con los `aggregates` indicados y devuelve una lista de
+    dicts {"inicio": date, "fin": date, <aggregate>: valor}; los periodos sin datos valen 0.
+
+        time_series(ProgressLog.objects.filter(user=u), "month", 6,
+                    sesiones=Count("id"), esfuerzo=Avg("esfuerzo"))
+    """
+    if granularity not in TRUNCADORES:
+        raise ValueError(f"Granularidad no soportada: {granularity}")
+    hasta = hasta or date.today()
+    inicios = bucket_starts(granularity, periodos, hasta)
+    fin = next_bucket(inicios[-1], granularity) - timedelta(days=1)
+
+    rows = (
+        queryset.filter(**{f"{field}__range": (inicios[0], fin)})
+        .annotate(periodo=TRUNCADORES[granularity](field))
+        .values("periodo")
+        .annotate(**aggregates)
+        .order_by()
+    )
+    por_periodo = {row.pop("periodo"): row for row in rows}
+
+    serie = []
+    for inicio in inicios:
+        datos = por_periodo.get(inicio, {})
+        punto = {"inicio": inicio, "fin": next_bucket(inicio, granularity) - timedelta(days=1)}
+        for nombre in aggregates:
+            punto[nombre] = datos.get(nombre) or 0
+        serie.append(punto)
+    return serie
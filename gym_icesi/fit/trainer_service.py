@@ -0,0 +1,89 @@
+"""
+Consultas de asignados de un entrenador.
+Las métricas por asignado (sesiones del mes, última sesión, rutinas) se calculan como
+subconsultas anotadas sobre los índices (user, fecha) de ProgressLog y user de Routine,
+de modo que filtrar por nivel de actividad, ordenar y paginar se resuelve en SQL.
+"""
+from datetime import date
+
+from django.db.models import Case, CharField, Count, F, IntegerField, Max, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import ProgressLog, Routine, TrainerAssignment
+from .timeseries import shift_months
+
+# Umbrales de sesiones en el mes para cada nivel de actividad
+NIVEL_ALTO = 10
+NIVEL_MEDIO = 5
+
+FILTROS_ACTIVIDAD = {
+    "alto": Q(sesiones_mes__gte=NIVEL_ALTO),
+    "medio": Q(sesiones_mes__gte=NIVEL_MEDIO, sesiones_mes__lt=NIVEL_ALTO),
+    "bajo": Q(sesiones_mes__lt=NIVEL_MEDIO),
+}
+
+ORDENES = {
+    "recientes": ("-fecha_asignacion", "-id"),
+    "actividad": ("-sesiones_mes", "-id"),
+    "inactivos": ("sesiones_mes", "id"),
+    "ultima_sesion": (F("ultima_sesion").desc(nulls_last=True), "-id"),
+    "usuario": ("user__username", "id"),
+}
+
+
+def _conteo(queryset):
+    """Subconsulta escalar COUNT(*) agrupada por usuario"""
+    return Coalesce(
+        Subquery(queryset.order_by().values("user_id").annotate(n=Count("id")).values("n")[:1]),
+        0,
+        output_field=IntegerField(),
+    )
+
+
+class TrainerAssigneeService:
+    """Servicio de listados de asignados con métricas calculadas en la base de datos"""
+
+    @staticmethod
+    def annotated(trainer, hoy=None):
+        """Asignaciones activas del entrenador con sesiones_mes, ultima_sesion, rutinas_activas y nivel_actividad"""
+        hoy = hoy or date.today()
+        inicio_mes = hoy.replace(day=1)
+        fin_mes = shift_months(hoy, 1)
+        logs = ProgressLog.objects.filter(user_id=OuterRef("user_id"))
+        sesiones_mes = _conteo(logs.filter(fecha__gte=inicio_mes, fecha__lt=fin_mes))
+        return (
+            TrainerAssignment.objects.filter(trainer=trainer, activo=True)
+            .select_related("user")
+            .annotate(
+                sesiones_mes=sesiones_mes,
+                ultima_sesion=Subquery(
+                    logs.order_by().values("user_id").annotate(ultima=Max("fecha")).values("ultima")[:1]
+                ),
+                rutinas_activas=_conteo(Routine.objects.filter(user_id=OuterRef("user_id"))),
+                nivel_actividad=Case(
+                    When(sesiones_mes__gte=NIVEL_ALTO, then=Value("Alto")),
+                    When(sesiones_mes__gte=NIVEL_MEDIO, then=Value("Medio")),
+                    When(sesiones_mes__gt=0, then=Value("Bajo")),
+                    default=Value("Sin actividad"),
+                    output_field=CharField(),
+                ),
+            )
+        )
+
+    @staticmethod
+    def search(queryset, termino, institutional_usernames=()):
+        """Filtra por username o por los usernames que coinciden con el nombre institucional"""
+        if not termino:
+            return queryset
+        return queryset.filter(
+            Q(user__username__icontains=termino) | Q(user__username__in=list(institutional_usernames))
+        )
+
+    @staticmethod
+    def filter_actividad(queryset, actividad):
+        filtro = FILTROS_ACTIVIDAD.get(actividad)
+        return queryset.filter(filtro) if filtro is not None else queryset
+
+    @staticmethod
+    def order(queryset, orden):
+        return queryset.order_by(*ORDENES.get(orden, ORDENES["recientes"]))
@@ -21,6 +21,10 @@ urlpatterns = [
 
     # Módulo entrenador (para entrenadores internos)
     path("trainer/asignados/", views.trainer_assignees, name="trainer_assignees"),
+    path("trainer/cohorte/", views.trainer_cohort, name="trainer_cohort"),
+    path("trainer/cohorte.json", views.trainer_cohort_json, name="trainer_cohort_json"),
+    path("trainer/actividad/", views.trainer_activity_feed, name="trainer_activity_feed"),
+    path("trainer/actividad.json", views.trainer_activity_feed_json, name="trainer_activity_feed_json"),
     path("trainer/feedback/<int:user_id>/", views.trainer_feedback, name="trainer_feedback"),
     path("trainer/rutinas/", views.trainer_routines, name="trainer_routines"),
     path("trainer/rutinas/nueva/", views.trainer_routine_create, name="trainer_routine_create"),
@@ -50,6 +54,8 @@ urlpatterns = [
 
     # Admin: asignar entrenador y recalcular stats
     path("admin/asignar-entrenador/", views.admin_assign_trainer, name="admin_assign_trainer"),
+    path("admin/autocompletar/usuarios.json", views.admin_autocomplete, {"rol": "usuario"}, name="admin_autocomplete_users"),
+    path("admin/autocompletar/entrenadores.json", views.admin_autocomplete, {"rol": "entrenador"}, name="admin_autocomplete_trainers"),
     path("admin/recalc-stats/", views.recalc_stats_month, name="recalc_stats_month"),
     
     # Nuevas funcionalidades
@@ -85,8 +91,12 @@ urlpatterns = [
     # Funcionalidades avanzadas para administrador
     path("admin/usuarios/", views.admin_users_management, name="admin_users_management"),
     path("admin/asignaciones/avanzado/", views.admin_assign_trainer_advanced, name="admin_assign_trainer_advanced"),
+    path("admin/asignaciones/automatica/", views.admin_auto_assign, name="admin_auto_assign"),
+    path("admin/asignaciones/importar/", views.admin_import_assignments, name="admin_import_assignments"),
     path("admin/asignaciones/historial/", views.admin_assignment_history, name="admin_assignment_history"),
+    path("admin/asignaciones/historial/exportar.csv", views.admin_assignment_history_export, name="admin_assignment_history_export"),
     path("admin/moderacion/", views.admin_content_moderation, name="admin_content_moderation"),
+    path("admin/moderacion/lote/", views.admin_moderation_bulk, name="admin_moderation_bulk"),
     path("admin/moderacion/<str:tipo>/<int:contenido_id>/", views.admin_moderate_content, name="admin_moderate_content"),
     path("admin/analytics/", views.admin_analytics, name="admin_analytics"),
     path("admin/config/", views.admin_system_config, name="admin_system_config"),
@@ -1,15 +1,23 @@
 # fit/views.py
 from datetime import date, timedelta
 from calendar import monthrange
+import csv
+import io
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
-from django.db import connection
-from django.db.models import Count, Sum, Max, Avg, Q
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.http import JsonResponse, StreamingHttpResponse
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, Sum, Max, Avg, F, Q
+from django.db.models.functions import Cast, Round
 from django.db import models as django_models
 from django.utils import timezone
+from django.utils.http import urlencode
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 
 from .models import (
     Exercise,
@@ -17,7 +25,6 @@ from .models import (
     RoutineItem,
     ProgressLog,
     TrainerAssignment,
-    UserMonthlyStats,
     TrainerMonthlyStats,
     TrainerRecommendation,
     UserProfile,
@@ -29,12 +36,18 @@ from .models import (
     AssignmentHistory,
     ContentModeration,
     SystemConfig,
+    TestAccount,
+    FacultyActivitySummary,
+    TrainerEffectivenessSummary,
+    ExercisePopularitySummary,
+    RoutinePopularitySummary,
 )
 from .forms import (
     RoutineForm, RoutineItemForm, ProgressForm, ExerciseForm, TrainerRecommendationForm,
     UserProfileForm, MessageForm, ReservaEspacioForm
 )
 from fit.institutional_models import InstitutionalUser
+from fit.institutional_service import InstitutionalService
 from fit.mongodb_service import (
     ProgressLogService,
     ActivityLogService,
@@ -43,6 +56,25 @@ from fit.mongodb_service import (
     RoutineService,
     TrainerAssignmentService,
 )
+from fit.activity_feed import ActivityFeedService, parse_since
+from fit.admin_user_service import AdminUserService
+from fit.analytics_service import TrainingAnalyticsService
+from fit.assignment_import import AssignmentImportService
+from fit.assignment_service import AFINIDAD_NOMBRES, TrainerAutoAssignService
+from fit.cohort_service import TrainerCohortService
+from fit.composition_service import RoutineCompositionService
+from fit.config_service import REGISTRO, ConfigService
+from fit.history_service import FILTROS, AssignmentHistoryService
+from fit import reports
+from fit.moderation_service import ModerationService
+from fit.report_cache import ReportCache
+from fit.report_snapshots import ReportSnapshotService, month_key
+from fit.rollup_service import DailyActivityService, summarize as summarize_activity
+from fit.search_service import LIMITE_DEFECTO, LIMITE_MAXIMO, PeopleSearchService
+from fit.stats_service import StatsDispatcher, StatsRecalculator
+from fit.streak_service import StreakService
+from fit.timeseries import time_series
+from fit.trainer_service import TrainerAssigneeService
 
 
 # ----------------------------- Página de Inicio / Selección de Login -----------------------------
@@ -152,21 +184,19 @@ def home(request):
     total_sessions = ProgressLog.objects.filter(user=user).count()
 
     today = date.today()
-    current_month_sessions = ProgressLog.objects.filter(
-        user=user, fecha__year=today.year, fecha__month=today.month
-    )
-    monthly_count = current_month_sessions.count()
-    active_days = current_month_sessions.values("fecha").distinct().count()
+    # Resumen del mes desde el rollup diario (máximo 31 filas)
+    resumen_mes = summarize_activity(DailyActivityService.rows(
+        user, date(today.year, today.month, 1),
+        date(today.year, today.month, monthrange(today.year, today.month)[1]),
+    ))
+    monthly_count = resumen_mes["sesiones"]
+    active_days = resumen_mes["dias_activos"]
     
     # Tiempo total entrenado este mes (en minutos)
-    total_time_minutes = current_month_sessions.aggregate(
-        total=Sum("tiempo_seg")
-    )["total"] or 0
+    total_time_minutes = resumen_mes["tiempo_total"]
     total_time_hours = round(total_time_minutes / 60, 1) if total_time_minutes else 0
     
-    avg_effort = current_month_sessions.aggregate(avg=Sum("esfuerzo"))["avg"] or 0
-    if monthly_count:
-        avg_effort = round(avg_effort / monthly_count, 1)
+    avg_effort = round(resumen_mes["esfuerzo_promedio"], 1) if monthly_count else 0
     
     # Entrenador asignado
     trainer_assignment = TrainerAssignment.objects.filter(
@@ -650,19 +680,22 @@ def routine_add_item(request, pk):
 @login_required
 def routine_adopt(request, pk):
     preset = get_object_or_404(Routine, pk=pk, es_predisenada=True)
-    nueva = Routine.objects.create(
-        user=request.user, nombre=f"{preset.nombre} (mi copia)"
-    )
-    for i in preset.items.all():
-        RoutineItem.objects.create(
-            routine=nueva,
-            exercise=i.exercise,
-            orden=i.orden,
-            series=i.series,
-            reps=i.reps,
-            tiempo_seg=i.tiempo_seg,
-            notas=i.notas,
-        )
+    # Rutina e items en una transacción: estadísticas actualizadas una vez al confirmar
+    with StatsDispatcher.coalesce():
+        nueva = Routine(user=request.user, nombre=f"{preset.nombre} (mi copia)")
+        # Para que la señal registre la adopción en el feed del entrenador
+        nueva._preset_origen = preset
+        nueva.save()
+        for i in preset.items.all():
+            RoutineItem.objects.create(
+                routine=nueva,
+                exercise=i.exercise,
+                orden=i.orden,
+                series=i.series,
+                reps=i.reps,
+                tiempo_seg=i.tiempo_seg,
+                notas=i.notas,
+            )
     messages.success(request, "Rutina adoptada.")
     return redirect("routine_detail", pk=nueva.pk)
 
@@ -779,13 +812,12 @@ def progress_list(request):
     
     # Estadísticas del mes actual
     today = date.today()
-    current_month_logs = ProgressLog.objects.filter(
-        user=user,
-        fecha__year=today.year,
-        fecha__month=today.month
-    )
-    total_sessions_month = current_month_logs.count()
-    total_time_month = current_month_logs.aggregate(total=Sum("tiempo_seg"))["total"] or 0
+    resumen_mes = summarize_activity(DailyActivityService.rows(
+        user, date(today.year, today.month, 1),
+        date(today.year, today.month, monthrange(today.year, today.month)[1]),
+    ))
+    total_sessions_month = resumen_mes["sesiones"]
+    total_time_month = resumen_mes["tiempo_total"]
     total_time_hours_month = round(total_time_month / 3600, 1) if total_time_month else 0
     
     return render(request, "fit/progress_list.html", {
@@ -852,6 +884,12 @@ def trainer_detail(request, emp_id: str):
 
 
 # ------------------------------- Módulo trainer ------------------------------
+ASIGNADOS_POR_PAGINA = 24
+USUARIOS_POR_PAGINA = 50
+USUARIOS_BUSQUEDA = 50
+MODERACION_POR_PAGINA = 25
+
+
 def is_trainer(u):
     """
     Verifica si un usuario es entrenador.
@@ -892,82 +930,111 @@ def is_admin(user):
 def trainer_assignees(request):
     """
     Lista de usuarios asignados al entrenador con información de actividad y filtros.
+    Filtro de actividad, búsqueda y orden se resuelven en SQL; la página se completa con
+    los datos institucionales de sus usuarios en un número fijo de consultas.
     """
     trainer = request.user
-    asignados = TrainerAssignment.objects.filter(
-        trainer=trainer, activo=True
-    ).select_related("user").order_by("-fecha_asignacion")
-    
-    # Filtros
-    search_query = request.GET.get("q", "")
+    search_query = request.GET.get("q", "").strip()
     actividad_filter = request.GET.get("actividad", "")
-    
+    orden = request.GET.get("orden", "recientes")
+
+    asignados = TrainerAssigneeService.annotated(trainer)
     if search_query:
-        asignados = asignados.filter(
-            user__username__icontains=search_query
+        coincidencias = InstitutionalService.search_usernames(
+            search_query,
+            TrainerAssignment.objects.filter(trainer=trainer, activo=True).values_list("user__username"),
         )
-    
-    # Agregar información detallada para cada asignado
-    asignados_con_info = []
-    for asignado in asignados:
-        user = asignado.user
-        user_info = get_institutional_info(user.username)
-        
-        # Última sesión
-        ultima_sesion = ProgressLog.objects.filter(
-            user=user
-        ).order_by("-fecha").first()
-        
-        # Sesiones este mes
-        hoy = date.today()
-        sesiones_mes = ProgressLog.objects.filter(
-            user=user,
-            fecha__year=hoy.year,
-            fecha__month=hoy.month
-        ).count()
-        
-        # Nivel de actividad
-        if sesiones_mes >= 10:
-            nivel_actividad = "Alto"
-        elif sesiones_mes >= 5:
-            nivel_actividad = "Medio"
-        elif sesiones_mes > 0:
-            nivel_actividad = "Bajo"
-        else:
-            nivel_actividad = "Sin actividad"
-        
-        # Aplicar filtro de actividad
-        if actividad_filter:
-            if actividad_filter == "alto" and nivel_actividad != "Alto":
-                continue
-            elif actividad_filter == "medio" and nivel_actividad != "Medio":
-                continue
-            elif actividad_filter == "bajo" and nivel_actividad not in ["Bajo", "Sin actividad"]:
-                continue
-        
-        # Rutinas activas
-        rutinas_activas = Routine.objects.filter(user=user).count()
-        
-        asignados_con_info.append({
+        asignados = TrainerAssigneeService.search(asignados, search_query, coincidencias)
+    asignados = TrainerAssigneeService.filter_actividad(asignados, actividad_filter)
+    asignados = TrainerAssigneeService.order(asignados, orden)
+
+    page_obj = Paginator(asignados, ASIGNADOS_POR_PAGINA).get_page(request.GET.get("page"))
+    info = InstitutionalService.info_many(a.user.username for a in page_obj)
+    asignados_con_info = [
+        {
             "assignment": asignado,
-            "user_info": user_info,
-            "ultima_sesion": ultima_sesion,
-            "sesiones_mes": sesiones_mes,
-            "nivel_actividad": nivel_actividad,
-            "rutinas_activas": rutinas_activas,
-        })
-    
+            "user_info": info.get(asignado.user.username, {}),
+            "ultima_sesion": asignado.ultima_sesion,
+            "sesiones_mes": asignado.sesiones_mes,
+            "nivel_actividad": asignado.nivel_actividad,
+            "rutinas_activas": asignado.rutinas_activas,
+        }
+        for asignado in page_obj
+    ]
+
     return render(
         request,
         "fit/trainer_assignees.html",
         {
             "asignados": asignados_con_info,
+            "page_obj": page_obj,
             "search_query": search_query,
             "actividad_filter": actividad_filter,
+            "orden": orden,
         },
     )
 
 
+@login_required
+@user_passes_test(is_trainer)
+def trainer_cohort(request):
+    """
+    Comparación de los asignados del entrenador: métricas de las últimas semanas y
+    percentil de cada asignado dentro de su cohorte.
+    """
+    cohorte = TrainerCohortService.get(request.user.id)
+    info = InstitutionalService.info_many(fila["username"] for fila in cohorte["asignados"])
+    filas = [
+        {**fila, "user_info": info.get(fila["username"], {})}
+        for fila in cohorte["asignados"]
+    ]
+    return render(
+        request,
+        "fit/trainer_cohort.html",
+        {"cohorte": cohorte, "filas": filas},
+    )
+
+
+@login_required
+@user_passes_test(is_trainer)
+def trainer_cohort_json(request):
+    """Cohorte del entrenador en JSON (mismos datos que trainer_cohort)"""
+    return JsonResponse(TrainerCohortService.get(request.user.id))
+
+
+@login_required
+@user_passes_test(is_trainer)
+def trainer_activity_feed(request):
+    """Feed de actividad de los asignados del entrenador, del más reciente al más antiguo"""
+    try:
+        eventos, siguiente = ActivityFeedService.feed(request.user, cursor=request.GET.get("cursor"))
+    except ValueError:
+        eventos, siguiente = ActivityFeedService.feed(request.user)
+    return render(
+        request,
+        "fit/trainer_activity_feed.html",
+        {"eventos": eventos, "siguiente": siguiente, "primera_pagina": not request.GET.get("cursor")},
+    )
+
+
+@login_required
+@user_passes_test(is_trainer)
+def trainer_activity_feed_json(request):
+    """
+    Feed de actividad en JSON.
+    Parámetros: cursor (página siguiente) y since (solo eventos posteriores, fecha ISO).
+    """
+    try:
+        since = parse_since(request.GET["since"]) if request.GET.get("since") else None
+        eventos, siguiente = ActivityFeedService.feed(request.user, cursor=request.GET.get("cursor"), since=since)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({
+        "eventos": [ActivityFeedService.serialize(e) for e in eventos],
+        "siguiente": siguiente,
+    })
+
+
 @login_required
 @user_passes_test(is_trainer)
 def trainer_feedback(request, user_id):
@@ -1015,19 +1082,12 @@ def trainer_feedback(request, user_id):
     rutinas_activas = routines.count()
     
     # Tendencia de actividad (últimos 3 meses)
-    tendencia = []
-    for i in range(3):
-        mes_fecha = date(hoy.year, hoy.month - i, 1) if hoy.month > i else date(hoy.year - 1, 12 + hoy.month - i, 1)
-        sesiones = ProgressLog.objects.filter(
-            user=tuser,
-            fecha__year=mes_fecha.year,
-            fecha__month=mes_fecha.month
-        ).count()
-        tendencia.append({
-            "mes": mes_fecha.strftime("%b %Y"),
-            "sesiones": sesiones,
-        })
-    tendencia.reverse()
+    tendencia = [
+        {"mes": punto["inicio"].strftime("%b %Y"), "sesiones": punto["sesiones"]}
+        for punto in time_series(
+            ProgressLog.objects.filter(user=tuser), "month", 3, hasta=hoy, sesiones=Count("id")
+        )
+    ]
     
     return render(
         request,
@@ -1131,6 +1191,9 @@ def trainers_view(request):
 
 
 # ------------------------------- Reportes/Admin ------------------------------
+# Reportes cuyo contexto se guarda en ReportCache (ver fit/report_cache.py)
+REPORTES_CACHEADOS = ["progress", "adherence", "load_balance", "progress_trend", "achievements"]
+
 @login_required
 def report_adherence(request):
     """
@@ -1146,130 +1209,37 @@ def report_adherence(request):
     month = int(request.GET.get("month", hoy.month))
     
     try:
-        inicio = date(year, month, 1)
-        fin = date(year, month, monthrange(year, month)[1])
-        dias_del_mes = monthrange(year, month)[1]
+        reports.month_bounds(year, month)
     except (ValueError, TypeError):
-        inicio = date(hoy.year, hoy.month, 1)
-        fin = date(hoy.year, hoy.month, monthrange(hoy.year, hoy.month)[1])
-        dias_del_mes = monthrange(hoy.year, hoy.month)[1]
         year = hoy.year
         month = hoy.month
 
-    logs = ProgressLog.objects.filter(user=user, fecha__range=(inicio, fin))
-    dias_activos = logs.values("fecha").distinct().count()
-    total_sesiones = logs.count()
-    porcentaje_adherencia = round((dias_activos / dias_del_mes) * 100, 1) if dias_del_mes > 0 else 0
-    
-    # Calcular racha actual (días consecutivos entrenando)
-    racha_actual = 0
-    fecha_actual = hoy
-    while True:
-        if ProgressLog.objects.filter(user=user, fecha=fecha_actual).exists():
-            racha_actual += 1
-            fecha_actual -= timedelta(days=1)
-        else:
-            break
-    
-    # Días planificados (asumiendo que las rutinas sugieren ciertos días)
-    # Por ahora, calculamos basado en rutinas activas
-    rutinas_activas = Routine.objects.filter(user=user).count()
-    # Estimación: si tiene rutinas, asumimos que planifica entrenar 3-4 veces por semana
-    dias_planificados_estimados = round((dias_del_mes / 7) * 3.5) if rutinas_activas > 0 else 0
-    
-    por_tipo = (
-        logs.values("routine__items__exercise__tipo")
-        .annotate(sesiones=Count("id"))
-        .order_by()
-    )
-    
-    # Esfuerzo promedio
-    esfuerzo_promedio = logs.aggregate(avg=Avg("esfuerzo"))["avg"] or 0
-    esfuerzo_promedio = round(esfuerzo_promedio, 1)
-    
-    # Rutinas más usadas
-    rutinas_mas_usadas = (
-        logs.values("routine__nombre")
-        .annotate(veces=Count("id"))
-        .order_by("-veces")[:5]
-    )
-    
-    # Porcentaje de cumplimiento (días entrenados vs planificados)
-    porcentaje_cumplimiento = 0
-    if dias_planificados_estimados > 0:
-        porcentaje_cumplimiento = round((dias_activos / dias_planificados_estimados) * 100, 1)
-    
-    # Mejor semana del mes
-    sesiones_por_semana = {}
-    for log in logs:
-        semana = (log.fecha.day - 1) // 7 + 1
-        sesiones_por_semana[semana] = sesiones_por_semana.get(semana, 0) + 1
-    mejor_semana = None
-    if sesiones_por_semana:
-        mejor_semana = max(sesiones_por_semana.items(), key=lambda x: x[1])
+    def calcular():
+        # Snapshot precalculado (precompute_reports) o cálculo desde los datos
+        return ReportSnapshotService.get_or_compute(
+            "adherence", user.id, month_key(year, month),
+            lambda: reports.adherence_context(user, year, month),
+        )
 
-    return render(
-        request,
-        "fit/report_adherence.html",
-        {
-            "year": year,
-            "month": month,
-            "dias_activos": dias_activos,
-            "total_sesiones": total_sesiones,
-            "dias_del_mes": dias_del_mes,
-            "dias_planificados_estimados": dias_planificados_estimados,
-            "porcentaje_adherencia": porcentaje_adherencia,
-            "porcentaje_cumplimiento": porcentaje_cumplimiento,
-            "racha_actual": racha_actual,
-            "esfuerzo_promedio": esfuerzo_promedio,
-            "por_tipo": por_tipo,
-            "rutinas_mas_usadas": rutinas_mas_usadas,
-            "mejor_semana": mejor_semana,
-            "periodo": (inicio, fin),
-        },
-    )
+    context = dict(ReportCache.monthly("adherence", user.id, year, month, calcular, hoy=hoy))
+    # Racha actual (días consecutivos entrenando), mantenida por StreakService
+    context["racha_actual"] = StreakService.current_streak(user, hoy)
+    return render(request, "fit/report_adherence.html", context)
 
 
 @login_required
 def report_load_balance(request):
     """Reporte mejorado de balance de carga"""
-    agg = (
-        ProgressLog.objects.filter(user=request.user)
-        .values("routine__items__exercise__tipo")
-        .annotate(
-            total_reps=Sum("repeticiones"),
-            total_tiempo=Sum("tiempo_seg"),
-            sesiones=Count("id"),
-        )
-        .order_by()
-    )
-    
-    # Calcular totales
-    total_reps_all = sum(item["total_reps"] or 0 for item in agg)
-    total_tiempo_all = sum(item["total_tiempo"] or 0 for item in agg)
-    
-    # Evolución semanal (últimas 4 semanas)
     hoy = date.today()
-    semanas = []
-    for i in range(4):
-        semana_inicio = hoy - timedelta(days=hoy.weekday() + (i * 7))
-        semana_fin = semana_inicio + timedelta(days=6)
-        sesiones_semana = ProgressLog.objects.filter(
-            user=request.user,
-            fecha__range=(semana_inicio, semana_fin)
-        ).count()
-        semanas.append({
-            "inicio": semana_inicio,
-            "fin": semana_fin,
-            "sesiones": sesiones_semana,
-        })
-    
-    return render(request, "fit/report_load_balance.html", {
-        "agg": agg,
-        "total_reps_all": total_reps_all,
-        "total_tiempo_all": total_tiempo_all,
-        "semanas": reversed(semanas),
-    })
+
+    def calcular():
+        return ReportSnapshotService.get_or_compute(
+            "load_balance", request.user.id, hoy.isoformat(),
+            lambda: reports.load_balance_context(request.user, hoy),
+        )
+
+    context = ReportCache.rolling("load_balance", request.user.id, calcular, hoy=hoy)
+    return render(request, "fit/report_load_balance.html", context)
 
 
 @login_required
@@ -1286,74 +1256,19 @@ def report_progress(request):
     month = int(request.GET.get("month", hoy.month))
     
     try:
-        inicio = date(year, month, 1)
-        fin = date(year, month, monthrange(year, month)[1])
+        reports.month_bounds(year, month)
     except (ValueError, TypeError):
-        inicio = date(hoy.year, hoy.month, 1)
-        fin = date(hoy.year, hoy.month, monthrange(hoy.year, hoy.month)[1])
         year = hoy.year
         month = hoy.month
     
-    # Logs del mes seleccionado
-    logs = ProgressLog.objects.filter(user=user, fecha__range=(inicio, fin))
-    
-    # Estadísticas básicas
-    total_sesiones = logs.count()
-    dias_activos = logs.values("fecha").distinct().count()
-    total_tiempo_seg = logs.aggregate(total=Sum("tiempo_seg"))["total"] or 0
-    total_tiempo_horas = round(total_tiempo_seg / 3600, 1) if total_tiempo_seg else 0
-    
-    # Rutinas diferentes usadas
-    rutinas_usadas = logs.values("routine__nombre").distinct().count()
-    
-    # Esfuerzo promedio
-    esfuerzo_promedio = logs.aggregate(avg=Avg("esfuerzo"))["avg"] or 0
-    esfuerzo_promedio = round(esfuerzo_promedio, 1)
-    
-    # Sesiones por semana del mes (para gráfica de barras)
-    sesiones_por_semana = {}
-    for log in logs:
-        semana = (log.fecha.day - 1) // 7 + 1
-        sesiones_por_semana[semana] = sesiones_por_semana.get(semana, 0) + 1
-    
-    # Distribución por tipo de ejercicio (para gráfica de pastel)
-    distribucion_tipo = {}
-    for log in logs:
-        tipos = log.routine.items.values_list("exercise__tipo", flat=True).distinct()
-        for tipo in tipos:
-            if tipo:
-                distribucion_tipo[tipo] = distribucion_tipo.get(tipo, 0) + 1
-    
-    # Hitos del mes
-    hitos = []
-    if total_sesiones > 0:
-        hitos.append(f"Primera sesión del mes: {logs.order_by('fecha').first().fecha.strftime('%d de %B')}")
-    if total_sesiones >= 10:
-        hitos.append(f"¡10+ sesiones completadas este mes!")
-    if dias_activos >= 15:
-        hitos.append(f"¡15+ días activos este mes!")
-    if esfuerzo_promedio >= 8:
-        hitos.append(f"¡Esfuerzo promedio alto ({esfuerzo_promedio}/10)!")
-    
-    # Semana con más sesiones
-    if sesiones_por_semana:
-        semana_max = max(sesiones_por_semana.items(), key=lambda x: x[1])
-        hitos.append(f"Mejor semana: Semana {semana_max[0]} con {semana_max[1]} sesiones")
-    
-    return render(request, "fit/report_progress.html", {
-        "year": year,
-        "month": month,
-        "inicio": inicio,
-        "fin": fin,
-        "total_sesiones": total_sesiones,
-        "dias_activos": dias_activos,
-        "total_tiempo_horas": total_tiempo_horas,
-        "rutinas_usadas": rutinas_usadas,
-        "esfuerzo_promedio": esfuerzo_promedio,
-        "sesiones_por_semana": sesiones_por_semana,
-        "distribucion_tipo": distribucion_tipo,
-        "hitos": hitos,
-    })
+    def calcular():
+        return ReportSnapshotService.get_or_compute(
+            "progress", user.id, month_key(year, month),
+            lambda: reports.progress_context(user, year, month),
+        )
+
+    context = ReportCache.monthly("progress", user.id, year, month, calcular, hoy=hoy)
+    return render(request, "fit/report_progress.html", context)
 
 
 @login_required
@@ -1361,77 +1276,65 @@ def report_progress_trend(request):
     """Nuevo informe: Tendencias de progreso"""
     # Progreso de los últimos 3 meses
     hoy = date.today()
-    meses_datos = []
-    
-    for i in range(3):
-        mes_fecha = date(hoy.year, hoy.month - i, 1) if hoy.month > i else date(hoy.year - 1, 12 + hoy.month - i, 1)
-        anio_mes = mes_fecha.year
-        mes_num = mes_fecha.month
-        
-        logs_mes = ProgressLog.objects.filter(
-            user=request.user,
-            fecha__year=anio_mes,
-            fecha__month=mes_num
+
+    def calcular():
+        serie = time_series(
+            ProgressLog.objects.filter(user=request.user), "month", 3, hasta=hoy,
+            sesiones=Count("id"),
+            esfuerzo_promedio=Avg("esfuerzo"),
+            rutinas_activas=Count("routine", distinct=True),
         )
-        
-        esfuerzo_avg = logs_mes.aggregate(avg=Avg("esfuerzo"))["avg"] or 0
-        
-        meses_datos.append({
-            "mes": mes_fecha.strftime("%B %Y"),
-            "sesiones": logs_mes.count(),
-            "esfuerzo_promedio": round(esfuerzo_avg, 1) if logs_mes.count() > 0 else 0,
-            "rutinas_activas": logs_mes.values("routine").distinct().count(),
-        })
-    
-    return render(request, "fit/report_progress_trend.html", {
-        "meses_datos": reversed(meses_datos),
-    })
+        meses_datos = [
+            {
+                "mes": punto["inicio"].strftime("%B %Y"),
+                "sesiones": punto["sesiones"],
+                "esfuerzo_promedio": round(punto["esfuerzo_promedio"], 1),
+                "rutinas_activas": punto["rutinas_activas"],
+            }
+            for punto in serie
+        ]
+
+        return {"meses_datos": meses_datos}
+
+    context = ReportCache.rolling("progress_trend", request.user.id, calcular, hoy=hoy)
+    return render(request, "fit/report_progress_trend.html", context)
 
 
 @login_required
 def report_achievements(request):
     """Nuevo informe: Logros y metas"""
-    total_rutinas = Routine.objects.filter(user=request.user).count()
-    total_sesiones = ProgressLog.objects.filter(user=request.user).count()
-    dias_consecutivos = 0
-    
-    # Calcular días consecutivos (desde hoy hacia atrás)
     hoy = date.today()
-    dias_consecutivos = 0
-    fecha_actual = hoy
-    
-    # Verificar si hay actividad hoy
-    if ProgressLog.objects.filter(user=request.user, fecha=hoy).exists():
-        dias_consecutivos = 1
-        fecha_actual = hoy - timedelta(days=1)
+
+    def calcular():
+        total_rutinas = Routine.objects.filter(user=request.user).count()
+        total_sesiones = ProgressLog.objects.filter(user=request.user).count()
         
-        # Continuar contando hacia atrás
-        while True:
-            if ProgressLog.objects.filter(user=request.user, fecha=fecha_actual).exists():
-                dias_consecutivos += 1
-                fecha_actual = fecha_actual - timedelta(days=1)
-            else:
-                break
-    
-    # Rutina más usada
-    rutina_mas_usada = (
-        ProgressLog.objects.filter(user=request.user)
-        .values("routine__nombre")
-        .annotate(veces=Count("id"))
-        .order_by("-veces")
-        .first()
-    )
-    
-    # Mejor esfuerzo
-    mejor_esfuerzo = ProgressLog.objects.filter(user=request.user).aggregate(max_effort=Max("esfuerzo"))["max_effort"] or 0
+        # Rutina más usada
+        rutina_mas_usada = (
+            ProgressLog.objects.filter(user=request.user)
+            .values("routine__nombre")
+            .annotate(veces=Count("id"))
+            .order_by("-veces")
+            .first()
+        )
+        
+        # Mejor esfuerzo
+        mejor_esfuerzo = ProgressLog.objects.filter(user=request.user).aggregate(max_effort=Max("esfuerzo"))["max_effort"] or 0
+
+        return {
+            "total_rutinas": total_rutinas,
+            "total_sesiones": total_sesiones,
+            "rutina_mas_usada": rutina_mas_usada,
+            "mejor_esfuerzo": mejor_esfuerzo,
+        }
+
+    context = dict(ReportCache.rolling("achievements", request.user.id, calcular, hoy=hoy))
     
-    return render(request, "fit/report_achievements.html", {
-        "total_rutinas": total_rutinas,
-        "total_sesiones": total_sesiones,
-        "dias_consecutivos": dias_consecutivos,
-        "rutina_mas_usada": rutina_mas_usada,
-        "mejor_esfuerzo": mejor_esfuerzo,
-    })
+    # Días consecutivos (desde hoy hacia atrás) y mejor racha histórica
+    streak = StreakService.get(request.user)
+    context["dias_consecutivos"] = StreakService.current_streak(request.user, hoy, streak=streak)
+    context["racha_maxima"] = streak.racha_maxima
+    return render(request, "fit/report_achievements.html", context)
 
 
 @login_required
@@ -1508,250 +1411,77 @@ def admin_assign_trainer(request):
         messages.success(request, f"Entrenador asignado exitosamente a {user.username}.")
         return redirect("admin_assign_trainer")
 
-    # Búsqueda de usuarios
-    search_user = request.GET.get("search_user", "")
-    search_trainer = request.GET.get("search_trainer", "")
-    
-    # Obtener usuarios directamente de la BD institucional
-    # Incluir: Estudiantes (STUDENT) y Empleados que NO sean Instructores ni Administrativos (Docentes)
-    users_from_db = []
-    try:
-        with connection.cursor() as cur:
-            cur.execute("""
-                SELECT u.username, u.role, u.student_id, u.employee_id
-                FROM users u
-                WHERE u.is_active = TRUE
-                AND u.username NOT LIKE 'test%'
-                AND (
-                    u.role = 'STUDENT'
-                    OR (
-                        u.role = 'EMPLOYEE' 
-                        AND u.employee_id IS NOT NULL
-                        AND EXISTS (
-                            SELECT 1 FROM employees e 
-                            WHERE e.id = u.employee_id 
-                            AND UPPER(e.employee_type) NOT IN ('INSTRUCTOR', 'ADMINISTRATIVO')
-                        )
-                    )
-                )
-                ORDER BY u.username
-            """)
-            for row in cur.fetchall():
-                username, role, student_id, employee_id = row
-                
-                # Filtrar usuarios de prueba
-                if 'test' in username.lower():
-                    continue
-                
-                # Aplicar búsqueda si existe
-                if search_user and search_user.lower() not in username.lower():
-                    continue
-                
-                # Obtener o crear usuario Django si no existe
-                user, created = User.objects.get_or_create(
-                    username=username,
-                    defaults={'is_staff': False, 'is_superuser': False}
-                )
-                
-                # Asegurar que no sea staff ni superuser (son usuarios estándar)
-                if not created:
-                    if user.is_staff or user.is_superuser:
-                        # Verificar si realmente debería ser usuario estándar
-                        # (por si cambió su rol en la BD institucional)
-                        user.is_staff = False
-                        user.is_superuser = False
-                        user.save()
-                
-                # Obtener información institucional
-                user_info = get_institutional_info(username)
-                
-                # Obtener asignación actual
-                current_assignment = TrainerAssignment.objects.filter(
-                    user=user, activo=True
-                ).select_related("trainer").first()
-                
-                users_from_db.append({
-                    "user": user,
-                    "user_info": user_info,
-                    "current_assignment": current_assignment,
-                })
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Error al obtener usuarios de BD institucional: {e}")
-        # Fallback: usar solo los que existen en Django
-        users_query = User.objects.filter(is_staff=False, is_superuser=False)
-        if search_user:
-            users_query = users_query.filter(username__icontains=search_user)
-        users = users_query.order_by("username")[:50]
-        
-        users_from_db = []
-        for user in users:
-            user_info = get_institutional_info(user.username)
-            current_assignment = TrainerAssignment.objects.filter(
-                user=user, activo=True
-            ).select_related("trainer").first()
-            
-            users_from_db.append({
-                "user": user,
-                "user_info": user_info,
-                "current_assignment": current_assignment,
-            })
-    
-    users_with_info = users_from_db
-    
-    # Obtener entrenadores directamente de la BD institucional
-    # Solo empleados con employee_type = 'Instructor' pueden ser entrenadores
-    trainers_from_db = []
-    try:
-        with connection.cursor() as cur:
-            cur.execute("""
-                SELECT u.username, u.employee_id, e.first_name, e.last_name, e.employee_type
-                FROM users u
-                JOIN employees e ON u.employee_id = e.id
-                WHERE u.role = 'EMPLOYEE'
-                AND UPPER(e.employee_type) = 'INSTRUCTOR'
-                AND u.username NOT LIKE 'test%'
-                ORDER BY e.last_name, e.first_name
-            """)
-            for row in cur.fetchall():
-                username, emp_id, first_name, last_name, emp_type = row
-                # Filtrar usuarios de prueba
-                if 'test' in username.lower():
-                    continue
-                if search_trainer and search_trainer.lower() not in username.lower():
-                    continue
-                
-                # Obtener o crear usuario Django si no existe
-                trainer_user, created = User.objects.get_or_create(
-                    username=username,
-                    defaults={'is_staff': True, 'is_superuser': False}
-                )
-                
-                # Si el usuario ya existía pero no tenía is_staff, actualizarlo
-                if not created and not trainer_user.is_staff:
-                    trainer_user.is_staff = True
-                    trainer_user.save()
-                
-                trainer_info = get_institutional_info(username)
-                # Contar usuarios asignados
-                asignados_count = TrainerAssignment.objects.filter(
-                    trainer=trainer_user, activo=True
-                ).count()
-                
-                trainers_from_db.append({
-                    "trainer": trainer_user,
-                    "trainer_info": trainer_info,
-                    "asignados_count": asignados_count,
-                })
-    except Exception as e:
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Error al obtener entrenadores de BD institucional: {e}")
-        # Fallback: usar solo los que tienen is_staff=True
-        trainers_query = User.objects.filter(is_staff=True, is_superuser=False)
-        if search_trainer:
-            trainers_query = trainers_query.filter(username__icontains=search_trainer)
-        trainers = trainers_query.order_by("username")
-        
-        trainers_with_info = []
-        for trainer in trainers:
-            trainer_info = get_institutional_info(trainer.username)
-            asignados_count = TrainerAssignment.objects.filter(
-                trainer=trainer, activo=True
-            ).count()
-            
-            trainers_with_info.append({
-                "trainer": trainer,
-                "trainer_info": trainer_info,
-                "asignados_count": asignados_count,
-            })
-        trainers_from_db = trainers_with_info
-    
-    trainers_with_info = trainers_from_db
+    # Los selectores usan el autocompletado; aquí solo se listan los resultados de la búsqueda
+    # (o las asignaciones más recientes) en lugar de todos los usuarios
+    PeopleSearchService.refresh()
+    search_user = request.GET.get("search_user", "").strip()
+    if search_user:
+        encontrados = PeopleSearchService.search(search_user, "usuario", limit=USUARIOS_BUSQUEDA)
+        # En el orden de relevancia de la búsqueda
+        por_id = User.objects.in_bulk([e.user_id for e in encontrados])
+        usuarios = [por_id[e.user_id] for e in encontrados if e.user_id in por_id]
+    else:
+        recientes = (
+            TrainerAssignment.objects.filter(activo=True)
+            .order_by("-fecha_asignacion", "-id")
+            .values_list("user_id", flat=True)[:USUARIOS_BUSQUEDA]
+        )
+        usuarios = list(User.objects.filter(id__in=list(recientes)).order_by("username"))
+    asignaciones = {
+        asignacion.user_id: asignacion
+        for asignacion in TrainerAssignment.objects.filter(user__in=usuarios, activo=True)
+        .select_related("trainer")
+        .order_by("id")
+    }
+    info = InstitutionalService.info_many([user.username for user in usuarios])
+    users_with_info = [
+        {
+            "user": user,
+            "user_info": info.get(user.username, {}),
+            "current_assignment": asignaciones.get(user.id),
+        }
+        for user in usuarios
+    ]
 
     return render(
         request,
         "fit/admin_assign_trainer.html",
         {
             "users": users_with_info,
-            "trainers": trainers_with_info,
             "search_user": search_user,
-            "search_trainer": search_trainer,
         },
     )
 
 
 @login_required
 @user_passes_test(is_admin)
-def recalc_stats_month(request):
-    hoy = date.today()
-    anio, mes = hoy.year, hoy.month
+def admin_autocomplete(request, rol):
+    """
+    Autocompletado JSON de usuarios (`rol`="usuario") o entrenadores ("entrenador") por
+    username o nombre. Parámetros: q (término) y limit (máximo LIMITE_MAXIMO).
+    """
+    try:
+        limit = min(max(int(request.GET.get("limit", LIMITE_DEFECTO)), 1), LIMITE_MAXIMO)
+    except ValueError:
+        return JsonResponse({"error": "limit debe ser un entero"}, status=400)
+    PeopleSearchService.refresh()
+    resultados = PeopleSearchService.search(request.GET.get("q", ""), rol, limit=limit)
+    return JsonResponse({"results": [PeopleSearchService.serialize(entrada) for entrada in resultados]})
 
-    ui, _ = UserMonthlyStats.objects.get_or_create(
-        user=request.user,
-        anio=anio,
-        mes=mes,
-    )
-    ui.seguimientos_registrados = ProgressLog.objects.filter(
-        user=request.user, fecha__year=anio, fecha__month=mes
-    ).count()
-    ui.rutinas_iniciadas = Routine.objects.filter(
-        user=request.user,
-        fecha_creacion__year=anio,
-        fecha_creacion__month=mes,
-    ).count()
-    ui.save()
 
-    messages.success(request, "Stats actualizadas para tu usuario.")
+@login_required
+@user_passes_test(is_admin)
+def recalc_stats_month(request):
+    """Recalcula las estadísticas del mes actual de todos los usuarios y entrenadores"""
+    hoy = date.today()
+    cambios = StatsRecalculator.recalculate(hoy.replace(day=1), hoy)
+    corregidas = sum(len(filas) for filas in cambios.values())
+    messages.success(request, f"Stats del mes recalculadas ({corregidas} filas corregidas).")
     return redirect("home")
 
 
 # ==================== NUEVAS FUNCIONALIDADES ====================
 
-# ------------------------- Actualización automática de estadísticas --------------------------
-def update_user_stats(user, anio, mes):
-    """Actualiza las estadísticas mensuales de un usuario"""
-    stats, _ = UserMonthlyStats.objects.get_or_create(
-        user=user,
-        anio=anio,
-        mes=mes,
-    )
-    stats.rutinas_iniciadas = Routine.objects.filter(
-        user=user,
-        fecha_creacion__year=anio,
-        fecha_creacion__month=mes,
-    ).count()
-    stats.seguimientos_registrados = ProgressLog.objects.filter(
-        user=user,
-        fecha__year=anio,
-        fecha__month=mes,
-    ).count()
-    stats.save()
-    return stats
-
-
-def update_trainer_stats(trainer, anio, mes):
-    """Actualiza las estadísticas mensuales de un entrenador"""
-    stats, _ = TrainerMonthlyStats.objects.get_or_create(
-        trainer=trainer,
-        anio=anio,
-        mes=mes,
-    )
-    stats.asignaciones_nuevas = TrainerAssignment.objects.filter(
-        trainer=trainer,
-        fecha_asignacion__year=anio,
-        fecha_asignacion__month=mes,
-    ).count()
-    stats.seguimientos_realizados = TrainerRecommendation.objects.filter(
-        trainer=trainer,
-        fecha__year=anio,
-        fecha__month=mes,
-    ).count()
-    stats.save()
-    return stats
-
-
 # ------------------------- Ejercicios --------------------------
 @login_required
 def exercise_create(request):
@@ -2029,8 +1759,12 @@ def recommendations_list(request):
         user=request.user
     ).select_related("trainer", "routine", "progress_log").order_by("-fecha")
     
-    # Marcar como leídas
-    TrainerRecommendation.objects.filter(user=request.user, leido=False).update(leido=True)
+    # Marcar como leídas y avisar a cada entrenador en su feed de actividad
+    no_leidas = TrainerRecommendation.objects.filter(user=request.user, leido=False)
+    pendientes = list(no_leidas.values_list("id", "trainer_id"))
+    if pendientes:
+        no_leidas.filter(id__in=[r_id for r_id, _ in pendientes]).update(leido=True)
+        ActivityFeedService.record_recommendations_read(request.user.id, pendientes)
     
     return render(request, "fit/recommendations_list.html", {"recommendations": recommendations})
 
@@ -2345,20 +2079,20 @@ def trainer_progress_analysis(request, user_id):
     
     # Progreso por mes (últimos 6 meses)
     hoy = date.today()
-    progreso_mensual = []
-    for i in range(6):
-        mes_fecha = date(hoy.year, hoy.month - i, 1) if hoy.month > i else date(hoy.year - 1, 12 + hoy.month - i, 1)
-        sesiones_mes = all_progress.filter(
-            fecha__year=mes_fecha.year,
-            fecha__month=mes_fecha.month
+    progreso_mensual = [
+        {
+            "mes": punto["inicio"].strftime("%b %Y"),
+            "sesiones": punto["sesiones"],
+            "tiempo_total": punto["tiempo_total"],
+            "esfuerzo_promedio": round(punto["esfuerzo_promedio"], 1),
+        }
+        for punto in time_series(
+            ProgressLog.objects.filter(user=tuser), "month", 6, hasta=hoy,
+            sesiones=Count("id"),
+            tiempo_total=Sum("tiempo_seg"),
+            esfuerzo_promedio=Avg("esfuerzo"),
         )
-        progreso_mensual.append({
-            "mes": mes_fecha.strftime("%b %Y"),
-            "sesiones": sesiones_mes.count(),
-            "tiempo_total": sesiones_mes.aggregate(Sum("tiempo_seg"))["tiempo_seg__sum"] or 0,
-            "esfuerzo_promedio": round(sesiones_mes.aggregate(Avg("esfuerzo"))["esfuerzo__avg"] or 0, 1),
-        })
-    progreso_mensual.reverse()
+    ]
     
     # Progreso por rutina
     progreso_por_rutina = []
@@ -2373,21 +2107,25 @@ def trainer_progress_analysis(request, user_id):
                 "esfuerzo_promedio": round(progreso_rutina.aggregate(Avg("esfuerzo"))["esfuerzo__avg"] or 0, 1),
             })
     
-    # Progreso por tipo de ejercicio (basado en rutinas)
-    progreso_por_tipo = {}
-    for progress in all_progress:
-        rutina = progress.routine
-        items = rutina.items.all()
-        for item in items:
-            tipo = item.exercise.tipo
-            if tipo not in progreso_por_tipo:
-                progreso_por_tipo[tipo] = {"sesiones": 0, "tiempo": 0}
-            progreso_por_tipo[tipo]["sesiones"] += 1
-            if progress.tiempo_seg:
-                progreso_por_tipo[tipo]["tiempo"] += progress.tiempo_seg
+    # Progreso por tipo de ejercicio (composición precalculada de las rutinas)
+    progreso_por_tipo = RoutineCompositionService.type_distribution(all_progress)
+    
+    # Métricas de carga: medias móviles 7/28 días, ACWR y pendientes (últimos 90 días)
+    analitica = TrainingAnalyticsService.for_user(tuser, hasta=hoy)
     
     # Identificar tendencias y estancamientos
     tendencias = []
+    if analitica:
+        if analitica["pendiente_esfuerzo"] is not None and abs(analitica["pendiente_esfuerzo"]) >= 0.1:
+            tendencias.append({
+                "tipo": "positiva" if analitica["pendiente_esfuerzo"] > 0 else "negativa",
+                "mensaje": f"Esfuerzo {'en aumento' if analitica['pendiente_esfuerzo'] > 0 else 'en descenso'}: {analitica['pendiente_esfuerzo']:+.2f} puntos por semana (últimos 90 días)"
+            })
+        if analitica["pendiente_peso"] is not None and abs(analitica["pendiente_peso"]) >= 0.1:
+            tendencias.append({
+                "tipo": "positiva" if analitica["pendiente_peso"] > 0 else "negativa",
+                "mensaje": f"Peso utilizado {'en progresión' if analitica['pendiente_peso'] > 0 else 'en descenso'}: {analitica['pendiente_peso']:+.2f} kg por semana (últimos 90 días)"
+            })
     if len(progreso_mensual) >= 2:
         ultimo_mes = progreso_mensual[-1]
         penultimo_mes = progreso_mensual[-2]
@@ -2440,6 +2178,13 @@ def trainer_progress_analysis(request, user_id):
                 "severidad": "baja",
                 "mensaje": f"Esfuerzo promedio bajo ({promedio_esfuerzo}/10). Considera aumentar la intensidad."
             })
+        
+        if analitica and analitica["zona_acwr"] == "riesgo":
+            alertas.append({
+                "tipo": "sobrecarga",
+                "severidad": "alta",
+                "mensaje": f"Carga aguda:crónica de {analitica['acwr']} (> 1.5): riesgo de sobrecarga. Considera reducir el volumen esta semana."
+            })
     
     return render(request, "fit/trainer_progress_analysis.html", {
         "tuser": tuser,
@@ -2452,6 +2197,7 @@ def trainer_progress_analysis(request, user_id):
         "progreso_por_tipo": progreso_por_tipo,
         "tendencias": tendencias,
         "alertas": alertas,
+        "analitica": analitica,
         "all_progress": all_progress[:20],  # Últimas 20 sesiones
     })
 
@@ -2530,146 +2276,57 @@ def trainer_recommendation_advanced(request, user_id):
 def admin_users_management(request):
     """
     Panel completo de gestión de usuarios con filtros avanzados.
+    Filtros, orden y paginación se resuelven en SQL; solo la página visible se completa
+    con datos institucionales.
     """
     # Filtros
-    search_query = request.GET.get("q", "")
+    search_query = request.GET.get("q", "").strip()
     role_filter = request.GET.get("role", "")
     program_filter = request.GET.get("program", "")
     campus_filter = request.GET.get("campus", "")
     activity_filter = request.GET.get("activity", "")
-    
-    # Obtener usuarios directamente de la BD institucional
-    # Incluir: Estudiantes (STUDENT) y Empleados que NO sean Instructores ni Administrativos (Docentes)
-    users_from_db = []
+    orden = request.GET.get("orden", "usuario")
+
+    # Crear en bloque los usuarios Django de los nuevos usuarios institucionales e indexarlos
+    # para la búsqueda
     try:
-        with connection.cursor() as cur:
-            cur.execute("""
-                SELECT u.username, u.role, u.student_id, u.employee_id
-                FROM users u
-                WHERE u.is_active = TRUE
-                AND u.username NOT LIKE 'test%'
-                AND (
-                    u.role = 'STUDENT'
-                    OR (
-                        u.role = 'EMPLOYEE' 
-                        AND u.employee_id IS NOT NULL
-                        AND EXISTS (
-                            SELECT 1 FROM employees e 
-                            WHERE e.id = u.employee_id 
-                            AND UPPER(e.employee_type) NOT IN ('INSTRUCTOR', 'ADMINISTRATIVO')
-                        )
-                    )
-                )
-                ORDER BY u.username
-            """)
-            for row in cur.fetchall():
-                username, role, student_id, employee_id = row
-                
-                # Filtrar usuarios de prueba
-                if 'test' in username.lower():
-                    continue
-                
-                # Aplicar búsqueda si existe
-                if search_query and search_query.lower() not in username.lower():
-                    continue
-                
-                # Obtener o crear usuario Django si no existe
-                user, created = User.objects.get_or_create(
-                    username=username,
-                    defaults={'is_staff': False, 'is_superuser': False}
-                )
-                
-                # Asegurar que no sea staff ni superuser (son usuarios estándar)
-                if not created:
-                    if user.is_staff or user.is_superuser:
-                        user.is_staff = False
-                        user.is_superuser = False
-                        user.save()
-                
-                users_from_db.append(user)
+        PeopleSearchService.refresh()
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
-        logger.error(f"Error al obtener usuarios de BD institucional: {e}")
-        # Fallback: usar solo los que existen en Django
-        users_from_db = list(User.objects.filter(is_superuser=False).order_by("username"))
-        if search_query:
-            users_from_db = [u for u in users_from_db if search_query.lower() in u.username.lower()]
-    
-    users = users_from_db
-    
-    # Agregar información institucional y filtrar
-    users_with_info = []
-    for user in users:
-        user_info = get_institutional_info(user.username)
-        
-        # Filtro por rol
-        if role_filter:
-            if role_filter == "student" and user_info.get("role") != "STUDENT":
-                continue
-            elif role_filter == "employee" and user_info.get("role") != "EMPLOYEE":
-                continue
-            elif role_filter == "trainer" and not user.is_staff:
-                continue
-        
-        # Filtro por programa (solo estudiantes)
-        if program_filter and user_info.get("role") == "STUDENT":
-            # Aquí necesitarías consultar la tabla students para obtener el programa
-            # Por ahora, lo omitimos
-            pass
-        
-        # Filtro por campus
-        if campus_filter and user_info.get("campus") != campus_filter:
-            continue
-        
-        # Filtro por actividad
-        if activity_filter:
-            hoy = date.today()
-            sesiones_mes = ProgressLog.objects.filter(
-                user=user,
-                fecha__year=hoy.year,
-                fecha__month=hoy.month
-            ).count()
-            
-            if activity_filter == "high" and sesiones_mes < 10:
-                continue
-            elif activity_filter == "medium" and (sesiones_mes < 5 or sesiones_mes >= 10):
-                continue
-            elif activity_filter == "low" and sesiones_mes >= 5:
-                continue
-            elif activity_filter == "inactive" and sesiones_mes > 0:
-                continue
-        
-        # Estadísticas del usuario
-        total_sesiones = ProgressLog.objects.filter(user=user).count()
-        rutinas_count = Routine.objects.filter(user=user).count()
-        tiene_entrenador = TrainerAssignment.objects.filter(user=user, activo=True).exists()
-        
-        users_with_info.append({
+        logger.error(f"Error al sincronizar usuarios de BD institucional: {e}")
+
+    usuarios = AdminUserService.queryset(
+        search=search_query,
+        role=role_filter,
+        campus=campus_filter,
+        activity=activity_filter,
+        orden=orden,
+    )
+    page_obj = Paginator(usuarios, USUARIOS_POR_PAGINA).get_page(request.GET.get("page"))
+    info = InstitutionalService.info_many(user.username for user in page_obj)
+    users_with_info = [
+        {
             "user": user,
-            "info": user_info,
-            "total_sesiones": total_sesiones,
-            "rutinas_count": rutinas_count,
-            "tiene_entrenador": tiene_entrenador,
-        })
-    
-    # Obtener opciones para filtros (campus, programas, etc.)
-    campuses = []
-    try:
-        with connection.cursor() as cur:
-            cur.execute("SELECT DISTINCT name FROM campuses ORDER BY name")
-            campuses = [row[0] for row in cur.fetchall()]
-    except Exception:
-        pass
-    
+            "info": info.get(user.username, {}),
+            "total_sesiones": user.total_sesiones,
+            "rutinas_count": user.rutinas_count,
+            "tiene_entrenador": user.tiene_entrenador,
+            "sesiones_mes": user.sesiones_mes,
+        }
+        for user in page_obj
+    ]
+
     return render(request, "fit/admin_users_management.html", {
         "users": users_with_info,
+        "page_obj": page_obj,
         "search_query": search_query,
         "role_filter": role_filter,
         "program_filter": program_filter,
         "campus_filter": campus_filter,
         "activity_filter": activity_filter,
-        "campuses": campuses,
+        "orden": orden,
+        "campuses": InstitutionalService.campuses(),
     })
 
 # ------------------------- Asignación Avanzada de Entrenadores -------------------------
@@ -2745,7 +2402,7 @@ def admin_assign_trainer_advanced(request):
                 SELECT u.username, u.role, u.student_id, u.employee_id
                 FROM users u
                 WHERE u.is_active = TRUE
-                AND u.username NOT LIKE 'test%'
+                AND LOWER(u.username) NOT LIKE %s
                 AND (
                     u.role = 'STUDENT'
                     OR (
@@ -2759,14 +2416,10 @@ def admin_assign_trainer_advanced(request):
                     )
                 )
                 ORDER BY u.username
-            """)
+            """, [f"%{TestAccount.PATRON}%"])
             for row in cur.fetchall():
                 username, role, student_id, employee_id = row
                 
-                # Filtrar usuarios de prueba
-                if 'test' in username.lower():
-                    continue
-                
                 # Obtener o crear usuario Django si no existe
                 user, created = User.objects.get_or_create(
                     username=username,
@@ -2831,125 +2484,196 @@ def admin_assign_trainer_advanced(request):
         "entrenadores": entrenadores_con_carga,
     })
 
+@login_required
+@user_passes_test(is_admin)
+def admin_auto_assign(request):
+    """
+    Asignación automática de entrenadores: GET muestra el plan (vista previa) y POST lo
+    recalcula y lo guarda.
+    """
+    if request.method == "POST":
+        plan = TrainerAutoAssignService.plan()
+        nuevas = TrainerAutoAssignService.apply(plan, administrador=request.user)
+        messages.success(request, f"{len(nuevas)} asignaciones automáticas creadas.")
+        if plan["sin_cupo"]:
+            messages.warning(request, f"{len(plan['sin_cupo'])} usuarios quedaron sin entrenador por falta de cupo.")
+        return redirect("admin_assign_trainer_advanced")
+
+    plan = TrainerAutoAssignService.plan()
+    return render(request, "fit/admin_auto_assign.html", {
+        "asignaciones": [
+            {"user": usuario, "trainer": trainer, "afinidad": AFINIDAD_NOMBRES.get(motivo, "")}
+            for usuario, trainer, motivo in plan["asignaciones"]
+        ],
+        "sin_cupo": plan["sin_cupo"],
+        "entrenadores": plan["entrenadores"],
+    })
+
+@login_required
+@user_passes_test(is_admin)
+def admin_import_assignments(request):
+    """
+    Importación de asignaciones desde un CSV usuario,entrenador. Con "simular" solo se
+    muestra el resumen de cambios.
+    """
+    resumen = None
+    simular = False
+    if request.method == "POST":
+        archivo = request.FILES.get("archivo")
+        simular = bool(request.POST.get("simular"))
+        if archivo is None:
+            messages.error(request, "Selecciona un archivo CSV.")
+        else:
+            try:
+                lineas = io.TextIOWrapper(archivo.file, encoding="utf-8-sig", newline="")
+                resumen = AssignmentImportService.import_csv(lineas, administrador=request.user, dry_run=simular)
+            except (UnicodeDecodeError, csv.Error) as e:
+                messages.error(request, f"No se pudo leer el archivo: {e}")
+            else:
+                if not simular:
+                    messages.success(
+                        request,
+                        f"Importación completada: {resumen['creadas']} creadas, {resumen['reactivadas']} reactivadas, "
+                        f"{resumen['desactivadas']} desactivadas.",
+                    )
+
+    return render(request, "fit/admin_import_assignments.html", {
+        "resumen": resumen,
+        "simular": simular,
+    })
+
 @login_required
 @user_passes_test(is_admin)
 def admin_assignment_history(request):
     """
-    Historial completo de cambios en asignaciones.
+    Historial de cambios en asignaciones: filtros por usuario, entrenador, administrador,
+    acción y rango de fechas, paginado con cursor sobre (-fecha, -id).
     """
-    historial = AssignmentHistory.objects.select_related(
-        "assignment", "assignment__user", "assignment__trainer", "administrador"
-    ).order_by("-fecha")
-    
-    # Filtros
-    user_filter = request.GET.get("user", "")
-    trainer_filter = request.GET.get("trainer", "")
-    accion_filter = request.GET.get("accion", "")
-    
-    if user_filter:
-        historial = historial.filter(assignment__user__username__icontains=user_filter)
-    if trainer_filter:
-        historial = historial.filter(assignment__trainer__username__icontains=trainer_filter)
-    if accion_filter:
-        historial = historial.filter(accion=accion_filter)
+    filtros = {campo: request.GET.get(campo, "").strip() for campo in FILTROS}
+    try:
+        historial = AssignmentHistoryService.filtered(filtros)
+    except ValueError as e:
+        messages.error(request, str(e))
+        historial = AssignmentHistoryService.filtered({**filtros, "desde": "", "hasta": ""})
+    try:
+        registros, siguiente = AssignmentHistoryService.page(historial, cursor=request.GET.get("cursor"))
+    except ValueError:
+        registros, siguiente = AssignmentHistoryService.page(historial)
     
     return render(request, "fit/admin_assignment_history.html", {
-        "historial": historial,
-        "user_filter": user_filter,
-        "trainer_filter": trainer_filter,
-        "accion_filter": accion_filter,
+        "historial": registros,
+        "siguiente": siguiente,
+        "primera_pagina": not request.GET.get("cursor"),
+        "filtros": filtros,
+        "filtros_query": urlencode({c: v for c, v in filtros.items() if v}),
+        "acciones": AssignmentHistory._meta.get_field("accion").choices,
     })
 
+@login_required
+@user_passes_test(is_admin)
+def admin_assignment_history_export(request):
+    """
+    Exporta a CSV el historial con los mismos filtros de la pantalla (en streaming).
+    """
+    filtros = {campo: request.GET.get(campo, "").strip() for campo in FILTROS}
+    try:
+        historial = AssignmentHistoryService.filtered(filtros)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect("admin_assignment_history")
+    response = StreamingHttpResponse(AssignmentHistoryService.export_rows(historial), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="historial_asignaciones_{date.today():%Y%m%d}.csv"'
+    return response
+
 # ------------------------- Gestión de Contenido Global -------------------------
 @login_required
 @user_passes_test(is_admin)
 def admin_content_moderation(request):
     """
-    Panel de moderación de ejercicios y rutinas.
+    Panel de moderación de ejercicios y rutinas: cola paginada por orden de llegada.
     """
-    # Ejercicios pendientes de moderación
-    ejercicios_pendientes = Exercise.objects.filter(
-        es_personalizado=True
-    ).exclude(
-        id__in=ContentModeration.objects.filter(
-            tipo_contenido="exercise", estado="aprobado"
-        ).values_list("contenido_id", flat=True)
-    )
-    
-    # Rutinas pendientes de moderación
-    rutinas_pendientes = Routine.objects.filter(
-        es_predisenada=True
-    ).exclude(
-        id__in=ContentModeration.objects.filter(
-            tipo_contenido="routine", estado="aprobado"
-        ).values_list("contenido_id", flat=True)
-    )
+    tipo = request.GET.get("tipo", "")
+    page_obj = Paginator(ModerationService.queue(tipo), MODERACION_POR_PAGINA).get_page(request.GET.get("page"))
+    cola = ModerationService.attach_content(page_obj.object_list)
     
     # Contenido moderado recientemente
-    moderaciones_recientes = ContentModeration.objects.select_related("moderador").order_by("-fecha_revision")[:20]
+    moderaciones_recientes = (
+        ContentModeration.objects.exclude(estado="pendiente")
+        .select_related("moderador")
+        .order_by("-fecha_revision")[:20]
+    )
     
     return render(request, "fit/admin_content_moderation.html", {
-        "ejercicios_pendientes": ejercicios_pendientes,
-        "rutinas_pendientes": rutinas_pendientes,
+        "cola": cola,
+        "page_obj": page_obj,
+        "tipo": tipo,
         "moderaciones_recientes": moderaciones_recientes,
     })
 
+@login_required
+@user_passes_test(is_admin)
+def admin_moderation_bulk(request):
+    """
+    Aprueba o rechaza en bloque los registros seleccionados de la cola (una transacción).
+    """
+    if request.method == "POST":
+        accion = request.POST.get("accion")
+        ids = [int(i) for i in request.POST.getlist("moderacion_ids") if i.isdigit()]
+        if accion not in ("aprobar", "rechazar") or not ids:
+            messages.error(request, "Selecciona contenido y una acción válida.")
+        else:
+            revisados, eliminados = ModerationService.review(
+                ids, accion, request.user, request.POST.get("comentarios", "")
+            )
+            if accion == "aprobar":
+                messages.success(request, f"{revisados} contenidos aprobados.")
+            else:
+                messages.success(request, f"{revisados} contenidos rechazados ({eliminados} eliminados).")
+    
+    url = reverse("admin_content_moderation")
+    tipo = request.POST.get("tipo")
+    return redirect(f"{url}?tipo={tipo}" if tipo else url)
+
 @login_required
 @user_passes_test(is_admin)
 def admin_moderate_content(request, tipo, contenido_id):
     """
     Aprobar o rechazar contenido específico.
     """
+    if tipo not in ("exercise", "routine"):
+        messages.error(request, "Tipo de contenido inválido.")
+        return redirect("admin_content_moderation")
+    
     if request.method == "POST":
         accion = request.POST.get("accion")
         comentarios = request.POST.get("comentarios", "")
         
-        # Obtener o crear registro de moderación
-        moderacion, created = ContentModeration.objects.get_or_create(
-            tipo_contenido=tipo,
-            contenido_id=contenido_id,
-            defaults={"estado": "pendiente"}
-        )
-        
-        if accion == "aprobar":
-            moderacion.estado = "aprobado"
-            moderacion.moderador = request.user
-            moderacion.fecha_revision = timezone.now()
-            moderacion.comentarios = comentarios
-            moderacion.save()
-            messages.success(request, "Contenido aprobado correctamente.")
-        elif accion == "rechazar":
-            moderacion.estado = "rechazado"
-            moderacion.moderador = request.user
-            moderacion.fecha_revision = timezone.now()
-            moderacion.comentarios = comentarios
-            moderacion.save()
+        if accion in ("aprobar", "rechazar", "editar"):
+            # Registro de moderación del contenido (único por tipo e id)
+            ModerationService.enqueue(tipo, contenido_id)
+            moderacion = ContentModeration.objects.get(tipo_contenido=tipo, contenido_id=contenido_id)
+            if moderacion.estado not in ("pendiente", "editado"):
+                # Contenido ya revisado que se vuelve a revisar
+                moderacion.estado = "pendiente"
+                moderacion.save(update_fields=["estado"])
+            _, eliminados = ModerationService.review([moderacion.id], accion, request.user, comentarios)
             
-            # Opcional: eliminar el contenido rechazado
-            if tipo == "exercise":
-                Exercise.objects.filter(id=contenido_id).delete()
-            elif tipo == "routine":
-                Routine.objects.filter(id=contenido_id).delete()
-            
-            messages.success(request, "Contenido rechazado y eliminado.")
-        elif accion == "editar":
-            moderacion.estado = "editado"
-            moderacion.moderador = request.user
-            moderacion.fecha_revision = timezone.now()
-            moderacion.comentarios = comentarios
-            moderacion.save()
-            messages.success(request, "Contenido marcado como editado.")
+            if accion == "aprobar":
+                messages.success(request, "Contenido aprobado correctamente.")
+            elif accion == "rechazar" and eliminados:
+                messages.success(request, "Contenido rechazado y eliminado.")
+            elif accion == "rechazar":
+                messages.success(request, "Contenido rechazado (se conserva porque lo usan otras rutinas).")
+            else:
+                messages.success(request, "Contenido marcado como editado.")
         
         return redirect("admin_content_moderation")
     
     # Obtener el contenido
     if tipo == "exercise":
         contenido = get_object_or_404(Exercise, pk=contenido_id)
-    elif tipo == "routine":
-        contenido = get_object_or_404(Routine, pk=contenido_id)
     else:
-        messages.error(request, "Tipo de contenido inválido.")
-        return redirect("admin_content_moderation")
+        contenido = get_object_or_404(Routine, pk=contenido_id)
     
     return render(request, "fit/admin_moderate_content.html", {
         "tipo": tipo,
@@ -2986,105 +2710,52 @@ def admin_analytics(request):
     total_sesiones = ProgressLog.objects.count()
     
     # Actividad por mes (últimos 12 meses)
-    actividad_mensual = []
-    for i in range(12):
-        mes_fecha = date(hoy.year, hoy.month - i, 1) if hoy.month > i else date(hoy.year - 1, 12 + hoy.month - i, 1)
-        sesiones_mes = ProgressLog.objects.filter(
-            fecha__year=mes_fecha.year,
-            fecha__month=mes_fecha.month
-        ).count()
-        usuarios_activos_mes = ProgressLog.objects.filter(
-            fecha__year=mes_fecha.year,
-            fecha__month=mes_fecha.month
-        ).values("user").distinct().count()
-        actividad_mensual.append({
-            "mes": mes_fecha.strftime("%b %Y"),
-            "sesiones": sesiones_mes,
-            "usuarios_activos": usuarios_activos_mes,
-        })
-    actividad_mensual.reverse()
-    
-    # Actividad por facultad/departamento
-    actividad_por_facultad = {}
-    try:
-        with connection.cursor() as cur:
-            # Obtener sesiones de usuarios con información de facultad
-            cur.execute("""
-                SELECT f.name, COUNT(DISTINCT pl.user_id) as usuarios_activos, COUNT(pl.id) as sesiones
-                FROM fit_progresslog pl
-                JOIN auth_user u ON pl.user_id = u.id
-                JOIN users usr ON u.username = usr.username
-                LEFT JOIN students s ON usr.student_id = s.id
-                LEFT JOIN employees e ON usr.employee_id = e.id
-                LEFT JOIN faculties f ON COALESCE(s.faculty_code, e.faculty_code) = f.code
-                WHERE pl.fecha >= CURRENT_DATE - INTERVAL '30 days'
-                GROUP BY f.name
-                ORDER BY sesiones DESC
-            """)
-            for row in cur.fetchall():
-                if row[0]:  # Si hay nombre de facultad
-                    actividad_por_facultad[row[0]] = {
-                        "usuarios_activos": row[1],
-                        "sesiones": row[2],
-                    }
-    except Exception:
-        pass
-    
-    # Efectividad de entrenadores (solo Instructores)
-    efectividad_entrenadores = []
-    # Obtener solo Instructores
-    try:
-        with connection.cursor() as cur:
-            cur.execute("""
-                SELECT u.username
-                FROM users u
-                JOIN employees e ON u.employee_id = e.id
-                WHERE u.role = 'EMPLOYEE'
-                AND UPPER(e.employee_type) = 'INSTRUCTOR'
-            """)
-            trainer_usernames = [row[0] for row in cur.fetchall()]
-            entrenadores = User.objects.filter(username__in=trainer_usernames)
-    except Exception:
-        entrenadores = User.objects.none()
-    for trainer in entrenadores:
-        asignados = TrainerAssignment.objects.filter(trainer=trainer, activo=True).count()
-        if asignados > 0:
-            # Progreso promedio de usuarios asignados
-            usuarios_asignados = TrainerAssignment.objects.filter(
-                trainer=trainer, activo=True
-            ).values_list("user_id", flat=True)
-            
-            sesiones_totales = ProgressLog.objects.filter(
-                user_id__in=usuarios_asignados
-            ).count()
-            
-            recomendaciones = TrainerRecommendation.objects.filter(trainer=trainer).count()
-            
-            efectividad_entrenadores.append({
-                "trainer": trainer,
-                "info": get_institutional_info(trainer.username),
-                "asignados": asignados,
-                "sesiones_totales": sesiones_totales,
-                "recomendaciones": recomendaciones,
-                "promedio_sesiones_por_usuario": round(sesiones_totales / asignados, 1) if asignados > 0 else 0,
-            })
-    
-    efectividad_entrenadores.sort(key=lambda x: x["promedio_sesiones_por_usuario"], reverse=True)
-    
-    # Popularidad de ejercicios
-    popularidad_ejercicios = RoutineItem.objects.values(
-        "exercise__nombre", "exercise__tipo"
-    ).annotate(
-        veces_usado=Count("id")
-    ).order_by("-veces_usado")[:10]
-    
-    # Popularidad de rutinas
-    popularidad_rutinas = ProgressLog.objects.values(
-        "routine__nombre"
-    ).annotate(
-        veces_usada=Count("id")
-    ).order_by("-veces_usada")[:10]
+    actividad_mensual = [
+        {
+            "mes": punto["inicio"].strftime("%b %Y"),
+            "sesiones": punto["sesiones"],
+            "usuarios_activos": punto["usuarios_activos"],
+        }
+        for punto in time_series(
+            ProgressLog.objects.all(), "month", 12, hasta=hoy,
+            sesiones=Count("id"),
+            usuarios_activos=Count("user", distinct=True),
+        )
+    ]
     
+    # Resúmenes precalculados por refresh_analytics: una consulta cada uno. Cada lectura va en su
+    # propio savepoint para que un resumen no disponible no oculte los demás
+    def leer_resumen(nombre, leer, defecto):
+        try:
+            with transaction.atomic():
+                return leer()
+        except DatabaseError as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.warning(f"Resumen {nombre} no disponible (ejecutar refresh_analytics): {e}")
+            return defecto
+
+    actividad_por_facultad = leer_resumen("faculty_activity", lambda: {
+        fila["facultad"]: {"usuarios_activos": fila["usuarios_activos"], "sesiones": fila["sesiones"]}
+        for fila in FacultyActivitySummary.objects.order_by("-sesiones").values()
+    }, {})
+    efectividad_entrenadores = leer_resumen("trainer_effectiveness", lambda: list(
+        TrainerEffectivenessSummary.objects.annotate(
+            promedio_sesiones_por_usuario=Round(
+                Cast("sesiones_totales", django_models.FloatField()) / F("asignados"), 1
+            )
+        ).order_by("-promedio_sesiones_por_usuario", "username")
+    ), [])
+    popularidad_ejercicios = leer_resumen("exercise_popularity", lambda: list(
+        ExercisePopularitySummary.objects.order_by("-veces_usado", "nombre")[:10]
+    ), [])
+    popularidad_rutinas = leer_resumen("routine_popularity", lambda: list(
+        RoutinePopularitySummary.objects.order_by("-veces_usada", "nombre")[:10]
+    ), [])
+    info_entrenadores = InstitutionalService.info_many(t.username for t in efectividad_entrenadores)
+    for trainer in efectividad_entrenadores:
+        trainer.info = info_entrenadores.get(trainer.username, {})
+
     # Tendencias temporales
     tendencias = {
         "crecimiento_usuarios": total_usuarios,  # Simplificado
@@ -3103,6 +2774,7 @@ def admin_analytics(request):
         "popularidad_ejercicios": popularidad_ejercicios,
         "popularidad_rutinas": popularidad_rutinas,
         "tendencias": tendencias,
+        "report_cache_stats": ReportCache.stats(REPORTES_CACHEADOS),
     })
 
 # ------------------------- Configuración del Sistema -------------------------
@@ -3119,15 +2791,16 @@ def admin_system_config(request):
         accion = request.POST.get("accion")
         
         if accion == "crear" and clave and valor:
-            config, created = SystemConfig.objects.get_or_create(
-                clave=clave,
-                defaults={"valor": valor, "descripcion": descripcion}
-            )
-            if not created:
-                config.valor = valor
-                config.descripcion = descripcion
-                config.save()
-            messages.success(request, f"Configuración '{clave}' guardada.")
+            clave = clave.strip()
+            setting = REGISTRO.get(clave.partition(":")[0])
+            if not descripcion and setting is not None:
+                descripcion = setting.descripcion
+            try:
+                ConfigService.set(clave, valor, descripcion)
+            except ValidationError as e:
+                messages.error(request, e.messages[0])
+            else:
+                messages.success(request, f"Configuración '{clave}' guardada.")
         elif accion == "eliminar":
             config_id = request.POST.get("config_id")
             SystemConfig.objects.filter(id=config_id).delete()
@@ -3139,4 +2812,5 @@ def admin_system_config(request):
     
     return render(request, "fit/admin_system_config.html", {
         "configs": configs,
+        "declaradas": ConfigService.declared(),
     })
@@ -185,6 +185,39 @@ LOGGING = {
     },
 }
 
+# ----------------------------------------------------
+# Cache compartido por todos los procesos (workers de gunicorn): las versiones de reportes,
+# los contadores y los límites de frecuencia deben verse igual en todos. Por defecto es una
+# tabla de la BD (creada por migración); con CACHE_REDIS_URL se usa Redis (paquete redis)
+# ----------------------------------------------------
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "").strip()
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "fit_cache",
+            "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "50000"))},
+        }
+    }
+
+# ----------------------------------------------------
+# Cache de reportes (segundos que vive el reporte del mes en curso y los de meses cerrados,
+# que además se invalidan por versión de datos)
+# ----------------------------------------------------
+REPORT_CACHE_TIMEOUT = int(os.getenv("REPORT_CACHE_TIMEOUT", "300"))
+REPORT_CACHE_CLOSED_TIMEOUT = int(os.getenv("REPORT_CACHE_CLOSED_TIMEOUT", str(7 * 24 * 3600)))
+
+# Estadísticas mensuales: recálculo de las claves acumuladas en StatsDispatcher.coalesce()
+# en un hilo en segundo plano en lugar de al confirmar la petición
+STATS_DISPATCH_ASYNC = os.getenv("STATS_DISPATCH_ASYNC", "False") == "True"
+
 # ----------------------------------------------------
 # MongoDB Configuration (NoSQL para datos del gimnasio)
 # ----------------------------------------------------
@@ -197,3 +230,16 @@ MONGODB_SETTINGS = {
     "password": os.getenv("MONGODB_PASSWORD", "EKKLsiwKQjNJkBdu"),
     "authentication_source": os.getenv("MONGODB_AUTH_SOURCE", "admin"),
 }
+# Circuito de MongoDB: segundos hasta el primer reintento tras una caída (se duplican con cada
+# fallo consecutivo hasta el máximo)
+MONGODB_PROBE_INTERVAL = float(os.getenv("MONGODB_PROBE_INTERVAL", "5"))
+MONGODB_PROBE_MAX_INTERVAL = float(os.getenv("MONGODB_PROBE_MAX_INTERVAL", "300"))
+# Logs de actividad: se encolan en memoria y se escriben en lotes (insert_many) al juntar
+# ACTIVITY_LOG_BATCH_SIZE, cada ACTIVITY_LOG_FLUSH_INTERVAL segundos y al salir. Con la cola
+# llena (ACTIVITY_LOG_MAX_QUEUE) se aplica ACTIVITY_LOG_OVERFLOW: descartar_nuevo,
+# descartar_antiguo o escribir (quien registra escribe un lote antes de encolar)
+ACTIVITY_LOG_BUFFERED = os.getenv("ACTIVITY_LOG_BUFFERED", "True") == "True"
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv("ACTIVITY_LOG_BATCH_SIZE", "100"))
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_LOG_FLUSH_INTERVAL", "5"))
+ACTIVITY_LOG_MAX_QUEUE = int(os.getenv("ACTIVITY_LOG_MAX_QUEUE", "10000"))
+ACTIVITY_LOG_OVERFLOW = os.getenv("ACTIVITY_LOG_OVERFLOW", "descartar_nuevo")